@@ -1,21 +1,184 @@
-from fastapi import FastAPI
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+import json, logging, threading
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from core.engine import Engine
+from core.jobs import JobQueue
+from core.models import registry
+from core.observability import metrics
+from core.serving import AdmissionController, Coalescer, Overloaded, briefing_key, iterate_in_threads
+
+engine = Engine()  # cheap: models and the index are loaded by the warm-up below
+admission = AdmissionController(engine.s.max_concurrency, engine.s.max_queue, engine.s.queue_timeout)
+inflight = Coalescer()
+# streamed answers are produced here, not in the server's threadpool (shared with sync endpoints);
+# admission caps the streams, so they never wait for a thread
+stream_threads = ThreadPoolExecutor(max_workers=admission.max_concurrency, thread_name_prefix="stream")
+jobs = JobQueue.from_settings(engine.s, engine=engine)
+
+def _warm_up() -> None:
+    try:
+        engine.warm_up()
+    except Exception:
+        # also recorded by the engine and reported by /readyz
+        logging.getLogger(__name__).exception("warm-up failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm-up runs in the background: the process is live (and serving) at once, and ready once the
+    # models and the index are loaded; requests arriving earlier load what they need on first use
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    jobs.start()  # also resumes jobs left unfinished by a previous run
+    yield
+    jobs.stop()
+    engine.fetcher.close()
+    stream_threads.shutdown(wait=False, cancel_futures=True)
 
-app = FastAPI(title="Agentic Research Briefing RAG")
-engine = Engine()
+app = FastAPI(title="Agentic Research Briefing RAG", lifespan=lifespan)
 
 class BriefingRequest(BaseModel):
     topic: str
     mode: str = "offline"
     urls: list[str] = []
+    rerank_budget_ms: float | None = None  # per-request override of RERANK_BUDGET_MS
+
+async def _admitted_run(req: BriefingRequest):
+    async with admission.slot():
+        return await engine.arun(
+            req.topic, mode=req.mode, urls=req.urls or None, rerank_budget_ms=req.rerank_budget_ms
+        )
 
 @app.post("/briefing")
-def briefing(req: BriefingRequest):
-    run = engine.run(req.topic, mode=req.mode, urls=req.urls or None)
+async def briefing(req: BriefingRequest):
+    try:
+        # identical in-flight topics share one run (and one admission slot)
+        key = (*briefing_key(req.topic, req.mode, req.urls), req.rerank_budget_ms)
+        run = await inflight.run(key, lambda: _admitted_run(req))
+    except Overloaded as e:
+        raise HTTPException(e.status, e.reason, headers={"Retry-After": str(e.retry_after)}) from None
     return {
         "topic": req.topic,
         "mode": req.mode,
         "answer_md": run.answer,
         "trace_path": run.trace_path,
     }
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class _AdmittedStream(StreamingResponse):
+    # holds an admission slot until the response ends, whether it completed or the client went away
+    # (the body generator may then never have started, so it cannot release the slot itself)
+    def __init__(self, content, slot: AsyncExitStack, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()  # stops the LLM stream (see iterate_in_threads)
+            await self.slot.aclose()
+
+@app.post("/briefing/stream")
+async def briefing_stream(req: BriefingRequest):
+    slot = AsyncExitStack()
+    try:
+        # admitted before the response starts: overload is still reported as 429 / 503
+        await slot.enter_async_context(admission.slot())
+    except Overloaded as e:
+        raise HTTPException(e.status, e.reason, headers={"Retry-After": str(e.retry_after)}) from None
+
+    async def events():
+        stream = engine.stream(
+            req.topic, mode=req.mode, urls=req.urls or None, rerank_budget_ms=req.rerank_budget_ms
+        )
+        async with aclosing(iterate_in_threads(stream, stream_threads)) as evs:
+            async for ev in evs:
+                if ev.kind == "token":
+                    yield _sse("token", {"text": ev.data})
+                else:
+                    yield _sse("done", {
+                        "topic": req.topic,
+                        "mode": req.mode,
+                        "answer_md": ev.data.answer,
+                        "trace_path": ev.data.trace_path,
+                    })
+    return _AdmittedStream(events(), slot, media_type="text/event-stream")
+
+class BatchRequest(BaseModel):
+    topics: list[str]
+    mode: str = "offline"
+    urls: list[str] = []
+
+@app.post("/briefings/batch", status_code=202)
+def briefings_batch(req: BatchRequest):
+    if not req.topics:
+        raise HTTPException(422, "topics must not be empty")
+    if len(req.topics) > engine.s.job_max_topics:
+        raise HTTPException(422, f"at most {engine.s.job_max_topics} topics per batch")
+    job = jobs.submit(req.topics, mode=req.mode, urls=req.urls or None)
+    return jobs.store.summary(job)
+
+def _job(job_id: str):
+    job = jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown job")
+    return job
+
+@app.get("/briefings/jobs/{job_id}")
+def job_status(job_id: str):
+    return jobs.store.summary(_job(job_id))
+
+@app.get("/briefings/jobs/{job_id}/result")
+def job_result(job_id: str):
+    # partial while the job runs: the topics finished so far, in submission order
+    job = _job(job_id)
+    return {**jobs.store.summary(job), "results": jobs.store.results(job_id)}
+
+@app.post("/briefings/jobs/{job_id}/cancel")
+def job_cancel(job_id: str):
+    # takes effect between batches: finished topics keep their results
+    _job(job_id)
+    return jobs.store.summary(jobs.store.cancel(job_id))
+
+@app.get("/livez")
+def livez():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    ready = engine.readiness()
+    return JSONResponse(ready, status_code=200 if ready["state"] == "ready" else 503)
+
+@app.get("/models")
+def models():
+    return {"models": registry.stats()}
+
+@app.get("/stats")
+def stats():
+    return {
+        "admission": admission.stats(),
+        "inflight": len(inflight),
+        "briefing_cache": engine.briefings.stats() if engine.briefings else None,
+        "fetch_cache": engine.fetcher.cache.stats() if engine.fetcher.cache else None,
+        "jobs": jobs.stats(),
+        "warm_up": engine.readiness(),
+        "llm": engine.llm.client.stats() if hasattr(engine.llm, "client") else None,
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Prometheus text format; gauges are sampled at scrape time
+    for k, v in admission.stats().items():
+        metrics.set(f"briefing_admission_{k}", v)
+    metrics.set("briefing_inflight", len(inflight))
+    metrics.set("briefing_ready", float(engine.state == "ready"))
+    if engine.briefings is not None:
+        metrics.set("briefing_cache_entries", engine.briefings.stats()["entries"])
+    if hasattr(engine.llm, "client"):
+        metrics.set("briefing_llm_circuit_open", float(engine.llm.client.breaker.state != "closed"))
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
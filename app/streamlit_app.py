@@ -1,26 +1,102 @@
+from collections import OrderedDict
+
 import streamlit as st
 from core.engine import Engine
 
+SESSION_CACHE_SIZE = 32  # results kept per browser session (per cache)
+
 st.set_page_config(page_title="Agentic Research Briefing RAG", layout="wide")
 st.title("Agentic Research & Briefing Copilot (Compact Core)")
 
-engine = Engine()
+@st.cache_resource(show_spinner="Loading models and index…")
+def get_engine() -> Engine:
+    # One engine (models, index, caches) per server process, shared by every session. Streamlit
+    # re-runs this script on each interaction; the engine must survive those re-runs.
+    engine = Engine()
+    engine.warm_up()
+    return engine
+
+def session_cache(name: str) -> OrderedDict:
+    # LRU of this session's results, keyed by (corpus version, topic, mode, URLs)
+    return st.session_state.setdefault(name, OrderedDict())
+
+def remember(cache: OrderedDict, key: tuple, value) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > SESSION_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def show_trace(trace, cached: bool) -> None:
+    st.sidebar.subheader("Stage timings")
+    if cached:
+        st.sidebar.caption("Served from this session's cache: timings of the original run.")
+    st.sidebar.dataframe(trace.timings(), hide_index=True, use_container_width=True)
+    st.sidebar.caption(
+        f"Corpus: {trace.meta.get('num_chunks', 0)} chunks, version {trace.meta.get('index_version', '-')}"
+        f" · briefing cache: {trace.meta.get('cache', '-')}"
+    )
+
+def show_evidence(retrieved) -> None:
+    st.write(f"Retrieved chunks: {len(retrieved)}")
+    st.write(f"Distinct sources: {len({c.source for c in retrieved})}")
+    with st.expander("Evidence"):
+        for c in retrieved:
+            pages = f" (p. {c.page_start}–{c.page_end})" if c.page_start is not None else ""
+            st.markdown(f"**{c.title}**{pages} — `{c.source}`")
+            st.caption(c.text[:400] + ("…" if len(c.text) > 400 else ""))
+
+engine = get_engine()
 
 topic = st.text_input("Topic", placeholder="e.g., agentic AI trends for enterprise product teams")
 mode = st.selectbox("Mode", ["offline", "online"], index=0)
 urls = st.text_area("Seed URLs (optional, one per line)", height=120).strip().splitlines()
 urls = [u.strip() for u in urls if u.strip()]
 
+b1, b2 = st.columns([1, 1])
+generate = b1.button("Generate briefing", type="primary", disabled=not topic.strip())
+preview = b2.button("Retrieve evidence only", disabled=not topic.strip())
 col1, col2 = st.columns([2, 1])
+answer = col1.empty()
 
-if st.button("Generate briefing", type="primary", disabled=not topic.strip()):
-    run = engine.run(topic.strip(), mode=mode, urls=urls or None)
+briefings, evidence = session_cache("briefings"), session_cache("evidence")
+if generate or preview:
+    engine.index.refresh()  # a stat scan: brings the corpus version up to date (incremental update)
+    key = (engine.index.version, topic.strip(), mode, tuple(urls) if mode == "online" else ())
+    st.session_state["shown"] = ("briefing" if generate else "evidence", key)
 
-    with col1:
-        st.markdown(run.answer)
+    # evidence-only fallback answers (LLM unavailable) are retried on the next press
+    if generate and (key not in briefings or "llm_fallback" in briefings[key].trace.meta):
+        streamed = ""
+        for ev in engine.stream(key[1], mode=mode, urls=urls or None):
+            if ev.kind == "token":
+                streamed += ev.data
+                answer.markdown(streamed)
+            else:
+                run = ev.data
+        remember(briefings, key, run)
+        remember(evidence, key, (run.retrieved, run.trace))
+        st.session_state["fresh"] = key
+    elif preview and key not in evidence:
+        with st.spinner("Retrieving…"):
+            remember(evidence, key, engine.retrieve(key[1], mode=mode, urls=urls or None))
+        st.session_state["fresh"] = key
 
+# the last result stays on screen across re-runs (widget changes) until another one is requested
+kind, key = st.session_state.get("shown", (None, None))
+cached = st.session_state.get("fresh") != key
+if kind == "briefing" and key in briefings:
+    run = briefings[key]
+    # the quality gate may have replaced the streamed text with an abstention
+    answer.markdown(run.answer)
     with col2:
         st.subheader("Run artifacts")
         st.write(f"Trace: {run.trace_path}")
-        st.write(f"Retrieved chunks: {len(run.retrieved)}")
-        st.write(f"Distinct sources: {len({c.source for c in run.retrieved})}")
+        show_evidence(run.retrieved)
+    show_trace(run.trace, cached)
+elif kind == "evidence" and key in evidence:
+    retrieved, trace = evidence[key]
+    with col2:
+        st.subheader("Evidence preview")
+        show_evidence(retrieved)
+    show_trace(trace, cached)
+st.session_state["fresh"] = None
@@ -0,0 +1,302 @@
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+import argparse, json, platform, re, resource, sys, tempfile
+
+import numpy as np
+
+from core.config import Settings
+from core.bm25 import SparseBM25
+from core.dense import DenseConfig, build_dense_index
+from core.evidence import EvidenceConfig, format_evidence, select_evidence
+from core.guardrails import EMAIL, IBAN, INJECTION_PATTERNS, PHONE, quality_gate, scan_document
+from core.ingest import ingest_files
+from core.llm import FakeLLM, LLMRequest, BRIEFING_SYSTEM, BRIEFING_TEMPLATE
+from core.models import get_embedder
+from core.observability import rss_mb
+from core.rag import Chunk, Doc, HybridRetriever, chunk_doc, embed_chunks
+from core.rerank import RerankConfig, Reranker
+
+# latency fields compared against a baseline report
+COMPARED = ("p50_ms", "p95_ms")
+
+# ---------- synthetic corpora ----------
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1:], 1)
+    return int(float(s.rstrip("km")) * mult)
+
+def _vocab(n: int, rng: np.random.Generator) -> np.ndarray:
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    lens = rng.integers(3, 10, size=n)
+    return np.array(["".join(rng.choice(letters, size=k)) for k in lens])
+
+@dataclass(frozen=True)
+class Corpus:
+    docs: list[Doc]
+    chunks: list[Chunk]
+    queries: list[str]
+
+def synthetic_corpus(
+    n_chunks: int, chunks_per_doc: int = 20, words_per_chunk: int = 120, n_queries: int = 200, seed: int = 0
+) -> Corpus:
+    # Zipf-distributed words over a fixed vocabulary: realistic posting-list skew for BM25.
+    # Chunks are generated directly (index-side stages); docs are their concatenation (ingest/chunking).
+    rng = np.random.default_rng(seed)
+    vocab = _vocab(20_000, rng)
+    chunks: list[Chunk] = []
+    docs: list[Doc] = []
+    for d in range(-(-n_chunks // chunks_per_doc)):
+        n = min(chunks_per_doc, n_chunks - d * chunks_per_doc)
+        ids = (rng.zipf(1.2, size=(n, words_per_chunk)) - 1) % len(vocab)
+        texts = [" ".join(vocab[row]) for row in ids]
+        doc_id, source = f"doc{d}", f"synthetic/doc{d}.md"
+        chunks.extend(
+            Chunk(f"{doc_id}::chunk::{i}", doc_id, source, f"Doc {d}", t) for i, t in enumerate(texts)
+        )
+        docs.append(Doc(doc_id, source, f"Doc {d}", "\n\n".join(texts), "page"))
+    picks = rng.choice(len(chunks), size=n_queries)
+    queries = [" ".join(rng.choice(chunks[i].text.split(), size=4)) for i in picks]
+    return Corpus(docs, chunks, queries)
+
+def synthetic_embeddings(sample: np.ndarray, n: int, seed: int = 0, block: int = 65_536) -> np.ndarray:
+    # Embedding 1M chunks with a real model is a benchmark of its own: the corpus vectors are the
+    # embedded sample plus noise (clustered like real data), the sample itself is timed separately.
+    rng = np.random.default_rng(seed)
+    out = np.empty((n, sample.shape[1]), dtype="float32")
+    for s in range(0, n, block):
+        e = min(n, s + block)
+        v = sample[rng.integers(0, sample.shape[0], size=e - s)]
+        v = v + rng.normal(scale=0.05, size=v.shape).astype("float32")
+        out[s:e] = v / np.linalg.norm(v, axis=1, keepdims=True)
+    return out
+
+# ---------- measurement ----------
+
+def summarize(samples: list[float], n_items: int | None = None) -> dict:
+    ms = np.asarray(samples) * 1000
+    total = float(sum(samples))
+    n = n_items if n_items is not None else len(samples)
+    return {
+        "n": n,
+        "total_s": total,
+        "per_s": n / total if total else None,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+def timed(fn: Callable[..., object], *args, **kwargs) -> tuple[object, float]:
+    t0 = perf_counter()
+    out = fn(*args, **kwargs)
+    return out, perf_counter() - t0
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def bench_size(
+    n_chunks: int,
+    s: Settings,
+    n_queries: int = 200,
+    ingest_docs: int = 500,
+    embed_sample: int = 2_000,
+    rerank: bool = True,
+    seed: int = 0,
+    log: Callable[[str], None] = lambda _: None,
+) -> dict:
+    out: dict[str, dict] = {}
+    corpus = synthetic_corpus(n_chunks, n_queries=n_queries, seed=seed)
+    log(f"{n_chunks} chunks: corpus ready")
+
+    # ingestion: parse page files (capped; parsing cost is per file, not per corpus)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for d in corpus.docs[:ingest_docs]:
+            p = Path(tmp) / f"{d.doc_id}.md"
+            p.write_text(d.text, encoding="utf-8")
+            paths.append(p)
+        _, dt = timed(ingest_files, paths, s.ingest_workers)
+        out["ingest"] = summarize([dt], len(paths))
+
+    times = [timed(scan_document, d.text)[1] for d in corpus.docs]
+    out["guardrails"] = summarize(times, len(corpus.docs))
+
+    times = []
+    for d in corpus.docs:
+        _, dt = timed(chunk_doc, d)
+        times.append(dt)
+    out["chunk"] = summarize(times, len(corpus.docs))
+
+    embedder = get_embedder(s.dense_model)
+    sample = corpus.chunks[: min(embed_sample, n_chunks)]
+    sample_emb, dt = timed(embed_chunks, embedder, sample)
+    out["embed"] = summarize([dt], len(sample))
+    emb = synthetic_embeddings(sample_emb, n_chunks, seed=seed)
+    log(f"{n_chunks} chunks: ingest/chunk/embed done")
+
+    bm25, dt = timed(SparseBM25, (c.text for c in corpus.chunks))
+    out["bm25_build"] = summarize([dt], n_chunks)
+    dense = DenseConfig.from_settings(s)
+    (index, backend), dt = timed(build_dense_index, emb, dense)
+    out["faiss_build"] = {**summarize([dt], n_chunks), "backend": backend}
+    log(f"{n_chunks} chunks: indexes built ({backend})")
+
+    retriever = HybridRetriever(
+        corpus.chunks, dense_model=s.dense_model, rerank=False, embeddings=emb,
+        bm25=bm25, dense_index=index, dense=dense, dense_backend=backend,
+    )
+    results, vectors, times = [], [], []
+    for q in corpus.queries:
+        v: dict = {}
+        r, dt = timed(retriever.search, q, bm25_k=s.bm25_k, dense_k=s.dense_k, top_k=s.top_k, vectors=v)
+        results.append(r)
+        vectors.append(v)
+        times.append(dt)
+    out["search"] = summarize(times)
+
+    if rerank:
+        # score cache disabled: every query pays for the cross-encoder
+        cfg = RerankConfig.from_settings(s)
+        reranker = Reranker(replace(cfg, cache_size=0))
+        n_cand = cfg.n_candidates(s.top_k)
+        cands = [retriever.search(q, s.bm25_k, s.dense_k, n_cand) for q in corpus.queries]
+        times = [timed(reranker.rerank, q, c, s.top_k)[1] for q, c in zip(corpus.queries, cands)]
+        out["rerank"] = summarize(times)
+
+    ev_cfg = EvidenceConfig.from_settings(s, "fake")
+    evidence, times = [], []
+    for q, r, v in zip(corpus.queries, results, vectors):
+        ev, dt = timed(select_evidence, q, r, v, ev_cfg.budget_tokens, ev_cfg)
+        evidence.append(ev)
+        times.append(dt)
+    out["evidence"] = {**summarize(times), "mean_tokens": float(np.mean([e.tokens for e in evidence]))}
+
+    llm = FakeLLM()
+    answers, times = [], []
+    for q, ev in zip(corpus.queries, evidence):
+        req = LLMRequest(BRIEFING_SYSTEM, BRIEFING_TEMPLATE.format(topic=q, evidence=format_evidence(ev.citations)))
+        a, dt = timed(llm.generate, req)
+        answers.append(a)
+        times.append(dt)
+    out["write_fake_llm"] = summarize(times)
+
+    times = [
+        timed(quality_gate, a, {c.source for c in ev.citations}, s.min_distinct_sources, len(ev.citations))[1]
+        for a, ev in zip(answers, evidence)
+    ]
+    out["quality_gate"] = summarize(times)
+    out["memory"] = {"peak_rss_mb": peak_rss_mb(), "rss_mb": rss_mb()}
+    log(f"{n_chunks} chunks: done")
+    return out
+
+# ---------- guardrails on large text ----------
+
+PII_SAMPLES = ("Jane.Doe@example.com", "+33 6 12 34 56 78", "DE89370400440532013000")
+
+def pii_text(size_mb: float, pii_every: int = 200, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    vocab = _vocab(20_000, rng)
+    n_words = int(size_mb * 1024 * 1024 / 7)  # ~6 letters + a space per word
+    words = vocab[(rng.zipf(1.2, size=n_words) - 1) % len(vocab)].tolist()
+    for i in range(0, n_words, pii_every):
+        words[i] = PII_SAMPLES[(i // pii_every) % len(PII_SAMPLES)]
+    return " ".join(words)
+
+def _multi_pass(text: str) -> tuple[bool, str]:
+    # the previous guardrail path: lowercase + one search per injection pattern, then one pass per PII type
+    t = text.lower()
+    injection = any(re.search(p, t) for p in INJECTION_PATTERNS)
+    text = EMAIL.sub("[REDACTED_EMAIL]", text)
+    text = PHONE.sub("[REDACTED_PHONE]", text)
+    return injection, IBAN.sub("[REDACTED_IBAN]", text)
+
+def guardrail_benchmark(size_mb: float = 20, seed: int = 0) -> dict:
+    text = pii_text(size_mb, seed=seed)
+    _, multi_s = timed(_multi_pass, text)
+    res, single_s = timed(scan_document, text)
+    return {
+        "mb": len(text) / (1024 * 1024),
+        "multi_pass_s": multi_s,
+        "single_pass_s": single_s,
+        "single_pass_mb_per_s": len(text) / (1024 * 1024) / single_s,
+        "speedup": multi_s / single_s,
+        "matches": res.counts(),
+    }
+
+# ---------- baseline comparison ----------
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2, min_delta_ms: float = 1.0) -> list[str]:
+    # A stage regresses when a compared latency grows by more than `tolerance` (relative) and
+    # `min_delta_ms` (absolute, so sub-millisecond noise never fails a run).
+    regressions = []
+    for size, stages in current["sizes"].items():
+        base_stages = baseline.get("sizes", {}).get(size, {})
+        for stage, m in stages.items():
+            b = base_stages.get(stage, {})
+            for field in COMPARED:
+                if field not in m or field not in b:
+                    continue
+                if m[field] > b[field] * (1 + tolerance) and m[field] - b[field] > min_delta_ms:
+                    regressions.append(f"{size} {stage}.{field}: {b[field]:.2f} -> {m[field]:.2f} ms")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-stage benchmark of the briefing pipeline on synthetic corpora.")
+    ap.add_argument("--sizes", default="1k,10k", help="comma-separated chunk counts, e.g. 1k,10k,100k,1M")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--ingest-docs", type=int, default=500, help="files parsed in the ingest stage")
+    ap.add_argument("--embed-sample", type=int, default=2000, help="chunks embedded with the real model")
+    ap.add_argument("--no-rerank", action="store_true")
+    ap.add_argument("--guardrails-mb", type=float, default=0, help="also scan this much PII-laden text")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    ap.add_argument("--baseline", default=None, help="fail (exit 1) on regressions against this report")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--min-delta-ms", type=float, default=1.0)
+    args = ap.parse_args()
+
+    s = Settings()
+    log = lambda msg: print(msg, file=sys.stderr)  # noqa: E731
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "dense_model": s.dense_model,
+            "rerank_model": s.rerank_model if not args.no_rerank else None,
+            "dense_index": s.dense_index,
+            "queries": args.queries,
+            "seed": args.seed,
+        },
+        "sizes": {},
+    }
+    for size in args.sizes.split(","):
+        n = parse_size(size)
+        report["sizes"][str(n)] = bench_size(
+            n, s, n_queries=args.queries, ingest_docs=args.ingest_docs, embed_sample=args.embed_sample,
+            rerank=not args.no_rerank, seed=args.seed, log=log,
+        )
+
+    if args.guardrails_mb:
+        report["guardrails_large_text"] = guardrail_benchmark(args.guardrails_mb, seed=args.seed)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        regressions = compare(
+            report, json.loads(Path(args.baseline).read_text(encoding="utf-8")), args.tolerance, args.min_delta_ms
+        )
+        for r in regressions:
+            log(f"REGRESSION {r}")
+        if regressions:
+            sys.exit(1)
+        log("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
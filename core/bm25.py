@@ -0,0 +1,264 @@
+from __future__ import annotations
+from bisect import bisect_right
+from itertools import chain
+from typing import Callable, Iterable
+import re, unicodedata
+
+import numpy as np
+
+TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str) -> list[str]:
+    # NFKC + casefold, then word characters only: "RAG," / "rag" / "ＲＡＧ" all map to "rag"
+    return TOKEN.findall(unicodedata.normalize("NFKC", text).casefold())
+
+def whitespace_tokenize(text: str) -> list[str]:
+    # the historical `lower().split()` tokenizer, kept for score parity with rank_bm25
+    return text.lower().split()
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # Indices of the k best scores, best first; ties keep index order (same as a stable full sort).
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        thr = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        above = np.flatnonzero(scores > thr)
+        ties = np.flatnonzero(scores == thr)[: k - above.shape[0]]
+        cand = np.concatenate([above, ties])
+    else:
+        cand = np.arange(n)
+    order = np.lexsort((cand, -scores[cand]))
+    out = cand[order]
+    return out[np.isfinite(scores[out])]
+
+# Postings of added docs collect in a small delta segment and removed docs are tombstoned; both are
+# merged into the main segment once they outgrow this share of it (or DELTA_MIN postings)
+DELTA_MIN = 4096
+DELTA_RATIO = 0.125
+
+# Okapi BM25 over a CSR inverted index (term -> postings of (row, tf)); scores are identical to
+# rank_bm25.BM25Okapi, including its epsilon floor for negative idf.
+# Doc ids are positions: add() appends, remove() deletes and shifts later docs down, like a list.
+# Internally every doc keeps the row it was added as, so an update costs O(changed docs), plus an
+# amortised merge; arrays are never modified in place, which keeps copy() cheap.
+class SparseBM25:
+    def __init__(
+        self,
+        texts: Iterable[str] = (),
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        tokenizer: Callable[[str], list[str]] = tokenize,
+    ):
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.tokenizer = tokenizer
+        self.vocab: dict[str, int] = {}
+        self.df = np.zeros(0, dtype=np.int64)  # per term: live docs containing it
+        self.doc_len = np.zeros(0, dtype=np.float32)  # per row
+        self.dl_sum = 0.0  # over live docs
+        self.live: np.ndarray | None = None  # doc id -> row once docs were removed (None: the same)
+        # main segment: postings ascending by row within each term
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.post_doc = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+        # delta segment: postings of rows added since the last merge, sorted by term
+        self.delta_term = np.zeros(0, dtype=np.int64)
+        self.delta_doc = np.zeros(0, dtype=np.int32)
+        self.delta_tf = np.zeros(0, dtype=np.float32)
+        # forward index, one entry per add(): (first row, row offsets, terms, tfs), e.g. for remove()
+        self.fwd: list[tuple[int, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._update_stats()
+        self.add(texts)
+
+    def __len__(self) -> int:
+        return int(self.doc_len.shape[0] if self.live is None else self.live.shape[0])
+
+    def copy(self) -> "SparseBM25":
+        new = SparseBM25.__new__(SparseBM25)
+        new.__dict__.update(self.__dict__)
+        new.vocab = dict(self.vocab)
+        new.fwd = list(self.fwd)
+        return new
+
+    # ---------- mutation ----------
+
+    def add(self, texts: Iterable[str]) -> None:
+        docs_toks = [self.tokenizer(t) for t in texts]
+        if not docs_toks:
+            return
+        row0, m = self.doc_len.shape[0], len(docs_toks)
+        lens = np.fromiter(map(len, docs_toks), dtype=np.int64, count=m)
+        flat = list(chain.from_iterable(docs_toks))
+        vocab = self.vocab
+        for t in dict.fromkeys(flat):  # new terms get ids in first-seen order
+            if t not in vocab:
+                vocab[t] = len(vocab)
+        tids = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+        doc_of = np.repeat(np.arange(m, dtype=np.int64), lens)
+        # (doc, term) pairs -> term frequencies in one vectorised pass, ordered by doc then term
+        pairs, tfs = np.unique(doc_of * len(vocab) + tids, return_counts=True)
+        local, terms, tfs = pairs // len(vocab), pairs % len(vocab), tfs.astype(np.float32)
+        ptr = np.concatenate([[0], np.cumsum(np.bincount(local, minlength=m))])
+        self.fwd.append((row0, ptr, terms.astype(np.int32), tfs))
+
+        self.doc_len = np.concatenate([self.doc_len, lens.astype(np.float32)])
+        self.dl_sum += float(lens.sum())
+        df = np.zeros(len(vocab), dtype=np.int64)
+        df[: self.df.shape[0]] = self.df
+        self.df = df + np.bincount(terms, minlength=len(vocab))
+        if self.live is not None:
+            self.live = np.concatenate([self.live, np.arange(row0, row0 + m)])
+        # new rows are the highest, so a stable sort keeps rows ascending within each term
+        order = np.argsort(np.concatenate([self.delta_term, terms]), kind="stable")
+        self.delta_term = np.concatenate([self.delta_term, terms])[order]
+        self.delta_doc = np.concatenate([self.delta_doc, (row0 + local).astype(np.int32)])[order]
+        self.delta_tf = np.concatenate([self.delta_tf, tfs])[order]
+        self._maybe_merge()
+        self._update_stats()
+
+    def remove(self, ids: Iterable[int]) -> None:
+        ids = np.unique(np.fromiter(ids, dtype=np.int64))
+        if not ids.size:
+            return
+        live = self.live if self.live is not None else np.arange(self.doc_len.shape[0])
+        rows = live[ids]
+        keep = np.ones(live.shape[0], dtype=bool)
+        keep[ids] = False
+        self.live = live[keep]
+        firsts = [f[0] for f in self.fwd]
+        terms = []
+        for r in rows.tolist():
+            first, ptr, fterms, _ = self.fwd[bisect_right(firsts, r) - 1]
+            terms.append(fterms[ptr[r - first]:ptr[r - first + 1]])
+        self.df = self.df - np.bincount(np.concatenate(terms), minlength=len(self.vocab))
+        self.dl_sum -= float(self.doc_len[rows].astype(np.float64).sum())
+        self._maybe_merge()
+        self._update_stats()
+
+    def _maybe_merge(self) -> None:
+        dead = self.doc_len.shape[0] - len(self)
+        if (
+            self.delta_term.shape[0] > max(DELTA_MIN, DELTA_RATIO * self.post_doc.shape[0])
+            or dead > DELTA_RATIO * self.doc_len.shape[0]
+        ):
+            self._merge()
+
+    def _merge(self) -> None:
+        # one main segment over the live docs, rows renumbered to doc ids
+        rows = np.concatenate([
+            first + np.repeat(np.arange(ptr.shape[0] - 1), np.diff(ptr)) for first, ptr, _, _ in self.fwd
+        ]) if self.fwd else np.zeros(0, dtype=np.int64)
+        terms = np.concatenate([f[2] for f in self.fwd]) if self.fwd else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate([f[3] for f in self.fwd]) if self.fwd else np.zeros(0, dtype=np.float32)
+        if self.live is not None:
+            new_id = np.full(self.doc_len.shape[0], -1, dtype=np.int64)
+            new_id[self.live] = np.arange(self.live.shape[0])
+            rows = new_id[rows]
+            keep = rows >= 0
+            rows, terms, tfs = rows[keep], terms[keep], tfs[keep]
+            self.doc_len = self.doc_len[self.live]
+            self.live = None
+        # rows are ascending (batches in row order, each by doc then term), so a stable sort suffices
+        order = np.argsort(terms, kind="stable")
+        self.post_doc = rows[order].astype(np.int32)
+        self.post_tf = tfs[order]
+        counts = np.bincount(terms, minlength=len(self.vocab))
+        self.indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        ptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(self)))])
+        self.fwd = [(0, ptr, terms, tfs)]
+        self.delta_term = np.zeros(0, dtype=np.int64)
+        self.delta_doc = np.zeros(0, dtype=np.int32)
+        self.delta_tf = np.zeros(0, dtype=np.float32)
+
+    def _update_stats(self) -> None:
+        n = len(self)
+        df = self.df.astype(np.float64)
+        present = df > 0
+        idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+        idf[~present] = 0.0
+        self.idf_mean = float(idf[present].mean()) if present.any() else 0.0
+        if present.any():
+            idf[present & (idf < 0)] = self.epsilon * self.idf_mean
+        self.idf = idf
+        self._set_norm(self.dl_sum / n if n else 0.0)
+
+    def _set_norm(self, avgdl: float) -> None:
+        # per-row length normalisation k1 * (1 - b + b * dl / avgdl), precomputed once per mutation
+        dl = self.doc_len.astype(np.float64)
+        self.avgdl = avgdl
+        self.norm = self.k1 * (1 - self.b + self.b * dl / avgdl) if avgdl else np.full(dl.shape[0], self.k1)
+
+    # ---------- corpus-wide statistics (sharding) ----------
+
+    def term_stats(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        # per vocabulary term: document frequency and first document containing it (-1 when none)
+        if self.delta_term.shape[0] or self.live is not None:
+            self._merge()
+        df = np.diff(self.indptr)
+        first = np.full(df.shape[0], -1, dtype=np.int64)
+        present = df > 0
+        first[present] = self.post_doc[self.indptr[:-1][present]]  # postings are ascending per term
+        return list(self.vocab), df, first
+
+    def use_stats(self, idf: np.ndarray, avgdl: float) -> None:
+        # score with corpus-wide idf (one value per vocabulary term) and average length instead of this
+        # index's own, e.g. when it holds one shard of a corpus; add() / remove() revert to local stats
+        self.idf = idf
+        self._set_norm(avgdl)
+
+    # ---------- scoring ----------
+
+    def get_scores(self, query: str | list[str]) -> np.ndarray:
+        toks = self.tokenizer(query) if isinstance(query, str) else query
+        scores = np.zeros(self.doc_len.shape[0], dtype=np.float64)
+        for t in toks:  # repeated query terms count again, as in BM25Okapi
+            tid = self.vocab.get(t)
+            if tid is None:
+                continue
+            if tid < self.indptr.shape[0] - 1:
+                s, e = self.indptr[tid], self.indptr[tid + 1]
+                self._accumulate(scores, self.idf[tid], self.post_doc[s:e], self.post_tf[s:e])
+            s, e = np.searchsorted(self.delta_term, tid), np.searchsorted(self.delta_term, tid, "right")
+            self._accumulate(scores, self.idf[tid], self.delta_doc[s:e], self.delta_tf[s:e])
+        return scores if self.live is None else scores[self.live]
+
+    def _accumulate(self, scores: np.ndarray, idf: float, docs: np.ndarray, tf: np.ndarray) -> None:
+        if docs.shape[0]:
+            tf = tf.astype(np.float64)
+            scores[docs] += idf * (tf * (self.k1 + 1) / (tf + self.norm[docs]))
+
+    def search(self, query: str | list[str], k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = self.get_scores(query)
+        idx = top_k(scores, k)
+        return idx, scores[idx]
+
+# Read-only BM25 over two indexes, e.g. the corpus plus a request's few extra documents, whose ids
+# follow the base's. The base keeps its own statistics (other requests share it); the extra index is
+# scored with document frequencies and length over both, so BM25 is exact for the base and close for
+# the extras (same as for an extra shard, see core/shards.py).
+class StackedBM25:
+    def __init__(self, base: SparseBM25, extra: SparseBM25):
+        self.base, self.extra = base, extra
+        n = len(base) + len(extra)
+        in_base = np.fromiter(
+            (base.df[base.vocab[t]] if t in base.vocab else 0 for t in extra.vocab), dtype=np.float64,
+            count=len(extra.vocab),
+        )
+        df = extra.df + in_base
+        idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+        idf[idf < 0] = extra.epsilon * (base.idf_mean if len(base) else extra.idf_mean)
+        extra.use_stats(idf, (base.dl_sum + extra.dl_sum) / n if n else 0.0)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.extra)
+
+    def search(self, query: str | list[str], k: int) -> tuple[np.ndarray, np.ndarray]:
+        toks = self.base.tokenizer(query) if isinstance(query, str) else query
+        b_ids, b_scores = self.base.search(toks, k)
+        e_ids, e_scores = self.extra.search(toks, k)
+        ids = np.concatenate([b_ids, e_ids + len(self.base)])
+        scores = np.concatenate([b_scores, e_scores])
+        order = np.lexsort((ids, -scores))[:k]  # best first, ties in id order (like top_k)
+        return ids[order], scores[order]
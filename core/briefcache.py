@@ -0,0 +1,105 @@
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+import hashlib, json, os, shutil, threading, time
+
+from core.serving import briefing_key
+
+def prompt_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8") + b"\0")
+    return h.hexdigest()[:16]
+
+def cache_key(topic: str, mode: str, urls: list[str] | None, llm: str, prompt: str, extra: Any = ()) -> str:
+    # the corpus version is not part of the digest: entries are namespaced by it instead (see invalidate)
+    raw = json.dumps([*briefing_key(topic, mode, urls), llm, prompt, extra], ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+# Cache of finished briefings per corpus version: LRU + TTL in memory, optionally backed by one JSON
+# file per entry under <root>/<version>/ so answers survive restarts and are shared between workers.
+class BriefingCache:
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_s: float = 3600,
+        root: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s  # 0 = entries never expire
+        self.root = Path(root) if root else None
+        self.clock = clock
+        self._mem: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _dir(self, version: str) -> Path:
+        return self.root / (version or "empty")
+
+    def _path(self, version: str, key: str) -> Path:
+        return self._dir(version) / f"{key}.json"
+
+    def _expired(self, entry: dict) -> bool:
+        return bool(self.ttl_s) and self.clock() - entry["created"] > self.ttl_s
+
+    def _remember(self, k: tuple[str, str], entry: dict) -> None:
+        self._mem[k] = entry
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _read(self, version: str, key: str) -> dict | None:
+        if self.root is None:
+            return None
+        try:
+            return json.loads(self._path(version, key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def get(self, version: str, key: str) -> dict | None:
+        k = (version, key)
+        with self._lock:
+            entry = self._mem.get(k)
+            if entry is None:
+                entry = self._read(version, key)
+                if entry is not None:
+                    self._remember(k, entry)
+            if entry is not None and self._expired(entry):
+                self._mem.pop(k, None)
+                if self.root is not None:
+                    self._path(version, key).unlink(missing_ok=True)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._mem.move_to_end(k)
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, version: str, key: str, value: dict) -> None:
+        entry = {"created": self.clock(), "version": version, "value": value}
+        with self._lock:
+            self._remember((version, key), entry)
+            if self.root is not None:
+                path = self._path(version, key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, path)
+
+    def invalidate(self, keep_version: str | None = None) -> None:
+        # drop every entry that was not computed against `keep_version` (None: drop everything)
+        with self._lock:
+            for k in [k for k in self._mem if k[0] != keep_version]:
+                del self._mem[k]
+            if self.root is not None and self.root.exists():
+                keep = self._dir(keep_version) if keep_version is not None else None
+                for d in self.root.iterdir():
+                    if d.is_dir() and d != keep:
+                        shutil.rmtree(d, ignore_errors=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._mem), "hits": self.hits, "misses": self.misses}
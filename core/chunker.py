@@ -0,0 +1,146 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+import re
+
+from core.chunkstore import SEP, Chunk
+from core.config import Settings
+from core.guardrails import StreamScanner
+
+# A document flows through ingestion as (page, text) pieces: PDF pages (1-based), fixed-size blocks of
+# a text file (page None), or one piece for an in-memory Doc. Every stage below is a generator, so
+# memory is bounded by the chunk size plus one piece, never by the document size.
+Piece = tuple[int | None, str]
+
+WS = re.compile(r"\s+")
+SNAPS = ("none", "sentence", "token")
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?= )")
+BLOCK_CHARS = 1 << 16
+
+@dataclass(frozen=True)
+class ChunkConfig:
+    size: int = 900  # characters per window
+    overlap: int = 120  # characters shared by consecutive windows
+    snap: str = "none"  # none | sentence | token: move window ends back to a boundary
+
+    def __post_init__(self):
+        if self.snap not in SNAPS:
+            raise ValueError(f"unknown chunk snap {self.snap!r} (expected one of {', '.join(SNAPS)})")
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "ChunkConfig":
+        return cls(size=s.chunk_size, overlap=s.chunk_overlap, snap=s.chunk_snap)
+
+# ---------- sources ----------
+
+def joined(pieces: Iterable[Piece], sep: str = "\n") -> Iterator[Piece]:
+    # "sep".join(...) as a stream: the separator is emitted with the following piece
+    for k, (page, text) in enumerate(pieces):
+        yield page, sep + text if k else text
+
+def text_blocks(path: Path, block: int = BLOCK_CHARS) -> Iterator[Piece]:
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for text in iter(lambda: f.read(block), ""):
+            yield None, text
+
+# ---------- normalization ----------
+
+def normalize_ws(pieces: Iterable[Piece]) -> Iterator[Piece]:
+    # re.sub(r"\s+", " ", "".join(texts)).strip(), one piece at a time: a whitespace run that spans
+    # piece boundaries collapses into one space, emitted in front of the next non-blank piece
+    started = pending = False
+    for page, text in pieces:
+        n = WS.sub(" ", text)
+        core = n.strip(" ")
+        if not core:
+            pending = pending or bool(n)
+            continue
+        yield page, " " + core if started and (pending or n[0] == " ") else core
+        started, pending = True, n[-1] == " "
+
+# ---------- windows ----------
+
+def _snap_end(t: str, start: int, end: int, snap: str) -> int:
+    # last sentence end (else token boundary) in the second half of the window; t[end] is available
+    lo = start + (end - start) // 2
+    if snap == "sentence":
+        last = None
+        for last in SENTENCE_END.finditer(t, lo, end + 1):
+            pass
+        if last is not None:
+            return last.end()
+    space = t.rfind(" ", lo, end + 1)
+    return space if space > lo else end
+
+def window_chunks(
+    pieces: Iterable[Piece], doc_id: str, source: str, title: str, cfg: ChunkConfig = ChunkConfig()
+) -> Iterator[Chunk]:
+    # Same windows as slicing the whole normalized text: [start, start + size), next start at
+    # end - overlap. Only the current window (plus one piece of lookahead) is held in memory.
+    it = iter(pieces)
+    buf, base, eof = "", 0, False  # buf holds the normalized text from absolute offset `base`
+    marks: list[tuple[int, int | None]] = []  # (absolute offset, page) where each piece starts
+
+    def fill(upto: int) -> None:
+        nonlocal buf, eof
+        parts = [buf]
+        have = base + len(buf)
+        while not eof and have < upto:
+            try:
+                page, text = next(it)
+            except StopIteration:
+                eof = True
+                break
+            if text:
+                marks.append((have, page))
+                parts.append(text)
+                have += len(text)
+        buf = "".join(parts)
+
+    def page_at(pos: int) -> int | None:
+        page = None
+        for offset, p in marks:
+            if offset > pos:
+                break
+            page = p
+        return page
+
+    start, i = 0, 0
+    fill(cfg.size + 1)
+    while start < base + len(buf):
+        total = base + len(buf)
+        end = min(total, start + cfg.size)
+        if cfg.snap != "none" and end < total:
+            end = base + _snap_end(buf, start - base, end - base, cfg.snap)
+        raw = buf[start - base:end - base]
+        text = raw.strip()
+        if text:
+            first = start + len(raw) - len(raw.lstrip())
+            last = start + len(raw.rstrip()) - 1
+            yield Chunk(f"{doc_id}{SEP}{i}", doc_id, source, title, text, page_at(first), page_at(last))
+            i += 1
+        nxt = end - cfg.overlap if end - cfg.overlap > start else end
+        if cfg.snap != "none" and nxt < end and buf[nxt - base - 1] != " ":
+            space = buf.find(" ", nxt - base, end - base)
+            if space != -1:
+                nxt = base + space + 1  # overlap starts on a token
+        start = nxt
+
+        # drop what no later window can reach
+        buf, base = buf[start - base:], start
+        live = [j for j, (offset, _) in enumerate(marks) if offset <= start]
+        if live:
+            del marks[:live[-1]]
+        fill(start + cfg.size + 1)
+
+def stream_chunks(
+    pieces: Iterable[Piece], doc_id: str, source: str, title: str, cfg: ChunkConfig = ChunkConfig(),
+    scanner: StreamScanner | None = None,
+) -> Iterator[Chunk]:
+    # normalize -> (guardrail scan + redaction) -> windows; check `scanner.injection` once the
+    # stream is exhausted (the scan stops at the first injection)
+    text = normalize_ws(pieces)
+    if scanner is not None:
+        text = scanner.redact(text)
+    return window_chunks(text, doc_id, source, title, cfg)
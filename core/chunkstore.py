@@ -0,0 +1,230 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+import json, os
+
+import numpy as np
+
+@dataclass(frozen=True)
+class Chunk:
+    chunk_id: str
+    doc_id: str
+    source: str
+    title: str
+    text: str
+    page_start: int | None = None  # 1-based PDF pages the chunk spans; None for non-paged sources
+    page_end: int | None = None
+
+SEP = "::chunk::"  # chunk_doc ids: f"{doc_id}{SEP}{ordinal}"
+
+# On-disk layout (inside an index directory)
+TEXT_BUF = "chunk_text.bin"
+COLUMNS = "chunk_columns.npz"
+DOC_TABLE = "chunk_docs.json"
+
+def _utf8(texts: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    blobs = [t.encode("utf-8") for t in texts]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    return np.frombuffer(b"".join(blobs), dtype=np.uint8), offsets
+
+# Columnar chunk storage: per-document strings live once in a doc table, chunks are integer rows
+# (doc index, ordinal, page range, byte offsets into one UTF-8 text buffer that can be memory-mapped).
+# Indexing returns a Chunk view built on demand, so callers keep the list-of-Chunk API.
+# `tail` holds request-scoped chunks (online URLs) appended without copying the base columns.
+class ChunkStore:
+    def __init__(
+        self,
+        doc_ids: list[str],
+        sources: list[str],
+        titles: list[str],
+        doc_idx: np.ndarray,
+        ordinal: np.ndarray,
+        offsets: np.ndarray,
+        buf: np.ndarray,
+        odd_ids: dict[int, str] | None = None,
+        tail: tuple[Chunk, ...] = (),
+        pages: np.ndarray | None = None,
+    ):
+        self.doc_ids, self.sources, self.titles = doc_ids, sources, titles
+        self.doc_idx = doc_idx  # int32 per row
+        self.ordinal = ordinal  # int32 per row; -1 when the chunk id is not in the chunk_doc format
+        self.offsets = offsets  # int64, len = rows + 1
+        self.buf = buf  # uint8 (ndarray or np.memmap)
+        self.odd_ids = odd_ids or {}  # row -> chunk_id for ids that do not follow the chunk_doc format
+        self.tail = tail
+        # int32 (rows, 2): first / last page per row, -1 when unknown
+        self.pages = pages if pages is not None else np.full((len(doc_idx), 2), -1, dtype=np.int32)
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Chunk]) -> "ChunkStore":
+        chunks = list(chunks)
+        doc_ids: list[str] = []
+        sources: list[str] = []
+        titles: list[str] = []
+        doc_index: dict[str, int] = {}
+        doc_idx = np.empty(len(chunks), dtype=np.int32)
+        ordinal = np.empty(len(chunks), dtype=np.int32)
+        odd_ids: dict[int, str] = {}
+        pages = np.full((len(chunks), 2), -1, dtype=np.int32)
+        for i, c in enumerate(chunks):
+            d = doc_index.get(c.doc_id)
+            if d is None:
+                d = doc_index[c.doc_id] = len(doc_ids)
+                doc_ids.append(c.doc_id)
+                sources.append(c.source)
+                titles.append(c.title)
+            doc_idx[i] = d
+            prefix, _, k = c.chunk_id.rpartition(SEP)
+            if prefix == c.doc_id and k.isdigit():
+                ordinal[i] = int(k)
+            else:
+                ordinal[i] = -1
+                odd_ids[i] = c.chunk_id
+            if c.page_start is not None:
+                pages[i] = (c.page_start, c.page_end)
+        buf, offsets = _utf8(c.text for c in chunks)
+        return cls(doc_ids, sources, titles, doc_idx, ordinal, offsets, buf, odd_ids, pages=pages)
+
+    # ---------- read ----------
+
+    @property
+    def n_base(self) -> int:
+        return int(self.doc_idx.shape[0])
+
+    def __len__(self) -> int:
+        return self.n_base + len(self.tail)
+
+    def text(self, i: int) -> str:
+        if i >= self.n_base:
+            return self.tail[i - self.n_base].text
+        return self.buf[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        for i in range(self.n_base):
+            yield self.text(i)
+        for c in self.tail:
+            yield c.text
+
+    def chunk_id(self, i: int) -> str:
+        if i >= self.n_base:
+            return self.tail[i - self.n_base].chunk_id
+        k = int(self.ordinal[i])
+        return self.odd_ids[i] if k < 0 else f"{self.doc_ids[self.doc_idx[i]]}{SEP}{k}"
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if i >= self.n_base:
+            return self.tail[i - self.n_base]
+        d = int(self.doc_idx[i])
+        first, last = (int(p) if p >= 0 else None for p in self.pages[i])
+        return Chunk(
+            self.chunk_id(i), self.doc_ids[d], self.sources[d], self.titles[d], self.text(i), first, last
+        )
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def source_mask(self, sources: set[str]) -> np.ndarray:
+        # rows (base columns only) whose document comes from one of `sources`
+        docs = np.fromiter((s in sources for s in self.sources), dtype=bool, count=len(self.sources))
+        return docs[self.doc_idx] if docs.size else np.zeros(self.n_base, dtype=bool)
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.doc_idx, self.ordinal, self.offsets, self.pages, self.buf))
+
+    # ---------- copy-on-write updates ----------
+
+    def take(self, keep: np.ndarray) -> "ChunkStore":
+        # compacted copy holding the base rows where `keep` (bool mask) is set
+        lens = np.diff(self.offsets)
+        buf = self.buf[np.repeat(keep, lens)]
+        offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(lens[keep], out=offsets[1:])
+        used, doc_idx = np.unique(self.doc_idx[keep], return_inverse=True)
+        rows = np.flatnonzero(keep)
+        new_row = {int(r): i for i, r in enumerate(rows)}
+        odd = {new_row[r]: cid for r, cid in self.odd_ids.items() if r in new_row}
+        return ChunkStore(
+            [self.doc_ids[d] for d in used], [self.sources[d] for d in used], [self.titles[d] for d in used],
+            doc_idx.astype(np.int32), self.ordinal[keep].copy(), offsets, np.ascontiguousarray(buf), odd,
+            pages=self.pages[keep].copy(),
+        )
+
+    def concat(self, chunks: list[Chunk]) -> "ChunkStore":
+        other = ChunkStore.from_chunks(chunks)
+        doc_ids, sources, titles = list(self.doc_ids), list(self.sources), list(self.titles)
+        index = {d: i for i, d in enumerate(doc_ids)}
+        remap = np.empty(len(other.doc_ids), dtype=np.int32)
+        for j, d in enumerate(other.doc_ids):
+            if d not in index:
+                index[d] = len(doc_ids)
+                doc_ids.append(d)
+                sources.append(other.sources[j])
+                titles.append(other.titles[j])
+            remap[j] = index[d]
+        n = self.n_base
+        return ChunkStore(
+            doc_ids, sources, titles,
+            np.concatenate([self.doc_idx, remap[other.doc_idx]]).astype(np.int32),
+            np.concatenate([self.ordinal, other.ordinal]).astype(np.int32),
+            np.concatenate([self.offsets[:-1], other.offsets + self.offsets[-1]]),
+            np.concatenate([np.asarray(self.buf), other.buf]),
+            {**self.odd_ids, **{n + r: cid for r, cid in other.odd_ids.items()}},
+            pages=np.concatenate([self.pages, other.pages]),
+        )
+
+    def with_tail(self, chunks: list[Chunk]) -> "ChunkStore":
+        # shares every column with `self`; only the extra chunks are held as objects
+        return ChunkStore(
+            self.doc_ids, self.sources, self.titles, self.doc_idx, self.ordinal, self.offsets, self.buf,
+            self.odd_ids, self.tail + tuple(chunks), self.pages,
+        )
+
+    # ---------- persistence ----------
+
+    def save(self, root: Path) -> None:
+        if self.tail:
+            raise ValueError("request-scoped chunks are not persisted")
+        root.mkdir(parents=True, exist_ok=True)
+        tmp = root / (TEXT_BUF + ".tmp")
+        np.asarray(self.buf).tofile(tmp)
+        os.replace(tmp, root / TEXT_BUF)
+        np.savez(
+            root / COLUMNS, doc_idx=self.doc_idx, ordinal=self.ordinal, offsets=self.offsets, pages=self.pages
+        )
+        table = {
+            "doc_ids": self.doc_ids,
+            "sources": self.sources,
+            "titles": self.titles,
+            "odd_ids": {str(r): cid for r, cid in self.odd_ids.items()},
+        }
+        (root / DOC_TABLE).write_text(json.dumps(table, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, root: Path, mmap: bool = True) -> "ChunkStore":
+        table = json.loads((root / DOC_TABLE).read_text(encoding="utf-8"))
+        cols = np.load(root / COLUMNS)
+        path = root / TEXT_BUF
+        if mmap and path.stat().st_size:
+            buf = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            buf = np.fromfile(path, dtype=np.uint8)
+        return cls(
+            table["doc_ids"], table["sources"], table["titles"],
+            cols["doc_idx"], cols["ordinal"], cols["offsets"], buf,
+            {int(r): cid for r, cid in table["odd_ids"].items()},
+            pages=cols["pages"],
+        )
+
+    @classmethod
+    def empty(cls) -> "ChunkStore":
+        return cls.from_chunks([])
@@ -10,17 +10,92 @@ class Settings(BaseSettings):
     ollama_base_url: str = Field(default="http://localhost:11434", alias="OLLAMA_BASE_URL")
     ollama_model: str = Field(default="llama3.1", alias="OLLAMA_MODEL")
 
+    # provider client (core/llmclient.py)
+    llm_max_concurrency: int = Field(default=8, alias="LLM_MAX_CONCURRENCY")
+    llm_tokens_per_min: int = Field(default=0, alias="LLM_TOKENS_PER_MIN")  # 0 = unlimited
+    llm_retries: int = Field(default=3, alias="LLM_RETRIES")
+    llm_backoff_s: float = Field(default=0.5, alias="LLM_BACKOFF_S")
+    llm_backoff_max_s: float = Field(default=8.0, alias="LLM_BACKOFF_MAX_S")
+    llm_breaker_failures: int = Field(default=5, alias="LLM_BREAKER_FAILURES")  # 0 = never open
+    llm_breaker_reset_s: float = Field(default=30.0, alias="LLM_BREAKER_RESET_S")
+    llm_hedge_after_s: float = Field(default=0.0, alias="LLM_HEDGE_AFTER_S")  # 0 = no hedged requests
+
     top_k: int = Field(default=12, alias="TOP_K")
     bm25_k: int = Field(default=30, alias="BM25_K")
     dense_k: int = Field(default=30, alias="DENSE_K")
     rerank: bool = Field(default=True, alias="RERANK")
+    dense_model: str = Field(default="sentence-transformers/all-MiniLM-L6-v2", alias="DENSE_MODEL")
+    rerank_model: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2", alias="RERANK_MODEL")
+    rerank_candidates: int = Field(default=0, alias="RERANK_CANDIDATES")  # 0 = max(2 * TOP_K, 20)
+    rerank_batch_size: int = Field(default=16, alias="RERANK_BATCH_SIZE")
+    rerank_cache_size: int = Field(default=50_000, alias="RERANK_CACHE_SIZE")
+    rerank_quantize: bool = Field(default=False, alias="RERANK_QUANTIZE")
+    rerank_budget_ms: float = Field(default=0, alias="RERANK_BUDGET_MS")  # 0 = no budget
+
+    dense_index: str = Field(default="auto", alias="DENSE_INDEX")  # auto | flat | ivf | hnsw | ivfpq | sq8
+    dense_nlist: int = Field(default=0, alias="DENSE_NLIST")  # 0 = ~4 * sqrt(n)
+    dense_nprobe: int = Field(default=16, alias="DENSE_NPROBE")
+    hnsw_m: int = Field(default=32, alias="HNSW_M")
+    hnsw_ef_search: int = Field(default=64, alias="HNSW_EF_SEARCH")
+    pq_m: int = Field(default=0, alias="PQ_M")  # 0 = dim / 4
+    # a trained quantizer (IVF / PQ) is refitted once the corpus outgrows its training set by this factor
+    dense_retrain_ratio: float = Field(default=2.0, alias="DENSE_RETRAIN_RATIO")
+
+    chunk_size: int = Field(default=900, alias="CHUNK_SIZE")  # characters
+    chunk_overlap: int = Field(default=120, alias="CHUNK_OVERLAP")
+    chunk_snap: str = Field(default="none", alias="CHUNK_SNAP")  # none | sentence | token
 
     data_raw_pdfs: str = Field(default="data/raw/pdfs", alias="DATA_RAW_PDFS")
     data_raw_pages: str = Field(default="data/raw/pages", alias="DATA_RAW_PAGES")
     data_runs: str = Field(default="data/runs", alias="DATA_RUNS")
+    data_index: str = Field(default="data/index", alias="DATA_INDEX")
+    data_emb_cache: str = Field(default="data/cache/embeddings", alias="DATA_EMB_CACHE")
+    emb_cache: bool = Field(default=True, alias="EMB_CACHE")
+    data_briefing_cache: str = Field(default="", alias="DATA_BRIEFING_CACHE")  # empty = memory only
+    briefing_cache: bool = Field(default=True, alias="BRIEFING_CACHE")
+    briefing_cache_size: int = Field(default=256, alias="BRIEFING_CACHE_SIZE")
+    briefing_cache_ttl: float = Field(default=3600, alias="BRIEFING_CACHE_TTL")  # seconds; 0 = no expiry
+
+    ingest_workers: int = Field(default=0, alias="INGEST_WORKERS")  # 0 = one per CPU
+    guard_workers: int = Field(default=1, alias="GUARD_WORKERS")  # guardrail scan processes; 0 = one per CPU
+    fetch_workers: int = Field(default=8, alias="FETCH_WORKERS")
+    fetch_per_host: int = Field(default=2, alias="FETCH_PER_HOST")
+    fetch_timeout: float = Field(default=20, alias="FETCH_TIMEOUT")
+    fetch_cache: bool = Field(default=True, alias="FETCH_CACHE")
+    data_fetch_cache: str = Field(default="data/cache/fetch", alias="DATA_FETCH_CACHE")
+    fetch_cache_ttl: float = Field(default=3600, alias="FETCH_CACHE_TTL")  # then revalidated; 0 = every time
+    fetch_offline: bool = Field(default=False, alias="FETCH_OFFLINE")  # replay: serve only from the fetch cache
+
+    max_concurrency: int = Field(default=64, alias="MAX_CONCURRENCY")
+    max_queue: int = Field(default=256, alias="MAX_QUEUE")
+    queue_timeout: float = Field(default=30, alias="QUEUE_TIMEOUT")
+    retrieve_workers: int = Field(default=4, alias="RETRIEVE_WORKERS")
+    retrieval_shards: int = Field(default=0, alias="RETRIEVAL_SHARDS")  # shard processes; 0 = in-process index
+
+    data_jobs: str = Field(default="data/jobs", alias="DATA_JOBS")
+    job_workers: int = Field(default=1, alias="JOB_WORKERS")  # worker processes; 0 = a thread of the API process
+    job_batch_size: int = Field(default=16, alias="JOB_BATCH_SIZE")  # topics retrieved / reranked per call
+    job_max_topics: int = Field(default=500, alias="JOB_MAX_TOPICS")
+    batch_llm_workers: int = Field(default=8, alias="BATCH_LLM_WORKERS")  # concurrent LLM calls per batch
+
+    trace_async: bool = Field(default=True, alias="TRACE_ASYNC")
+    trace_queue_size: int = Field(default=10_000, alias="TRACE_QUEUE_SIZE")
+    trace_batch_size: int = Field(default=256, alias="TRACE_BATCH_SIZE")
+    trace_rotate_mb: float = Field(default=64, alias="TRACE_ROTATE_MB")  # 0 = no size-based rotation
+    trace_rotate_s: float = Field(default=0, alias="TRACE_ROTATE_S")  # 0 = no time-based rotation
+    trace_compress: bool = Field(default=True, alias="TRACE_COMPRESS")
+    trace_keep: int = Field(default=20, alias="TRACE_KEEP")  # rotated logs kept; 0 = all
+    trace_sample_rate: float = Field(default=1.0, alias="TRACE_SAMPLE_RATE")  # share of runs with a full JSON file
+    trace_memory: bool = Field(default=False, alias="TRACE_MEMORY")  # RSS delta per span
 
     min_distinct_sources: int = Field(default=2, alias="MIN_DISTINCT_SOURCES")
     max_citations: int = Field(default=8, alias="MAX_CITATIONS")
+    # estimated prompt tokens (system + template + evidence) per LLM provider
+    prompt_budget: int = Field(default=1000, alias="PROMPT_BUDGET")  # providers without their own budget
+    prompt_budget_openai: int = Field(default=1200, alias="PROMPT_BUDGET_OPENAI")
+    prompt_budget_ollama: int = Field(default=800, alias="PROMPT_BUDGET_OLLAMA")
+    evidence_sentences: int = Field(default=2, alias="EVIDENCE_SENTENCES")  # per cited source
+    evidence_mmr_lambda: float = Field(default=0.7, alias="EVIDENCE_MMR_LAMBDA")  # relevance vs. diversity
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,214 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING
+import argparse, json, math
+
+import numpy as np
+
+from core.config import Settings
+
+if TYPE_CHECKING:
+    import faiss
+
+BACKENDS = ("flat", "ivf", "hnsw", "ivfpq", "sq8")
+# below this many vectors a trained backend cannot be fitted sensibly and exact search is used
+MIN_TRAIN = {"ivf": 39 * 4, "ivfpq": 4096}
+
+@dataclass(frozen=True)
+class DenseConfig:
+    backend: str = "auto"  # auto | flat | ivf | hnsw | ivfpq | sq8
+    nlist: int = 0  # IVF cells; 0 = ~4 * sqrt(n)
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_search: int = 64
+    pq_m: int = 0  # PQ sub-quantizers; 0 = largest divisor of dim <= dim / 4
+    retrain_ratio: float = 2.0  # refit a trained quantizer once n exceeds this many times its training set
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "DenseConfig":
+        return cls(
+            backend=s.dense_index, nlist=s.dense_nlist, nprobe=s.dense_nprobe,
+            hnsw_m=s.hnsw_m, ef_search=s.hnsw_ef_search, pq_m=s.pq_m, retrain_ratio=s.dense_retrain_ratio,
+        )
+
+def choose_backend(n: int) -> str:
+    # exact search is fast enough (and free of recall loss) for small corpora
+    if n < 50_000:
+        return "flat"
+    if n < 2_000_000:
+        return "hnsw"
+    return "ivfpq"
+
+def resolve_backend(cfg: DenseConfig, n: int) -> str:
+    backend = choose_backend(n) if cfg.backend == "auto" else cfg.backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown dense index backend: {backend!r} (expected one of {BACKENDS} or 'auto')")
+    if n < MIN_TRAIN.get(backend, 0):
+        return "flat"
+    return backend
+
+def _nlist(cfg: DenseConfig, n: int) -> int:
+    # faiss wants ~39+ training points per centroid
+    nlist = cfg.nlist or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39 or 1))
+
+def _pq_m(cfg: DenseConfig, dim: int) -> int:
+    if cfg.pq_m:
+        return cfg.pq_m
+    return max(m for m in range(1, dim // 4 + 1) if dim % m == 0)
+
+def factory_string(backend: str, cfg: DenseConfig, n: int, dim: int) -> str:
+    if backend == "flat":
+        return "Flat"
+    if backend == "ivf":
+        return f"IVF{_nlist(cfg, n)},Flat"
+    if backend == "hnsw":
+        return f"HNSW{cfg.hnsw_m},Flat"
+    if backend == "ivfpq":
+        return f"IVF{_nlist(cfg, n)},PQ{_pq_m(cfg, dim)}"
+    return "SQ8"
+
+def configure(index: faiss.Index, cfg: DenseConfig) -> faiss.Index:
+    # search-time knobs are not (all) persisted with the index, so they are re-applied after loading
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(cfg.nprobe, ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = cfg.ef_search
+    return index
+
+def build_dense_index(
+    emb: np.ndarray, cfg: DenseConfig = DenseConfig(), template: faiss.Index | None = None
+) -> tuple[faiss.Index, str]:
+    # `template` is a previously trained index of the same backend: its quantizer is reused
+    # (clone + reset) so an incremental rebuild does not have to retrain.
+    import faiss  # imported with the first index, not with this module (see core/rag.py)
+
+    n, dim = emb.shape
+    backend = resolve_backend(cfg, n)
+    if template is not None and template.d == dim:
+        index = faiss.clone_index(template)
+        index.reset()
+    else:
+        index = faiss.index_factory(dim, factory_string(backend, cfg, n, dim), faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            index.train(emb)
+    index.add(emb)
+    return configure(index, cfg), backend
+
+def needs_retraining(cfg: DenseConfig, n: int, trained_n: int) -> bool:
+    # IVF centroids / PQ codebooks fitted on `trained_n` vectors no longer fit a corpus that has grown
+    # well past them (cells overfill, recall drops at the same nprobe): refit instead of reusing them
+    return trained_n <= 0 or n > cfg.retrain_ratio * trained_n
+
+def extend_dense_index(index: faiss.Index, emb: np.ndarray, cfg: DenseConfig) -> faiss.Index:
+    # a copy of `index` (which may be serving queries) with `emb` appended: nothing is retrained, and an
+    # HNSW graph is extended instead of rebuilt
+    import faiss
+
+    out = faiss.clone_index(index)
+    out.add(emb)
+    return configure(out, cfg)
+
+# ---------- request-scoped vectors ----------
+
+# Read-only dense search over a shared index plus a small exact index of a request's extra vectors,
+# whose ids follow the base's: per query, the two top-k lists are merged by score. Nothing of the
+# base is copied, so the cost is O(extras) per request (see also core.bm25.StackedBM25).
+class StackedIndex:
+    def __init__(self, base: faiss.Index, extra: np.ndarray):
+        import faiss
+
+        self.base = base
+        self.extra = faiss.IndexFlatIP(base.d)
+        self.extra.add(np.ascontiguousarray(extra, dtype=np.float32))
+        self.d = base.d
+        self.ntotal = base.ntotal + self.extra.ntotal
+
+    def search(self, q: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        b_d, b_i = self.base.search(q, k)
+        e_d, e_i = self.extra.search(q, min(k, self.extra.ntotal))
+        e_i = np.where(e_i >= 0, e_i + self.base.ntotal, -1)
+        d, i = np.hstack([b_d, e_d]), np.hstack([b_i, e_i])
+        d = np.where(i >= 0, d, -np.inf)
+        order = np.argsort(-d, axis=1, kind="stable")[:, :k]  # ties: base first
+        return np.take_along_axis(d, order, 1), np.take_along_axis(i, order, 1)
+
+class StackedRows:
+    # row lookup over base + extra embeddings without stacking them into one matrix
+    def __init__(self, base: np.ndarray, extra: np.ndarray):
+        self.base, self.extra = base, extra
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.extra)
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        n = len(self.base)
+        return self.base[row] if row < n else self.extra[row - n]
+
+# ---------- recall vs. latency report ----------
+
+def _percentile_ms(xs: list[float], p: float) -> float:
+    return float(np.percentile(np.asarray(xs) * 1000, p)) if xs else 0.0
+
+def recall_report(
+    emb: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    backends: tuple[str, ...] = BACKENDS,
+    cfg: DenseConfig = DenseConfig(),
+) -> list[dict]:
+    exact, _ = build_dense_index(emb, DenseConfig(backend="flat"))
+    _, truth = exact.search(queries, k)
+    report = []
+    for backend in backends:
+        b_cfg = DenseConfig(**{**asdict(cfg), "backend": backend})
+        t0 = perf_counter()
+        index, _ = build_dense_index(emb, b_cfg)
+        build_s = perf_counter() - t0
+        lat, found = [], []
+        for q in queries:
+            t0 = perf_counter()
+            _, ids = index.search(q[None, :], k)
+            lat.append(perf_counter() - t0)
+            found.append(ids[0])
+        recall = np.mean([len(set(f.tolist()) & set(t.tolist())) / k for f, t in zip(found, truth)])
+        report.append({
+            "backend": backend,
+            "factory": factory_string(backend, b_cfg, *emb.shape),
+            "recall_at_k": float(recall),
+            "k": k,
+            "build_s": build_s,
+            "p50_ms": _percentile_ms(lat, 50),
+            "p95_ms": _percentile_ms(lat, 95),
+        })
+    return report
+
+def main():
+    ap = argparse.ArgumentParser(description="Recall@k vs. latency of dense index backends against exact search.")
+    ap.add_argument("--index", default=None, help="index directory (default: DATA_INDEX)")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--backends", default=",".join(BACKENDS))
+    args = ap.parse_args()
+
+    s = Settings()
+    root = Path(args.index or s.data_index)
+    manifest = json.loads((root / "manifest.json").read_text(encoding="utf-8"))
+    emb = np.load(root / manifest["data"] / "embeddings.npy")
+    rng = np.random.default_rng(0)
+    # queries: corpus vectors with a little noise, re-normalised (in-distribution, not exact duplicates)
+    q = emb[rng.choice(emb.shape[0], size=min(args.queries, emb.shape[0]), replace=False)]
+    q = q + rng.normal(scale=0.05, size=q.shape).astype("float32")
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    backends = tuple(args.backends.split(","))
+    report = recall_report(emb, q.astype("float32"), args.k, backends, DenseConfig.from_settings(s))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+import hashlib, json, os, re, threading
+
+import numpy as np
+
+try:  # POSIX only; without it the cache is still correct for a single writer process
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+KEY_BYTES = 16
+VECTORS = "vectors.f32"
+KEYS = "keys.bin"
+META = "meta.json"
+LOCK = ".lock"
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+def _model_dir(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "__", model_name)
+
+# Content-addressed embedding cache, one directory per model:
+#   vectors.f32  raw float32 rows, appended and read back through np.memmap (pages shared across processes)
+#   keys.bin     16-byte blake2b digest of the chunk text per row, same order as vectors.f32
+class EmbeddingCache:
+    def __init__(self, root: str, model_name: str):
+        self.model_name = model_name
+        self.dir = Path(root) / _model_dir(model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim: int | None = None
+        self.rows: dict[bytes, int] = {}
+        self._keys_read = 0  # bytes of keys.bin already indexed
+        self._vectors: np.memmap | None = None
+        self._lock = threading.Lock()
+        meta = self.dir / META
+        if meta.exists():
+            self.dim = json.loads(meta.read_text(encoding="utf-8"))["dim"]
+        self._sync()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.dir / LOCK, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _n_vectors(self) -> int:
+        path = self.dir / VECTORS
+        if self.dim is None or not path.exists():
+            return 0
+        return path.stat().st_size // (4 * self.dim)
+
+    def _sync(self) -> None:
+        # pick up rows appended by other processes since the last sync
+        keys_path = self.dir / KEYS
+        if not keys_path.exists() or self.dim is None:
+            return
+        n = min(keys_path.stat().st_size // KEY_BYTES, self._n_vectors())
+        if n * KEY_BYTES > self._keys_read:
+            with open(keys_path, "rb") as f:
+                f.seek(self._keys_read)
+                data = f.read(n * KEY_BYTES - self._keys_read)
+            start = self._keys_read // KEY_BYTES
+            for i in range(len(data) // KEY_BYTES):
+                self.rows.setdefault(data[i * KEY_BYTES:(i + 1) * KEY_BYTES], start + i)
+            self._keys_read = n * KEY_BYTES
+        if n and (self._vectors is None or self._vectors.shape[0] != n):
+            self._vectors = np.memmap(self.dir / VECTORS, dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, keys: list[bytes]) -> tuple[np.ndarray | None, list[int]]:
+        # returns (vectors with zero rows for misses, indices of the misses)
+        missing = [i for i, k in enumerate(keys) if k not in self.rows]
+        if self.dim is None:
+            return None, missing
+        out = np.zeros((len(keys), self.dim), dtype=np.float32)
+        hit = [i for i, k in enumerate(keys) if k in self.rows]
+        if hit:
+            out[hit] = self._vectors[[self.rows[keys[i]] for i in hit]]
+        return out, missing
+
+    def add(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                (self.dir / META).write_text(
+                    json.dumps({"model": self.model_name, "dim": self.dim}), encoding="utf-8"
+                )
+            self._sync()
+            fresh, seen = [], set()
+            for i, k in enumerate(keys):
+                if k not in self.rows and k not in seen:
+                    seen.add(k)
+                    fresh.append(i)
+            if fresh:
+                # drop any torn tail left by a crashed writer so rows stay aligned with keys
+                n = self._keys_read // KEY_BYTES
+                with open(self.dir / VECTORS, "ab") as f:
+                    f.truncate(n * 4 * self.dim)
+                    f.write(vectors[fresh].tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.dir / KEYS, "ab") as f:
+                    f.truncate(n * KEY_BYTES)
+                    f.write(b"".join(keys[i] for i in fresh))
+            self._sync()
+
+    def encode(self, texts: list[str], encode: Callable[[list[str]], np.ndarray]) -> np.ndarray:
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            self._sync()
+            out, missing = self.lookup(keys)
+        if not missing:
+            return out if out is not None else np.zeros((0, 0), dtype=np.float32)
+        # only the misses go through the model, in one batch
+        fresh = np.asarray(encode([texts[i] for i in missing]), dtype=np.float32)
+        self.add([keys[i] for i in missing], fresh)
+        if out is None:
+            out = np.zeros((len(texts), fresh.shape[1]), dtype=np.float32)
+        out[missing] = fresh
+        return out
@@ -1,61 +1,269 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, asdict, astuple
+from functools import partial
+from time import perf_counter
+from typing import Any, Iterator
+import asyncio, threading
 
+from core.briefcache import BriefingCache, cache_key, prompt_hash
 from core.config import Settings
-from core.observability import Tracer, write_run
-from core.guardrails import quality_gate
+from core.observability import RunTrace, Tracer, metrics
+from core.guardrails import quality_gate, scan_many
 from core.llm import (
-    LLMRequest, NoLLM, OpenAIResponsesLLM, OllamaLLM,
+    LLMRequest, NoLLM, FakeLLM, OpenAIResponsesLLM, OllamaLLM,
     BRIEFING_SYSTEM, BRIEFING_TEMPLATE
 )
-from core.rag import build_chunks, HybridRetriever, make_citations, distinct_sources, Chunk
+from core.evidence import EvidenceConfig, format_evidence, select_evidence
+from core.fetchcache import FetchCache
+from core.index import IndexStore
+from core.ingest import IngestResult, UrlFetcher
+from core.llmclient import ClientConfig, LLMUnavailable, ProviderClient, estimate_tokens
+from core.models import registry
+from core.tracesink import TraceSink
+from core.rag import Citation, HybridRetriever, doc_chunks, distinct_sources, Chunk
+
+# trace meta written by the collect stage; in a batch it is collected once and copied to every topic
+BATCH_SHARED_META = ("num_chunks", "index_version", "ingest_errors", "guardrails")
 
 @dataclass
 class RunResult:
     answer: str
     retrieved: list[Chunk]
     trace_path: str | None = None
+    trace: RunTrace | None = None  # spans / meta of this run (also written by the trace sink)
+
+@dataclass(frozen=True)
+class StreamEvent:
+    kind: str  # token | done
+    data: Any  # str delta for "token", RunResult for "done"
 
 def _build_llm(s: Settings):
+    cfg = ClientConfig.from_settings(s)
     if s.llm_provider == "openai":
         if not s.openai_api_key:
             return NoLLM()
-        return OpenAIResponsesLLM(s.openai_api_key, s.openai_model)
+        return OpenAIResponsesLLM(s.openai_api_key, s.openai_model, ProviderClient("openai", cfg))
     if s.llm_provider == "ollama":
-        return OllamaLLM(s.ollama_base_url, s.ollama_model)
+        return OllamaLLM(s.ollama_base_url, s.ollama_model, ProviderClient("ollama", cfg))
+    if s.llm_provider == "fake":
+        return FakeLLM()
     return NoLLM()
 
 class Engine:
     def __init__(self, settings: Settings | None = None):
         self.s = settings or Settings()
         self.llm = _build_llm(self.s)
+        self.fallback_llm = NoLLM()  # evidence-only answer while the provider is unavailable
+        self.index = IndexStore.from_settings(self.s)
+        self.fetcher = UrlFetcher(
+            self.s.fetch_workers, self.s.fetch_per_host, self.s.fetch_timeout, FetchCache.from_settings(self.s)
+        )
+        # bounded pool for CPU-bound work on the async path (index refresh, retrieval, trace I/O)
+        self._executor = ThreadPoolExecutor(max_workers=self.s.retrieve_workers, thread_name_prefix="retrieve")
+        self.traces = TraceSink.from_settings(self.s)
+        self.briefings = (
+            BriefingCache(self.s.briefing_cache_size, self.s.briefing_cache_ttl, self.s.data_briefing_cache or None)
+            if self.s.briefing_cache else None
+        )
+        if self.briefings is not None:
+            # answers for older corpus versions can never be served again: drop them when the index changes
+            self.index.listeners.append(self.briefings.invalidate)
+        self._llm_id = f"{type(self.llm).__name__}:{getattr(self.llm, 'model', '')}"
+        self._provider = "none" if isinstance(self.llm, NoLLM) else self.s.llm_provider
+        self._prompt_hash = prompt_hash(BRIEFING_SYSTEM, BRIEFING_TEMPLATE)
+        self.evidence = EvidenceConfig.from_settings(self.s, self._provider)
+        # The constructor only wires objects together (no model, index or parser is loaded): warm_up()
+        # does the expensive part, explicitly, and readiness reports how far it got.
+        self.state = "cold"  # cold | warming | ready | failed
+        self._warm: dict[str, Any] = {}
+        self._warm_lock = threading.Lock()
+
+    def warm_up(self) -> list[dict]:
+        # load the shared models and the corpus index (applying pending changes) so the first request
+        # pays for neither; concurrent callers wait for the first one
+        with self._warm_lock:
+            if self.state == "ready":
+                return registry.stats()
+            self.state = "warming"
+            try:
+                t0 = perf_counter()
+                models = registry.warm_up(
+                    self.s.dense_model, self.s.rerank_model if self.s.rerank else None,
+                    quantized=self.s.rerank_quantize,
+                )
+                t1 = perf_counter()
+                self.index.refresh()
+                t2 = perf_counter()
+            except Exception as e:
+                self.state, self._warm = "failed", {"error": f"{type(e).__name__}: {e}"}
+                raise
+            self._warm = {
+                "models_s": round(t1 - t0, 3), "index_s": round(t2 - t1, 3),
+                "num_chunks": len(self.index.chunks), "index_version": self.index.version,
+            }
+            self.state = "ready"
+        return models
+
+    def readiness(self) -> dict[str, Any]:
+        return {"state": self.state, **self._warm}
+
+    def _tracer(self, topic: str) -> Tracer:
+        # the provider label ends up on the run / stage metrics
+        return Tracer(topic, {"provider": self._provider}, memory=self.s.trace_memory)
+
+    # ---------- briefing cache ----------
+
+    def _refresh(self, tracer: Tracer) -> None:
+        # once per request, first: brings the corpus version up to date (a stat scan; fires cache
+        # invalidation) for both the cache key and retrieval
+        with tracer.span("refresh"):
+            self.index.refresh()
+
+    def _prepare(
+        self, tracer: Tracer, topic: str, mode: str, urls: list[str] | None
+    ) -> tuple[tuple[str, str] | None, RunResult | None]:
+        self._refresh(tracer)
+        return self._lookup(tracer, topic, mode, urls)
 
-    def run(self, topic: str, mode: str = "offline", urls: list[str] | None = None) -> RunResult:
-        tracer = Tracer(topic)
+    def _lookup(
+        self, tracer: Tracer, topic: str, mode: str, urls: list[str] | None
+    ) -> tuple[tuple[str, str] | None, RunResult | None]:
+        # -> ((corpus version, key) to store the answer under, cached result or None)
+        if self.briefings is None:
+            return None, None
+        with tracer.span("cache") as span:
+            s = self.s
+            retrieval = (s.bm25_k, s.dense_k, s.top_k, s.rerank, s.min_distinct_sources, astuple(self.evidence))
+            slot = (self.index.version, cache_key(topic, mode, urls, self._llm_id, self._prompt_hash, retrieval))
+            hit = self.briefings.get(*slot)
+            span.meta["hit"] = hit is not None
+            tracer.meta["cache"] = "hit" if hit is not None else "miss"
+        if hit is None:
+            return slot, None
+        tracer.meta["index_version"] = slot[0]
+        tracer.meta["quality_ok"] = True  # only answers that passed the gate are cached
+        retrieved = [Chunk(**c) for c in hit["retrieved"]]
+        trace = tracer.finish()
+        return slot, RunResult(hit["answer"], retrieved, self.traces.submit(trace), trace)
+
+    def _store(self, tracer: Tracer, slot: tuple[str, str] | None, answer: str, retrieved: list[Chunk]) -> None:
+        # skipped when the index changed between lookup and retrieval (the key would name the wrong
+        # corpus), and for fallback answers (the provider should answer once it is back)
+        if slot is None or tracer.meta.get("index_version") != slot[0] or "llm_fallback" in tracer.meta:
+            return
+        self.briefings.put(*slot, {"answer": answer, "retrieved": [asdict(c) for c in retrieved]})
+
+    # ---------- stages ----------
 
+    def _collect(
+        self, tracer: Tracer, mode: str, urls: list[str] | None, fetched: list[IngestResult] | None = None
+    ) -> HybridRetriever | None:
         with tracer.span("collect"):
-            chunks = build_chunks(self.s.data_raw_pdfs, self.s.data_raw_pages, mode, urls)
-            tracer.meta["num_chunks"] = len(chunks)
+            if fetched is None:
+                with tracer.span("fetch"):
+                    online = mode == "online" and urls
+                    fetched = self.fetcher.fetch(urls, self.s.ingest_workers) if online else []
+            docs = [r for r in fetched if r.doc is not None]
+            scans = scan_many([r.doc.text for r in docs], self.s.guard_workers)
+            chunking = self.index.chunking
+            extra = [ch for r, scan in zip(docs, scans) for ch in doc_chunks(r.doc, scan, chunking)]
+            flagged = {r.key: scan.counts() for r, scan in zip(docs, scans) if scan.matches}
+            if flagged:
+                tracer.meta["guardrails"] = flagged
+            with tracer.span("index"):
+                retriever = self.index.with_extra(extra)
+            tracer.meta["num_chunks"] = len(retriever) if retriever else 0
+            tracer.meta["index_version"] = self.index.version
+            errors = {**self.index.errors, **{r.key: r.error for r in fetched if r.error}}
+            if errors:
+                tracer.meta["ingest_errors"] = errors
+        return retriever
 
-        with tracer.span("retrieve"):
-            retriever = HybridRetriever(chunks, rerank=self.s.rerank)
-            retrieved = retriever.search(topic, bm25_k=self.s.bm25_k, dense_k=self.s.dense_k, top_k=self.s.top_k)
+    def _retrieve(
+        self, tracer: Tracer, topic: str, mode: str, urls: list[str] | None,
+        fetched: list[IngestResult] | None = None, rerank_budget_ms: float | None = None,
+        vectors: dict | None = None, stages: dict | None = None,
+    ) -> list[Chunk]:
+        # `vectors` receives the query / chunk embeddings of the retrieval, reused by evidence selection;
+        # `stages` the ranking after every search stage (e.g. for evaluation)
+        retriever = self._collect(tracer, mode, urls, fetched)
+        with tracer.span("retrieve") as span:
+            retrieved = (
+                retriever.search(
+                    topic, bm25_k=self.s.bm25_k, dense_k=self.s.dense_k, top_k=self.s.top_k,
+                    rerank_budget_ms=rerank_budget_ms, info=span.meta, vectors=vectors, stages=stages,
+                )
+                if retriever else []
+            )
             tracer.meta["distinct_sources"] = len(distinct_sources(retrieved))
+        return retrieved
 
-        with tracer.span("write"):
-            cites = make_citations(retrieved, max_citations=self.s.max_citations)
-            evidence = "\n".join(
-                f"[{c.idx}] {c.title} — {c.source}\nExcerpt: {c.excerpt}\n" for c in cites
+    def retrieve(
+        self, topic: str, mode: str = "offline", urls: list[str] | None = None,
+        rerank_budget_ms: float | None = None,
+    ) -> tuple[list[Chunk], RunTrace]:
+        # Evidence only (e.g. a UI preview): no LLM call, no briefing cache, and the trace is neither
+        # written nor counted as a run.
+        tracer = self._tracer(topic)
+        self._refresh(tracer)
+        retrieved = self._retrieve(tracer, topic, mode, urls, rerank_budget_ms=rerank_budget_ms)
+        return retrieved, RunTrace(tracer.run_id, topic, tracer.spans, tracer.meta)
+
+    def _request(
+        self, tracer: Tracer, topic: str, retrieved: list[Chunk], vectors: dict
+    ) -> tuple[LLMRequest, list[Citation]]:
+        # the prompt's evidence: query-relevant sentences, diverse across sources, within the provider's
+        # prompt token budget; the citations (numbered as in the prompt) go on to the quality gate
+        with tracer.span("evidence") as span:
+            overhead = estimate_tokens(BRIEFING_SYSTEM) + estimate_tokens(BRIEFING_TEMPLATE.format(topic=topic, evidence=""))
+            ev = select_evidence(topic, retrieved, vectors, self.evidence.budget_tokens - overhead, self.evidence)
+            req = LLMRequest(
+                system=BRIEFING_SYSTEM, prompt=BRIEFING_TEMPLATE.format(topic=topic, evidence=format_evidence(ev.citations))
             )
-            req = LLMRequest(system=BRIEFING_SYSTEM, prompt=BRIEFING_TEMPLATE.format(topic=topic, evidence=evidence))
-            answer = self.llm.generate(req)
+            span.meta.update({"candidates": ev.candidates, "sentences": ev.sentences, "sources": len(ev.citations)})
+            tokens = estimate_tokens(req.system) + estimate_tokens(req.prompt)
+            tracer.meta["prompt_tokens"] = tokens
+            tracer.meta["prompt_budget"] = self.evidence.budget_tokens
+            metrics.inc("briefing_prompt_tokens_total", tokens, provider=self._provider)
+        return req, ev.citations
+
+    def _write(self, tracer: Tracer, req: LLMRequest) -> str:
+        try:
+            return self.llm.generate(req)
+        except LLMUnavailable as e:
+            tracer.meta["llm_fallback"] = str(e)
+            return self.fallback_llm.generate(req)
+
+    async def _awrite(self, tracer: Tracer, req: LLMRequest) -> str:
+        try:
+            return await self.llm.agenerate(req)
+        except LLMUnavailable as e:
+            tracer.meta["llm_fallback"] = str(e)
+            return self.fallback_llm.generate(req)
 
+    def _stream(self, tracer: Tracer, req: LLMRequest) -> Iterator[str]:
+        # the client only gives up before the response starts, so nothing was streamed yet
+        try:
+            yield from self.llm.stream(req)
+        except LLMUnavailable as e:
+            tracer.meta["llm_fallback"] = str(e)
+            yield from self.fallback_llm.stream(req)
+
+    def _finish(
+        self, tracer: Tracer, topic: str, answer: str, retrieved: list[Chunk], cites: list[Citation],
+        slot: tuple[str, str] | None = None,
+    ) -> RunResult:
         with tracer.span("quality_gate"):
-            sources = distinct_sources(retrieved)
-            q = quality_gate(answer, sources, min_sources=self.s.min_distinct_sources)
+            # only the sources (and citation numbers) the LLM was actually shown count
+            sources = {c.source for c in cites}
+            q = quality_gate(answer, sources, min_sources=self.s.min_distinct_sources, n_evidence=len(cites))
             tracer.meta["quality_ok"] = q.ok
             tracer.meta["quality_reason"] = q.reason
-            if not q.ok:
+            if q.ok:
+                self._store(tracer, slot, answer, retrieved)
+            else:
                 answer = (
                     f"# Briefing — {topic}\n\n"
                     f"**Abstained**: {q.reason}\n\n"
@@ -63,5 +271,131 @@ class Engine:
                 )
 
         trace = tracer.finish()
-        trace_path = write_run(trace, self.s.data_runs)
-        return RunResult(answer=answer, retrieved=retrieved, trace_path=trace_path)
+        trace_path = self.traces.submit(trace)
+        return RunResult(answer=answer, retrieved=retrieved, trace_path=trace_path, trace=trace)
+
+    def run(
+        self, topic: str, mode: str = "offline", urls: list[str] | None = None,
+        rerank_budget_ms: float | None = None, stages: dict | None = None,
+    ) -> RunResult:
+        tracer = self._tracer(topic)
+        slot, cached = self._prepare(tracer, topic, mode, urls)
+        if cached is not None:
+            return cached
+        vectors: dict = {}
+        retrieved = self._retrieve(
+            tracer, topic, mode, urls, rerank_budget_ms=rerank_budget_ms, vectors=vectors, stages=stages
+        )
+        req, cites = self._request(tracer, topic, retrieved, vectors)
+
+        with tracer.span("write"):
+            answer = self._write(tracer, req)
+
+        return self._finish(tracer, topic, answer, retrieved, cites, slot)
+
+    async def arun(
+        self, topic: str, mode: str = "offline", urls: list[str] | None = None,
+        rerank_budget_ms: float | None = None,
+    ) -> RunResult:
+        # Async path: network I/O (URL fetches, LLM) on the event loop, CPU-bound stages in self._executor.
+        loop = asyncio.get_running_loop()
+        tracer = self._tracer(topic)
+        slot, cached = await loop.run_in_executor(
+            self._executor, partial(self._prepare, tracer, topic, mode, urls)
+        )
+        if cached is not None:
+            return cached
+        with tracer.span("fetch"):
+            fetched = await self.fetcher.afetch(urls, self.s.ingest_workers) if mode == "online" and urls else []
+        vectors: dict = {}
+        retrieved = await loop.run_in_executor(
+            self._executor, partial(self._retrieve, tracer, topic, mode, urls, fetched, rerank_budget_ms, vectors)
+        )
+        req, cites = self._request(tracer, topic, retrieved, vectors)
+
+        with tracer.span("write"):
+            answer = await self._awrite(tracer, req)
+
+        return await loop.run_in_executor(
+            self._executor, partial(self._finish, tracer, topic, answer, retrieved, cites, slot)
+        )
+
+    def run_batch(
+        self, topics: list[str], mode: str = "offline", urls: list[str] | None = None
+    ) -> list[RunResult]:
+        # Many topics against one corpus: it is collected once, query embeddings and cross-encoder
+        # scores are computed in one batched call for all topics, and the LLM calls run concurrently.
+        # Every topic still gets its own trace, cache lookup and quality gate.
+        if not topics:
+            return []
+        tracers = [self._tracer(t) for t in topics]
+        results: list[RunResult | None] = [None] * len(topics)
+        slots: list[tuple[str, str] | None] = [None] * len(topics)
+        self._refresh(tracers[0])  # one corpus version for the whole batch
+        for i, (tracer, topic) in enumerate(zip(tracers, topics)):
+            tracer.meta["batch_size"] = len(topics)
+            slots[i], results[i] = self._lookup(tracer, topic, mode, urls)
+        todo = [i for i, r in enumerate(results) if r is None]
+        if not todo:
+            return results
+
+        lead = tracers[todo[0]]
+        retriever = self._collect(lead, mode, urls)
+        for i in todo[1:]:
+            tracers[i].meta.update({k: v for k, v in lead.meta.items() if k in BATCH_SHARED_META})
+        with ExitStack() as stack:
+            # one shared retrieval call, recorded as a "retrieve" span on every topic's trace
+            for i in todo:
+                stack.enter_context(tracers[i].span("retrieve", {"batched": len(todo)}))
+            s = self.s
+            vectors: list[dict] = [{} for _ in todo]
+            ranked = (
+                retriever.search_many([topics[i] for i in todo], s.bm25_k, s.dense_k, s.top_k, vectors)
+                if retriever else [[] for _ in todo]
+            )
+        for i, retrieved in zip(todo, ranked):
+            tracers[i].meta["distinct_sources"] = len(distinct_sources(retrieved))
+
+        def write(i: int, retrieved: list[Chunk], vecs: dict) -> RunResult:
+            req, cites = self._request(tracers[i], topics[i], retrieved, vecs)
+            with tracers[i].span("write"):
+                answer = self._write(tracers[i], req)
+            return self._finish(tracers[i], topics[i], answer, retrieved, cites, slots[i])
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(todo), s.batch_llm_workers))) as pool:
+            for i, run in zip(todo, pool.map(write, todo, ranked, vectors)):
+                results[i] = run
+        return results
+
+    def stream(
+        self, topic: str, mode: str = "offline", urls: list[str] | None = None,
+        rerank_budget_ms: float | None = None,
+    ) -> Iterator[StreamEvent]:
+        # Yields "token" events as the LLM produces them, then one "done" event with the RunResult.
+        # The quality gate runs on the full text, so the final answer may replace what was streamed.
+        tracer = self._tracer(topic)
+        slot, cached = self._prepare(tracer, topic, mode, urls)
+        if cached is not None:
+            yield StreamEvent("token", cached.answer)
+            yield StreamEvent("done", cached)
+            return
+        vectors: dict = {}
+        retrieved = self._retrieve(tracer, topic, mode, urls, rerank_budget_ms=rerank_budget_ms, vectors=vectors)
+        req, cites = self._request(tracer, topic, retrieved, vectors)
+
+        parts: list[str] = []
+        with tracer.span("write") as span:
+            t0 = perf_counter()
+            t_first = None
+            for delta in self._stream(tracer, req):
+                if t_first is None:
+                    t_first = perf_counter()
+                parts.append(delta)
+                yield StreamEvent("token", delta)
+            t_end = perf_counter()
+            span.meta["n_tokens"] = len(parts)
+            if t_first is not None:
+                span.meta["ttft_s"] = t_first - t0
+                span.meta["tokens_per_s"] = len(parts) / (t_end - t_first) if t_end > t_first else None
+
+        yield StreamEvent("done", self._finish(tracer, topic, "".join(parts).strip(), retrieved, cites, slot))
@@ -1,11 +1,19 @@
 from __future__ import annotations
-import json, re
+import argparse, json, math, re, sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
+from time import perf_counter
 
+from core.bench import COMPARED, summarize
+from core.config import Settings
 from core.engine import Engine
+from core.observability import RunTrace
+from core.rag import Chunk
 
 CITE = re.compile(r"\[(\d+)\]")
+STAGES = ("bm25", "dense", "fused", "rerank")
+QUALITY = ("recall", "mrr", "ndcg")
 
 @dataclass(frozen=True)
 class EvalCase:
@@ -15,6 +23,13 @@ class EvalCase:
     urls: list[str] | None = None
     min_sources: int = 2
     must_cite: bool = True
+    # gold labels (either or both): relevant chunk ids, and/or relevant sources (path or file name)
+    gold_chunks: list[str] | None = None
+    gold_sources: list[str] | None = None
+
+    @property
+    def labelled(self) -> bool:
+        return bool(self.gold_chunks or self.gold_sources)
 
 def _load_cases(path: str) -> list[EvalCase]:
     out = []
@@ -35,35 +50,166 @@ def _score(answer_md: str, distinct_sources: int, min_sources: int):
         "abstained": abstained,
     }
 
+# ---------- retrieval quality ----------
+
+def _gold_unit(ch: Chunk, case: EvalCase) -> str | None:
+    # the gold label a retrieved chunk satisfies: its id, else its source (each counted once per ranking)
+    if case.gold_chunks and ch.chunk_id in case.gold_chunks:
+        return ch.chunk_id
+    for src in case.gold_sources or ():
+        if ch.source == src or Path(ch.source).name == src:
+            return f"source::{src}"
+    return None
+
+def retrieval_metrics(ranked: list[Chunk], case: EvalCase, k: int) -> dict[str, float]:
+    # Binary relevance over gold units: recall@k, MRR (first relevant rank) and nDCG@k. A chunk only
+    # gains when it is the first hit for its unit, so five chunks of one gold source count once.
+    n_gold = len(case.gold_chunks or ()) + len(case.gold_sources or ())
+    seen: set[str] = set()
+    dcg, mrr = 0.0, 0.0
+    for rank, ch in enumerate(ranked[:k], start=1):
+        unit = _gold_unit(ch, case)
+        if unit is None or unit in seen:
+            continue
+        seen.add(unit)
+        dcg += 1 / math.log2(rank + 1)
+        mrr = mrr or 1 / rank
+    idcg = sum(1 / math.log2(r + 1) for r in range(1, min(k, n_gold) + 1))
+    return {"recall": len(seen) / n_gold, "mrr": mrr, "ndcg": dcg / idcg if idcg else 0.0}
+
+def _span_ms(trace: RunTrace | None) -> dict[str, float]:
+    # per span name, plus the search stages timed inside retrieval ("search.<stage>")
+    out: dict[str, float] = {}
+    for sp in trace.spans if trace else ():
+        if sp.t1 is not None:
+            out[sp.name] = out.get(sp.name, 0.0) + (sp.t1 - sp.t0) * 1000
+        for stage, ms in (sp.meta or {}).get("stage_ms", {}).items():
+            out[f"search.{stage}"] = ms
+    return out
+
+# ---------- runner ----------
+
+def eval_case(eng: Engine, case: EvalCase, k: int) -> dict:
+    t0 = perf_counter()
+    stages: dict[str, list[Chunk]] = {}
+    run = eng.run(case.topic, mode=case.mode, urls=case.urls, stages=stages)
+    latency = {**_span_ms(run.trace), "total": (perf_counter() - t0) * 1000}
+    n_sources = len({ch.source for ch in run.retrieved})
+    sc = _score(run.answer, n_sources, case.min_sources)
+
+    ok = True
+    if case.must_cite and (not sc["has_citations"]) and (not sc["abstained"]):
+        ok = False
+    if (not sc["source_diversity_ok"]) and (not sc["abstained"]):
+        ok = False
+
+    # per-stage rankings of the run's own retrieval (including request-scoped chunks of online cases)
+    retrieval: dict[str, dict] = {}
+    if case.labelled:
+        for stage, ranked in stages.items():
+            retrieval[stage] = retrieval_metrics(ranked, case, k)
+
+    return {
+        "id": case.id, "topic": case.topic, "ok": ok, "scores": sc, "retrieval": retrieval,
+        "latency_ms": latency, "trace": run.trace_path,
+    }
+
+def summarize_results(results: list[dict]) -> dict:
+    quality: dict[str, dict] = {}
+    for stage in STAGES:
+        rows = [r["retrieval"][stage] for r in results if stage in r["retrieval"]]
+        if rows:
+            quality[stage] = {m: sum(row[m] for row in rows) / len(rows) for m in QUALITY}
+            quality[stage]["n"] = len(rows)
+    samples: dict[str, list[float]] = {}
+    for r in results:
+        for stage, ms in r["latency_ms"].items():
+            samples.setdefault(stage, []).append(ms / 1000)
+    return {"retrieval": quality, "latency": {stage: summarize(v) for stage, v in sorted(samples.items())}}
+
+def run_eval(eng: Engine, cases: list[EvalCase], workers: int = 4, k: int | None = None) -> dict:
+    k = k or eng.s.top_k
+    # built (or loaded) once, by the engine's warm-up or here, then shared by every case
+    t0 = perf_counter()
+    eng.index.refresh()
+    index_s = eng.readiness().get("index_s", 0.0) + perf_counter() - t0
+
+    t0 = perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda c: eval_case(eng, c, k), cases))
+    eng.traces.flush(10)
+    return {
+        "meta": {
+            "k": k, "workers": workers, "cases": len(cases), "index_build_s": index_s,
+            "wall_s": perf_counter() - t0, "dense_model": eng.s.dense_model, "rerank": eng.s.rerank,
+        },
+        "failed": sum(not r["ok"] for r in results),
+        "summary": summarize_results(results),
+        "results": results,
+    }
+
+# ---------- baseline comparison ----------
+
+def compare(
+    current: dict, baseline: dict, quality_tolerance: float = 0.02,
+    latency_tolerance: float = 0.5, min_delta_ms: float = 5.0,
+) -> list[str]:
+    # Quality regresses when a stage's mean metric drops by more than `quality_tolerance` (absolute);
+    # latency like core.bench: relative growth beyond `latency_tolerance` and at least `min_delta_ms`.
+    regressions = []
+    cur, base = current["summary"], baseline.get("summary", {})
+    for stage, metrics in cur["retrieval"].items():
+        b = base.get("retrieval", {}).get(stage, {})
+        for m in QUALITY:
+            if m in b and b[m] - metrics[m] > quality_tolerance:
+                regressions.append(f"{stage}.{m}: {b[m]:.3f} -> {metrics[m]:.3f}")
+    for stage, lat in cur["latency"].items():
+        b = base.get("latency", {}).get(stage, {})
+        for field in COMPARED:
+            if field not in b:
+                continue
+            if lat[field] > b[field] * (1 + latency_tolerance) and lat[field] - b[field] > min_delta_ms:
+                regressions.append(f"{stage}.{field}: {b[field]:.1f} -> {lat[field]:.1f} ms")
+    return regressions
+
 def main():
-    cases = _load_cases("core/dataset.jsonl")
-    eng = Engine()
-
-    results = []
-    failed = 0
-
-    for c in cases:
-        run = eng.run(c.topic, mode=c.mode, urls=c.urls)
-        n_sources = len({ch.source for ch in run.retrieved})
-        sc = _score(run.answer, n_sources, c.min_sources)
-
-        ok = True
-        if c.must_cite and (not sc["has_citations"]) and (not sc["abstained"]):
-            ok = False
-        if (not sc["source_diversity_ok"]) and (not sc["abstained"]):
-            ok = False
-
-        results.append({"id": c.id, "topic": c.topic, "ok": ok, "scores": sc, "trace": run.trace_path})
-        if not ok:
-            failed += 1
-
-    out_dir = Path("data/eval")
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / "latest.json"
-    out_path.write_text(json.dumps({"failed": failed, "results": results}, indent=2), encoding="utf-8")
-    print(f"Eval done. Failed: {failed}/{len(results)}. Report: {out_path}")
-
-    if failed > 0:
+    ap = argparse.ArgumentParser(description="Evaluate briefings and per-stage retrieval quality.")
+    ap.add_argument("--dataset", default="core/dataset.jsonl")
+    ap.add_argument("--workers", type=int, default=4, help="cases run concurrently against one shared index")
+    ap.add_argument("--k", type=int, default=0, help="cutoff for recall / nDCG (default: TOP_K)")
+    ap.add_argument("--out", default="data/eval/latest.json")
+    ap.add_argument(
+        "--replay", action="store_true", help="online cases are served from the fetch cache only (no network)"
+    )
+    ap.add_argument("--baseline", default=None, help="fail (exit 1) on regressions against this report")
+    ap.add_argument("--quality-tolerance", type=float, default=0.02)
+    ap.add_argument("--latency-tolerance", type=float, default=0.5)
+    ap.add_argument("--min-delta-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    cases = _load_cases(args.dataset)
+    # answers are never served from the briefing cache: every case measures the full pipeline
+    eng = Engine(Settings(BRIEFING_CACHE=False, **({"FETCH_OFFLINE": True} if args.replay else {})))
+    eng.warm_up()
+    report = run_eval(eng, cases, workers=args.workers, k=args.k or None)
+
+    out_path = Path(args.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    failed, n = report["failed"], len(report["results"])
+    print(f"Eval done in {report['meta']['wall_s']:.1f}s. Failed: {failed}/{n}. Report: {out_path}")
+    for stage, m in report["summary"]["retrieval"].items():
+        print(f"  {stage:<7} recall@{report['meta']['k']}={m['recall']:.3f} mrr={m['mrr']:.3f} ndcg={m['ndcg']:.3f}")
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(
+            report, json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+            args.quality_tolerance, args.latency_tolerance, args.min_delta_ms,
+        )
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+    if failed > 0 or regressions:
         raise SystemExit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from dataclasses import dataclass
+
+import numpy as np
+
+from core.bm25 import tokenize
+from core.chunker import SENTENCE_END
+from core.chunkstore import Chunk
+from core.config import Settings
+from core.llmclient import estimate_tokens
+from core.rag import Citation
+
+@dataclass(frozen=True)
+class EvidenceConfig:
+    budget_tokens: int = 1000  # whole prompt: system + template + evidence
+    max_sources: int = 8  # citations
+    sentences_per_source: int = 2
+    mmr_lambda: float = 0.7  # 1 = relevance only, 0 = diversity only
+    max_sentence_chars: int = 400  # longer "sentences" (e.g. unpunctuated PDF text) are cut
+
+    @classmethod
+    def from_settings(cls, s: Settings, provider: str) -> "EvidenceConfig":
+        budgets = {"openai": s.prompt_budget_openai, "ollama": s.prompt_budget_ollama}
+        return cls(
+            budget_tokens=budgets.get(provider, s.prompt_budget), max_sources=s.max_citations,
+            sentences_per_source=s.evidence_sentences, mmr_lambda=s.evidence_mmr_lambda,
+        )
+
+@dataclass(frozen=True)
+class Evidence:
+    citations: list[Citation]  # numbered 1..n in prompt order
+    candidates: int  # sentences considered
+    sentences: int  # sentences kept
+    tokens: int  # estimated tokens of the evidence block
+
+def split_sentences(text: str, max_chars: int = 400) -> list[str]:
+    out, start = [], 0
+    for m in SENTENCE_END.finditer(text):
+        out.append(text[start:m.end()].strip())
+        start = m.end()
+    out.append(text[start:].strip())
+    return [s if len(s) <= max_chars else s[:max_chars].rstrip() + "…" for s in out if s]
+
+def format_evidence(citations: list[Citation]) -> str:
+    return "\n".join(f"[{c.idx}] {c.title} — {c.source}\nExcerpt: {c.excerpt}\n" for c in citations)
+
+# Sentence-level evidence selection under a token budget.
+# Relevance of a sentence = mean of (a) the cosine between the query and its chunk (embeddings already
+# computed at retrieval, no extra encoder pass), (b) the share of query terms it contains and (c) its
+# chunk's retrieval rank (fused / reranked order). Sentences are then picked greedily by MMR: relevance
+# minus similarity to what was already picked, where a second sentence of an already cited source
+# counts as fully redundant and other sources by the similarity of their chunks. A sentence is kept
+# only while the evidence block (headers included) stays within the budget.
+def select_evidence(
+    query: str, chunks: list[Chunk], vectors: dict, budget_tokens: int, cfg: EvidenceConfig = EvidenceConfig()
+) -> Evidence:
+    cand_text, cand_chunk = [], []
+    for r, c in enumerate(chunks):
+        for sent in split_sentences(c.text, cfg.max_sentence_chars):
+            cand_text.append(sent)
+            cand_chunk.append(r)
+    n = len(cand_text)
+    if not n:
+        return Evidence([], 0, 0, 0)
+    cand_chunk = np.asarray(cand_chunk)
+
+    # chunk vectors from retrieval; a missing one (e.g. cached results) just carries no dense signal
+    q = vectors.get("query")
+    dim = q.shape[0] if q is not None else 0
+    vecs = np.zeros((len(chunks), dim), dtype=np.float32)
+    for r, c in enumerate(chunks):
+        v = vectors.get(c.chunk_id)
+        if v is not None and dim:
+            vecs[r] = v
+    dense = vecs @ q if dim else np.zeros(len(chunks))
+    q_terms = set(tokenize(query))
+    lexical = np.array([
+        len(q_terms & set(tokenize(t))) / len(q_terms) if q_terms else 0.0 for t in cand_text
+    ])
+    rank = 1.0 / (1.0 + np.arange(len(chunks)))
+    rel = (np.clip(dense, 0.0, 1.0)[cand_chunk] + lexical + rank[cand_chunk]) / 3
+
+    sources = [c.source for c in chunks]
+    src_id = {s: i for i, s in enumerate(dict.fromkeys(sources))}
+    cand_src = np.array([src_id[sources[r]] for r in cand_chunk])
+    chunk_sim = np.clip(vecs @ vecs.T, 0.0, 1.0) if dim else np.zeros((len(chunks), len(chunks)))
+
+    picked: list[int] = []
+    order: list[str] = []  # cited sources, in citation order
+    per_source: dict[str, int] = {}
+    max_sim = np.zeros(n)
+    alive = np.ones(n, dtype=bool)
+    used = 0
+    while alive.any():
+        score = np.where(alive, cfg.mmr_lambda * rel - (1 - cfg.mmr_lambda) * max_sim, -np.inf)
+        i = int(np.argmax(score))  # ties: earliest chunk / sentence
+        alive[i] = False
+        r = int(cand_chunk[i])
+        src = sources[r]
+        if src not in per_source:
+            if len(order) >= cfg.max_sources:
+                continue
+            prefix = f"[{len(order) + 1}] {chunks[r].title} — {src}\nExcerpt: \n\n"  # header, block end, join
+        elif per_source[src] >= cfg.sentences_per_source:
+            continue
+        else:
+            prefix = " … "
+        cost = estimate_tokens(prefix + cand_text[i])
+        if used + cost > budget_tokens:
+            continue
+        used += cost
+        picked.append(i)
+        if src not in per_source:
+            order.append(src)
+        per_source[src] = per_source.get(src, 0) + 1
+        sim = np.where(cand_src == cand_src[i], 1.0, chunk_sim[cand_chunk, r])
+        np.maximum(max_sim, sim, out=max_sim)
+
+    citations = []
+    for k, src in enumerate(order, start=1):
+        mine = sorted(i for i in picked if sources[cand_chunk[i]] == src)  # reading order
+        title = chunks[int(cand_chunk[mine[0]])].title
+        citations.append(Citation(k, title, src, " … ".join(cand_text[i] for i in mine)))
+    return Evidence(citations, n, len(picked), used)
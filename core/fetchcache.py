@@ -0,0 +1,133 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict, replace
+from pathlib import Path
+from typing import Callable
+import hashlib, json, os, threading, time, uuid
+
+from core.config import Settings
+
+PAGE = "page.json"
+RAW = "raw.html"
+TEXT = "text.txt"
+
+@dataclass(frozen=True)
+class CachedPage:
+    url: str
+    sha: str  # digest of the raw body
+    etag: str | None = None
+    last_modified: str | None = None
+    fetched: float = 0.0  # when the body was downloaded
+    validated: float = 0.0  # last time the origin confirmed it (200 or 304)
+    text_sha: str | None = None  # body the cached extracted text belongs to
+
+def _digest(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def _write(path: Path, data: str) -> None:
+    # atomic: readers in other processes see the old file or the new one, never a partial write
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_text(data, encoding="utf-8")
+    os.replace(tmp, path)
+
+# On-disk cache of fetched URLs, one directory per URL: page.json (validators and timestamps), raw.html
+# (the response body) and text.txt (the extracted text). Within `ttl_s` of its last validation a page
+# is served without a request; after that it is revalidated with If-None-Match / If-Modified-Since.
+# Extraction is keyed by the body digest, so a 304 or an unchanged 200 never re-runs trafilatura.
+# In offline (replay) mode only cached pages are served, whatever their age, and nothing is fetched.
+class FetchCache:
+    def __init__(
+        self, root: str, ttl_s: float = 3600, offline: bool = False, clock: Callable[[], float] = time.time
+    ):
+        self.root = Path(root)
+        self.ttl_s = ttl_s  # 0 = revalidate on every use
+        self.offline = offline
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.hits = self.revalidated = self.misses = 0
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> FetchCache | None:
+        if not (s.fetch_cache or s.fetch_offline):
+            return None
+        return cls(s.data_fetch_cache, s.fetch_cache_ttl, s.fetch_offline)
+
+    def _dir(self, url: str) -> Path:
+        return self.root / _digest(url)[:32]
+
+    def _count(self, what: str) -> None:
+        with self._lock:
+            setattr(self, what, getattr(self, what) + 1)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses, "offline": self.offline}
+
+    def get(self, url: str) -> CachedPage | None:
+        try:
+            page = CachedPage(**json.loads((self._dir(url) / PAGE).read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError):
+            return None
+        return page if page.url == url else None
+
+    def fresh(self, page: CachedPage | None) -> bool:
+        # served as is: no request at all
+        if page is None:
+            return False
+        ok = self.offline or (self.ttl_s > 0 and self.clock() - page.validated < self.ttl_s)
+        if ok:
+            self._count("hits")
+        return ok
+
+    def conditional_headers(self, page: CachedPage | None) -> dict[str, str]:
+        headers = {}
+        if page is not None and page.etag:
+            headers["If-None-Match"] = page.etag
+        if page is not None and page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def _save(self, page: CachedPage) -> CachedPage:
+        _write(self._dir(page.url) / PAGE, json.dumps(asdict(page), ensure_ascii=False))
+        return page
+
+    def put(self, url: str, raw: str, headers) -> CachedPage:
+        # a 200: store the body (unless unchanged) and the new validators
+        self._count("misses")
+        d = self._dir(url)
+        d.mkdir(parents=True, exist_ok=True)
+        old, sha, now = self.get(url), _digest(raw), self.clock()
+        if old is None or old.sha != sha or not (d / RAW).exists():
+            _write(d / RAW, raw)
+        text_sha = old.text_sha if old is not None else None
+        return self._save(CachedPage(
+            url, sha, headers.get("ETag"), headers.get("Last-Modified"), now, now, text_sha
+        ))
+
+    def touch(self, page: CachedPage, headers) -> CachedPage:
+        # a 304: the cached body is still current
+        self._count("revalidated")
+        return self._save(replace(
+            page, validated=self.clock(), etag=headers.get("ETag") or page.etag,
+            last_modified=headers.get("Last-Modified") or page.last_modified,
+        ))
+
+    def raw(self, page: CachedPage) -> str | None:
+        try:
+            return (self._dir(page.url) / RAW).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def text(self, page: CachedPage) -> str | None:
+        # extracted text of the current body, if it was extracted before
+        if page.text_sha != page.sha:
+            return None
+        try:
+            return (self._dir(page.url) / TEXT).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def put_text(self, page: CachedPage, text: str) -> None:
+        current = self.get(page.url)
+        if current is None or current.sha != page.sha:
+            return  # the body changed meanwhile (another worker): this text belongs to the old one
+        _write(self._dir(page.url) / TEXT, text)
+        self._save(replace(current, text_sha=page.sha))
@@ -1,5 +1,8 @@
 import re
-from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import os
 
 INJECTION_PATTERNS = [
     r"ignore (all|previous) instructions",
@@ -16,25 +19,203 @@ IBAN = re.compile(r"\b[A-Z]{2}\d{2}[A-Z0-9]{11,30}\b", re.I)
 
 CITE = re.compile(r"\[(\d+)\]")
 
+# ---------- single-pass scanner ----------
+
+REDACTIONS = {"email": "[REDACTED_EMAIL]", "phone": "[REDACTED_PHONE]", "iban": "[REDACTED_IBAN]"}
+
+def _no_capture(pattern: str) -> str:
+    return re.sub(r"(?<!\\)\((?!\?)", "(?:", pattern)
+
+def _scanner(flags: int, lower: bool) -> re.Pattern:
+    # One alternation over every guardrail pattern, without capture groups (named groups make the
+    # scan ~2x slower; the rare matches are classified afterwards). Injection phrases come first: a
+    # document that contains one is dropped as a whole, so at a shared position detection wins.
+    # The email alternative is anchored on the start of its local part: same leftmost match as EMAIL,
+    # without re-trying from every character of every word.
+    alts = [_no_capture(p) for p in INJECTION_PATTERNS]
+    alts += [r"(?<![A-Z0-9._%+-])" + EMAIL.pattern, PHONE.pattern, IBAN.pattern]
+    pattern = "|".join(f"(?:{a})" for a in alts)
+    return re.compile(pattern.replace("A-Z", "a-z") if lower else pattern, flags)
+
+# Text is lowercased once and scanned case-sensitively (much faster than re.I). lower() only ever
+# expands characters (e.g. "İ"), so when the length is unchanged the match offsets are valid for the
+# original text; otherwise the re.I scanner runs on the original.
+SCANNER_LOWER = _scanner(0, lower=True)
+SCANNER = _scanner(re.I, lower=False)
+KINDS = [("injection", p, re.compile(p, re.I)) for p in INJECTION_PATTERNS] + [
+    ("email", None, EMAIL), ("phone", None, PHONE), ("iban", None, IBAN),
+]
+
+def _classify(matched: str) -> tuple[str, str | None]:
+    for kind, pattern, rx in KINDS:
+        if rx.fullmatch(matched):
+            return kind, pattern
+    raise AssertionError(f"unclassified guardrail match: {matched!r}")
+
+@dataclass(frozen=True)
+class GuardMatch:
+    kind: str  # injection | email | phone | iban
+    start: int
+    end: int
+    pattern: str | None = None  # the injection pattern that fired
+
+@dataclass(frozen=True)
+class ScanResult:
+    text: str  # redacted text (the input, unchanged, when redaction was off)
+    injection: bool
+    matches: list[GuardMatch] = field(default_factory=list)
+
+    def counts(self) -> dict[str, int]:
+        # audit summary: kinds and counts only, never the matched values
+        return dict(Counter(m.kind for m in self.matches))
+
+def scan(text: str, redact: bool = True, stop_on_injection: bool = False) -> ScanResult:
+    # Detects and redacts in one left-to-right pass. With stop_on_injection the scan ends at the first
+    # injection hit (the caller drops the document, so the rest is never needed).
+    parts: list[str] = []
+    matches: list[GuardMatch] = []
+    pos, injection = 0, False
+    lowered = text.lower()
+    found = SCANNER_LOWER.finditer(lowered) if len(lowered) == len(text) else SCANNER.finditer(text)
+    for m in found:
+        kind, pattern = _classify(m.group())
+        matches.append(GuardMatch(kind, m.start(), m.end(), pattern))
+        if kind == "injection":
+            injection = True
+            if stop_on_injection:
+                break
+            continue
+        if redact:
+            parts.append(text[pos:m.start()])
+            parts.append(REDACTIONS[kind])
+            pos = m.end()
+    if not redact or not parts:
+        return ScanResult(text, injection, matches)
+    parts.append(text[pos:])
+    return ScanResult("".join(parts), injection, matches)
+
+def scan_document(text: str) -> ScanResult:
+    # what the index applies to every document: redact, and stop early on an injection
+    return scan(text, stop_on_injection=True)
+
+def scan_many(texts: list[str], workers: int = 1) -> list[ScanResult]:
+    # documents are independent: large batches can be spread over a process pool (0 = one per CPU)
+    workers = min(workers if workers > 0 else (os.cpu_count() or 1), len(texts))
+    if workers <= 1:
+        return [scan_document(t) for t in texts]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(scan_document, texts, chunksize=max(1, len(texts) // (workers * 4))))
+
+# ---------- streaming scanner ----------
+
+HOLD = 256  # longest PII value / injection phrase that is guaranteed to be seen whole in a stream
+CONTEXT = 16  # already-emitted characters kept for the email lookbehind and \b
+
+def _shift(marks: list, keep: int) -> list:
+    # page marks after dropping buf[:keep]; the piece that spans `keep` now starts at 0
+    live = [j for j, (i, _) in enumerate(marks) if i <= keep][-1]
+    return [(max(0, i - keep), p) for i, p in marks[live:]]
+
+class StreamScanner:
+    # scan() over a stream of (page, text) pieces with memory bounded by a few HOLDs instead of the
+    # document size. The last HOLD characters of the buffer are only emitted once more text arrived
+    # (a match may still extend into it); a match that reaches into that tail is deferred whole.
+    # Only per-kind counts are kept (a match list would grow with the document); redactions are
+    # attributed to the page on which the value starts. Iteration stops at the first injection, kept
+    # in `injection_match` with its offsets into the stream.
+    def __init__(self, hold: int = HOLD, max_buffer: int = 64 * HOLD):
+        self.hold = hold
+        self.max_buffer = max_buffer  # a deferred match that keeps growing is cut here
+        self.injection = False
+        self.injection_match: GuardMatch | None = None
+        self._counts: Counter = Counter()
+
+    def counts(self) -> dict[str, int]:
+        return dict(self._counts)
+
+    def redact(self, pieces):
+        buf, marks, ctx, base = "", [], 0, 0  # marks: (buffer index, page) where each piece starts
+        for page, text in pieces:
+            marks.append((len(buf), page))
+            buf += text
+            if len(buf) - ctx < 2 * self.hold:
+                continue
+            out, cut = self._scan(buf, marks, ctx, base, final=False)
+            if cut == ctx and len(buf) - ctx > self.max_buffer:
+                # one deferred match keeps growing (e.g. a long table of digits): cut it here
+                out, cut = self._scan(buf, marks, ctx, base, final=True)
+            yield from out
+            if self.injection:
+                return
+            keep = max(0, cut - CONTEXT)
+            buf, base, ctx = buf[keep:], base + keep, cut - keep
+            marks = _shift(marks, keep)
+        if buf:
+            out, _ = self._scan(buf, marks, ctx, base, final=True)
+            yield from out
+
+    def _scan(self, buf: str, marks: list, ctx: int, base: int, final: bool):
+        def page_at(i: int):
+            page = marks[0][1]
+            for start, p in marks:
+                if start > i:
+                    break
+                page = p
+            return page
+
+        def emit(a: int, b: int):
+            # buf[a:b] split on piece boundaries, so every part keeps its page
+            for j, (start, p) in enumerate(marks):
+                end = marks[j + 1][0] if j + 1 < len(marks) else len(buf)
+                lo, hi = max(a, start), min(b, end)
+                if lo < hi:
+                    out.append((p, buf[lo:hi]))
+
+        out: list = []
+        cut = len(buf) if final else len(buf) - self.hold
+        lowered = buf.lower()
+        if len(lowered) == len(buf):
+            found = SCANNER_LOWER.finditer(lowered, ctx)
+        else:
+            found = SCANNER.finditer(buf, ctx)
+        pos = ctx
+        for m in found:
+            if m.end() > cut:
+                # may continue in the next piece: rescanned from its start once more text arrived
+                cut = min(cut, m.start())
+                break
+            kind, pattern = _classify(m.group())
+            self._counts[kind] += 1
+            if kind == "injection":
+                self.injection = True
+                self.injection_match = GuardMatch(kind, base + m.start(), base + m.end(), pattern)
+                return out, cut
+            emit(pos, m.start())
+            out.append((page_at(m.start()), REDACTIONS[kind]))
+            pos = m.end()
+        emit(pos, cut)
+        return out, cut
+
 def is_injection(text: str) -> bool:
-    t = text.lower()
-    return any(re.search(p, t) for p in INJECTION_PATTERNS)
+    return scan(text, redact=False, stop_on_injection=True).injection
 
 def redact_pii(text: str) -> str:
-    text = EMAIL.sub("[REDACTED_EMAIL]", text)
-    text = PHONE.sub("[REDACTED_PHONE]", text)
-    text = IBAN.sub("[REDACTED_IBAN]", text)
-    return text
+    return scan(text).text
 
 @dataclass(frozen=True)
 class QualityResult:
     ok: bool
     reason: str
 
-def quality_gate(answer_md: str, sources: set[str], min_sources: int) -> QualityResult:
+def quality_gate(
+    answer_md: str, sources: set[str], min_sources: int, n_evidence: int | None = None
+) -> QualityResult:
     if len(sources) < min_sources:
         return QualityResult(False, "Insufficient source diversity.")
     cites = set(int(m.group(1)) for m in CITE.finditer(answer_md))
+    if n_evidence is not None:
+        # a number that was not in the prompt's evidence is not a citation
+        cites = {c for c in cites if 1 <= c <= n_evidence}
     if not cites:
         return QualityResult(False, "No citations found in answer.")
     if len(answer_md) > 800 and len(cites) < 2:
@@ -0,0 +1,388 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+from dataclasses import asdict
+import hashlib, json, os, pickle, shutil, threading
+
+import numpy as np
+
+try:  # POSIX only; without it the index is safe for a single writer process
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from core.bm25 import SparseBM25, StackedBM25
+from core.chunker import ChunkConfig
+from core.chunkstore import COLUMNS, DOC_TABLE, TEXT_BUF, ChunkStore
+from core.config import Settings
+from core.dense import (
+    DenseConfig, StackedIndex, StackedRows, build_dense_index, configure, extend_dense_index,
+    needs_retraining, resolve_backend,
+)
+from core.embcache import EmbeddingCache
+from core.rerank import RerankConfig, Reranker
+from core.ingest import chunk_files
+from core.models import DEFAULT_DENSE_MODEL, DEFAULT_RERANK_MODEL, get_embedder
+from core.rag import (
+    Chunk, HybridRetriever, embed_chunks, list_pdfs, list_local_pages,
+)
+from core.shards import ShardedRetriever
+
+# On-disk layout of an index directory: the manifest points at the data directory of the last save
+# (chunk columns: see core/chunkstore.py, embeddings, BM25, faiss); bump INDEX_FORMAT when it changes
+INDEX_FORMAT = 6
+MANIFEST = "manifest.json"
+DATA = "data"
+EMBEDDINGS = "embeddings.npy"
+FAISS_INDEX = "faiss.index"
+BM25 = "bm25.pkl"
+SHARDS = "shards"  # per-shard chunks / embeddings when RETRIEVAL_SHARDS > 0 (see core/shards.py)
+LOCK = ".lock"
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _stat(path: Path) -> tuple[float, int]:
+    st = path.stat()
+    return st.st_mtime, st.st_size
+
+# Persistent corpus index: loaded once per process, then updated per changed source file.
+class IndexStore:
+    def __init__(
+        self,
+        root: str,
+        pdfs_dir: str,
+        pages_dir: str,
+        dense_model: str = DEFAULT_DENSE_MODEL,
+        rerank: bool = True,
+        rerank_model: str = DEFAULT_RERANK_MODEL,
+        embedding_cache: EmbeddingCache | None = None,
+        ingest_workers: int = 0,
+        dense: DenseConfig = DenseConfig(),
+        chunking: ChunkConfig = ChunkConfig(),
+        reranker: Reranker | None = None,
+        shards: int = 0,
+    ):
+        self.root = Path(root)
+        self.pdfs_dir = pdfs_dir
+        self.pages_dir = pages_dir
+        self.dense_model = dense_model
+        self.rerank = rerank
+        self.rerank_model = rerank_model
+        self.embedding_cache = embedding_cache
+        self.ingest_workers = ingest_workers
+        self.dense = dense
+        self.chunking = chunking
+        self.reranker = reranker or (Reranker(RerankConfig(model=rerank_model)) if rerank else None)
+        self.shards = shards  # 0 = one in-process HybridRetriever
+
+        # source path -> {"mtime", "size", "sha256", "n_chunks"}
+        self.files: dict[str, dict] = {}
+        self.chunks = ChunkStore.empty()
+        self.embeddings: np.ndarray | None = None
+        self.version = ""
+        self.dense_trained = 0  # vectors the dense index's quantizer was fitted on
+        self.errors: dict[str, str] = {}  # source -> error of the last failed ingestion attempt
+        self._retriever: HybridRetriever | ShardedRetriever | None = None
+        # called with the new version whenever the corpus changes (e.g. to invalidate answer caches)
+        self.listeners: list[Callable[[str], None]] = []
+        self._notified: str | None = None
+        self._data: str | None = None  # data directory of the manifest
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "IndexStore":
+        return cls(
+            s.data_index, s.data_raw_pdfs, s.data_raw_pages,
+            dense_model=s.dense_model, rerank=s.rerank, rerank_model=s.rerank_model,
+            embedding_cache=EmbeddingCache(s.data_emb_cache, s.dense_model) if s.emb_cache else None,
+            ingest_workers=s.ingest_workers,
+            dense=DenseConfig.from_settings(s),
+            chunking=ChunkConfig.from_settings(s),
+            reranker=Reranker(RerankConfig.from_settings(s)) if s.rerank else None,
+            shards=s.retrieval_shards,
+        )
+
+    # ---------- persistence ----------
+
+    @contextmanager
+    def _file_lock(self):
+        # Several processes share one index directory (API workers, batch job workers): loads and
+        # refresh + save run under an exclusive flock, so none reads or writes a half-saved index.
+        # A process whose copy is older than the disk re-ingests the changed files and saves the same
+        # corpus again.
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / LOCK, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self) -> None:
+        self._loaded = True
+        manifest_path = self.root / MANIFEST
+        if not manifest_path.exists():
+            return
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if (
+            manifest.get("dense_model") != self.dense_model
+            or manifest.get("format") != INDEX_FORMAT
+            or manifest.get("chunking") != asdict(self.chunking)
+        ):
+            # embeddings from another model / chunking (or an older layout) are useless: start from scratch
+            return
+        self._data = manifest["data"]
+        data = self.root / self._data
+        self.chunks = ChunkStore.load(data)  # text buffer is memory-mapped
+        self.embeddings = np.load(data / EMBEDDINGS) if len(self.chunks) else None
+        self.files = manifest["files"]
+        self.version = manifest["version"]
+
+        import faiss
+
+        bm25 = dense_index = None
+        # absent when the index was last saved sharded: rebuilt from the chunks then
+        if len(self.chunks) and not self.shards and (data / BM25).exists():
+            with open(data / BM25, "rb") as f:
+                bm25 = pickle.load(f)
+            # a persisted trained index is reused only while it matches the configured backend
+            if manifest.get("dense_backend") == resolve_backend(self.dense, len(self.chunks)):
+                dense_index = configure(faiss.read_index(str(data / FAISS_INDEX)), self.dense)
+        self._retriever = self._build_retriever(
+            bm25=bm25, dense_index=dense_index, dense_backend=manifest.get("dense_backend")
+        )
+        self.dense_trained = manifest.get("dense_trained", 0) if dense_index is not None else len(self.chunks)
+
+    def save(self) -> None:
+        import faiss
+
+        # a new directory per save, never files overwritten in place: the live data stays intact (and
+        # memory-mapped by this and other processes) until the manifest points at the new one
+        gen = 0
+        while (self.root / f"{DATA}.{gen}").exists():
+            gen += 1
+        name = f"{DATA}.{gen}"
+        data = self.root / name
+        self.chunks.save(data)
+        if self.embeddings is not None:
+            np.save(data / EMBEDDINGS, self.embeddings)
+        # sharded (each shard keeps its own files) or empty: whole-corpus indexes would only go stale
+        if isinstance(self._retriever, HybridRetriever) and len(self.chunks):
+            with open(data / BM25, "wb") as f:
+                pickle.dump(self._retriever.bm25, f)
+            faiss.write_index(self._retriever.faiss, str(data / FAISS_INDEX))
+        self._data = name
+        self._save_manifest()
+        for old in self.root.glob(f"{DATA}.*"):
+            if old.name != name:
+                shutil.rmtree(old, ignore_errors=True)
+        for legacy in (EMBEDDINGS, BM25, FAISS_INDEX, TEXT_BUF, COLUMNS, DOC_TABLE):  # format <= 4
+            (self.root / legacy).unlink(missing_ok=True)
+
+    def _save_manifest(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "format": INDEX_FORMAT,
+            "dense_model": self.dense_model,
+            "dense_backend": self._retriever.dense_backend if self._retriever else None,
+            "dense_trained": self.dense_trained,
+            "chunking": asdict(self.chunking),
+            "version": self.version,
+            "data": self._data,
+            "files": self.files,
+        }
+        # written last and atomically, so a crash mid-save never points at a half-written index
+        tmp = self.root / (MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, self.root / MANIFEST)
+
+    # ---------- incremental update ----------
+
+    def _scan(self) -> dict[str, Path]:
+        paths = list_pdfs(self.pdfs_dir) + list_local_pages(self.pages_dir)
+        return {str(p): p for p in paths}
+
+    def _changed(self, source: str, path: Path, shas: dict[str, str]) -> bool:
+        entry = self.files.get(source)
+        if entry is None:
+            return True
+        mtime, size = _stat(path)
+        if entry["mtime"] == mtime and entry["size"] == size:
+            return False
+        sha = shas[source] = file_sha256(path)
+        if sha == entry["sha256"]:
+            # touched but identical: remember the new mtime and skip re-ingestion
+            entry["mtime"], entry["size"] = mtime, size
+            return False
+        return True
+
+    def refresh(self) -> HybridRetriever | ShardedRetriever | None:
+        with self._lock, self._file_lock():
+            if not self._loaded:
+                self.load()
+
+            on_disk = self._scan()
+            self.errors = {src: e for src, e in self.errors.items() if src in on_disk}
+            shas: dict[str, str] = {}
+            removed = [src for src in self.files if src not in on_disk]
+            changed = [src for src, path in on_disk.items() if self._changed(src, path, shas)]
+            if not removed and not changed:
+                if shas:
+                    self._save_manifest()
+                self._notify()
+                return self._retriever
+
+            dead = self.chunks.source_mask(set(removed) | set(changed))
+            dropped = np.flatnonzero(dead).tolist()
+            chunks = self.chunks.take(~dead)
+            emb = self.embeddings[~dead] if self.embeddings is not None and len(chunks) else None
+            for src in removed:
+                del self.files[src]
+
+            new_chunks: list[Chunk] = []
+            # files are loaded, scanned and chunked as streams (no whole-document strings)
+            for res in chunk_files([on_disk[src] for src in changed], self.ingest_workers, self.chunking):
+                if res.chunks is None:
+                    # not recorded in the manifest, so it is retried on the next refresh
+                    self.errors[res.key] = res.error or "unknown error"
+                    self.files.pop(res.key, None)
+                    continue
+                self.errors.pop(res.key, None)
+                src, path = res.key, on_disk[res.key]
+                new_chunks.extend(res.chunks)
+                mtime, size = _stat(path)
+                self.files[src] = {
+                    "mtime": mtime,
+                    "size": size,
+                    "sha256": shas.get(src) or file_sha256(path),
+                    "n_chunks": len(res.chunks),
+                    "guardrails": res.guardrails,  # audit: what was redacted / why it was dropped
+                }
+
+            new_emb = None
+            if new_chunks:
+                new_emb = self._embed(new_chunks)
+                emb = new_emb if emb is None else np.vstack([emb, new_emb])
+
+            self.chunks = chunks.concat(new_chunks)
+            self.embeddings = emb
+            self.version = self._compute_version()
+            if self.shards:
+                self._refresh_shards(set(removed) | set(changed), new_chunks, new_emb)
+                self.save()
+                self._notify()
+                return self._retriever
+
+            # BM25 is updated on a (cheap) copy: the current retriever may still be serving queries
+            bm25 = dense_index = backend = None
+            if self._retriever is not None:
+                bm25 = self._retriever.bm25.copy()
+                bm25.remove(dropped)
+                bm25.add(c.text for c in new_chunks)
+
+            if emb is not None:
+                # a trained ANN index keeps its quantizer across refreshes until the corpus outgrows it;
+                # rows that were only appended are added to a copy of the current index
+                prev = self._retriever
+                same = prev is not None and prev.dense_backend == resolve_backend(self.dense, len(emb))
+                reuse = same and not needs_retraining(self.dense, len(emb), self.dense_trained)
+                if reuse and not dropped and new_emb is not None:
+                    dense_index, backend = extend_dense_index(prev.faiss, new_emb, self.dense), prev.dense_backend
+                else:
+                    dense_index, backend = build_dense_index(emb, self.dense, template=prev.faiss if reuse else None)
+                    if not reuse:
+                        self.dense_trained = len(emb)
+            self._retriever = self._build_retriever(bm25=bm25, dense_index=dense_index, dense_backend=backend)
+            self.save()
+            self._notify()
+            return self._retriever
+
+    def _refresh_shards(self, dropped: set[str], new_chunks: list[Chunk], new_emb: np.ndarray | None) -> None:
+        # only the shards owning a removed / changed / new source are rebuilt (in the background of the
+        # serving ones); an emptied corpus stops the shard processes
+        if not len(self.chunks):
+            if self._retriever is not None:
+                self._retriever.close()
+            self._retriever = None
+        elif self._retriever is None:
+            self._retriever = self._build_retriever()
+        else:
+            self._retriever.update(dropped, new_chunks, new_emb, self.version)
+
+    def _notify(self) -> None:
+        if self.version != self._notified:
+            self._notified = self.version
+            for fn in self.listeners:
+                fn(self.version)
+
+    def _embed(self, chunks: list[Chunk]) -> np.ndarray:
+        return embed_chunks(get_embedder(self.dense_model), chunks, self.embedding_cache)
+
+    def _compute_version(self) -> str:
+        h = hashlib.sha256(self.dense_model.encode("utf-8"))
+        for src in sorted(self.files):
+            h.update(f"{src}\0{self.files[src]['sha256']}\0".encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def _build_retriever(
+        self, bm25=None, dense_index=None, dense_backend=None
+    ) -> HybridRetriever | ShardedRetriever | None:
+        if not len(self.chunks):
+            return None
+        if self.shards:
+            return ShardedRetriever.open(
+                self.root / SHARDS, self.shards, self.chunks, self.embeddings, self.version,
+                embedder=get_embedder(self.dense_model), rerank=self.rerank, reranker=self.reranker, dense=self.dense,
+            )
+        return HybridRetriever(
+            self.chunks,
+            dense_model=self.dense_model,
+            rerank=self.rerank,
+            rerank_model=self.rerank_model,
+            embeddings=self.embeddings,
+            bm25=bm25,
+            dense_index=dense_index,
+            dense=self.dense,
+            dense_backend=dense_backend,
+            reranker=self.reranker,
+        )
+
+    def with_extra(self, extra: list[Chunk]) -> HybridRetriever | ShardedRetriever | None:
+        # Ephemeral retriever over the corpus as of the last refresh() (the caller's, once per request)
+        # plus request-scoped chunks (online URLs); only the extra chunks are embedded and indexed,
+        # nothing is written to disk.
+        base = self._retriever
+        if not extra:
+            return base
+        extra_emb = self._embed(extra)
+        if isinstance(base, ShardedRetriever):
+            # the shards stay as they are: the extra chunks form one more, in-process shard
+            return base.with_extra(extra, extra_emb)
+        if base is None:
+            return HybridRetriever(
+                extra, dense_model=self.dense_model, rerank=self.rerank, rerank_model=self.rerank_model,
+                embeddings=extra_emb, dense=self.dense, reranker=self.reranker,
+            )
+        # the corpus indexes are shared as they are; the extras get small ones (BM25, exact dense) of
+        # their own, merged with the corpus hits per query
+        bm25 = StackedBM25(base.bm25, SparseBM25(c.text for c in extra))
+        return HybridRetriever(
+            base.chunks.with_tail(extra),
+            dense_model=self.dense_model,
+            rerank=self.rerank,
+            rerank_model=self.rerank_model,
+            embeddings=StackedRows(base.embeddings, extra_emb),
+            bm25=bm25,
+            dense_index=StackedIndex(base.faiss, extra_emb),
+            dense_backend=base.dense_backend,
+            reranker=self.reranker,
+        )
@@ -0,0 +1,266 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Callable, TypeVar
+from urllib.parse import urlsplit
+import asyncio, multiprocessing as mp, os, threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.chunker import ChunkConfig, stream_chunks
+from core.chunkstore import Chunk
+from core.fetchcache import CachedPage, FetchCache
+from core.guardrails import StreamScanner
+from core.rag import Doc, load_pdf, load_local_page, source_pieces
+
+T = TypeVar("T")
+
+@dataclass(frozen=True)
+class IngestResult:
+    key: str  # file path or URL
+    doc: Doc | None
+    error: str | None = None
+
+@dataclass(frozen=True)
+class ChunkResult:
+    key: str  # file path
+    chunks: list[Chunk] | None  # [] when the guardrails dropped the document
+    guardrails: dict[str, int] = field(default_factory=dict)  # match counts per kind
+    error: str | None = None
+
+def _workers(n: int) -> int:
+    return n if n > 0 else (os.cpu_count() or 1)
+
+# ---------- files (CPU-bound: fitz / trafilatura in a process pool) ----------
+
+def load_file(path: str) -> IngestResult:
+    # top-level so it can be pickled into pool workers; never raises
+    p = Path(path)
+    try:
+        doc = load_pdf(p) if p.suffix == ".pdf" else load_local_page(p)
+        return IngestResult(path, doc)
+    except Exception as e:
+        return IngestResult(path, None, f"{type(e).__name__}: {e}")
+
+def map_ordered(fn: Callable[[str], T], items: list[str], workers: int) -> list[T]:
+    # Executor.map yields in submission order, so output order never depends on scheduling.
+    # A pool per call: for file ingestion (CLI, index refresh), not per request (see UrlFetcher)
+    workers = min(_workers(workers), len(items))
+    if workers <= 1:
+        return [fn(x) for x in items]
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, items, chunksize=chunksize))
+
+def ingest_files(paths: list[Path] | list[str], workers: int = 0) -> list[IngestResult]:
+    return map_ordered(load_file, [str(p) for p in paths], workers)
+
+def chunk_file(path: str, cfg: ChunkConfig = ChunkConfig()) -> ChunkResult:
+    # load -> guardrails -> chunks as one stream, so the whole document text is never held in memory
+    # (only its chunks); top-level so it can be pickled into pool workers; never raises
+    try:
+        doc_id, title, pieces = source_pieces(Path(path))
+        scanner = StreamScanner()
+        chunks = list(stream_chunks(pieces, doc_id, path, title, cfg, scanner))
+        return ChunkResult(path, [] if scanner.injection else chunks, scanner.counts())
+    except Exception as e:
+        return ChunkResult(path, None, error=f"{type(e).__name__}: {e}")
+
+def chunk_files(
+    paths: list[Path] | list[str], workers: int = 0, cfg: ChunkConfig = ChunkConfig()
+) -> list[ChunkResult]:
+    return map_ordered(partial(chunk_file, cfg=cfg), [str(p) for p in paths], workers)
+
+# ---------- URLs (I/O-bound: pooled session, per-host limits) ----------
+
+# Below this much HTML per request, pages are extracted in the calling thread: a few pages are parsed
+# faster than they are shipped to (and back from) a pool worker.
+INLINE_EXTRACT_CHARS = 256_000
+
+def _extract_html(raw: str) -> tuple[str | None, str | None]:
+    try:
+        import trafilatura  # on first use (see core/rag.py); runs in the extraction pool
+
+        return (trafilatura.extract(raw, include_tables=True) or "").strip(), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+@dataclass
+class _Fetched:
+    raw: str | None = None  # body still to extract
+    text: str | None = None  # extracted text (served from the fetch cache)
+    page: CachedPage | None = None  # fetch cache entry of this body
+    error: str | None = None
+
+class UrlFetcher:
+    def __init__(
+        self, workers: int = 8, per_host: int = 2, timeout: float = 20, cache: FetchCache | None = None
+    ):
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "Mozilla/5.0"
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hosts: dict[str, threading.Semaphore] = {}
+        self._hosts_lock = threading.Lock()
+        self._ahosts: dict[str, asyncio.Semaphore] = {}
+        self._aclient: httpx.AsyncClient | None = None
+        # one extraction pool for the fetcher's lifetime, started on first use: requests never fork the
+        # (multithreaded, model-laden) serving process, and spawned workers only import the parsers
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.Semaphore(self.per_host)
+            return self._hosts[host]
+
+    # ----- fetch cache: what to do before / after the request
+
+    def _from_cache(self, url: str, page: CachedPage) -> _Fetched:
+        text = self.cache.text(page)
+        if text is not None:
+            return _Fetched(text=text, page=page)
+        raw = self.cache.raw(page)
+        if raw is None:
+            return _Fetched(error=f"incomplete fetch cache entry: {url}")
+        return _Fetched(raw=raw, page=page)
+
+    def _before(self, url: str) -> tuple[CachedPage | None, _Fetched | None, dict[str, str]]:
+        # -> (cached page, result that needs no request, conditional request headers)
+        if self.cache is None:
+            return None, None, {}
+        page = self.cache.get(url)
+        if self.cache.fresh(page):
+            return page, self._from_cache(url, page), {}
+        if self.cache.offline:
+            return None, _Fetched(error=f"not in the fetch cache (offline replay): {url}"), {}
+        return page, None, self.cache.conditional_headers(page)
+
+    def _after(self, url: str, page: CachedPage | None, status: int, raw: str, headers) -> _Fetched:
+        if self.cache is None:
+            return _Fetched(raw=raw)
+        if status == 304:
+            return self._from_cache(url, self.cache.touch(page, headers))
+        page = self.cache.put(url, raw, headers)
+        text = self.cache.text(page)  # unchanged body: its extraction is reused
+        return _Fetched(raw=None if text is not None else raw, text=text, page=page)
+
+    def _failed(self, url: str, page: CachedPage | None, e: Exception) -> _Fetched:
+        # a stale copy beats no document when the origin is down
+        if page is not None:
+            return self._from_cache(url, page)
+        return _Fetched(error=f"{type(e).__name__}: {e}")
+
+    # ----- sync
+
+    def _request(self, url: str, headers: dict[str, str]) -> requests.Response:
+        with self._host_slot(url):
+            r = self.session.get(url, timeout=self.timeout, headers=headers)
+        if r.status_code != 304:
+            r.raise_for_status()
+        return r
+
+    def get(self, url: str) -> str:
+        return self._request(url, {}).text
+
+    def _fetch_one(self, url: str) -> _Fetched:
+        page, done, headers = self._before(url)
+        if done is not None:
+            return done
+        try:
+            r = self._request(url, headers)
+        except Exception as e:
+            return self._failed(url, page, e)
+        return self._after(url, page, r.status_code, r.text, r.headers)
+
+    def fetch(self, urls: list[str], extract_workers: int = 0) -> list[IngestResult]:
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as pool:
+            fetched = list(pool.map(self._fetch_one, urls))
+        return self._extract(urls, fetched, extract_workers)
+
+    # ----- async
+
+    async def _arequest(self, url: str, headers: dict[str, str]) -> httpx.Response:
+        if self._aclient is None:
+            limits = httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+            self._aclient = httpx.AsyncClient(
+                headers={"User-Agent": "Mozilla/5.0"}, limits=limits, timeout=self.timeout,
+                follow_redirects=True,
+            )
+        host = urlsplit(url).netloc.lower()
+        slot = self._ahosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with slot:
+            r = await self._aclient.get(url, headers=headers)
+        if r.status_code != 304:
+            r.raise_for_status()
+        return r
+
+    async def aget(self, url: str) -> str:
+        return (await self._arequest(url, {})).text
+
+    async def _afetch_one(self, url: str) -> _Fetched:
+        # cache reads / writes are file I/O: off the event loop
+        page, done, headers = await asyncio.to_thread(self._before, url)
+        if done is not None:
+            return done
+        try:
+            r = await self._arequest(url, headers)
+        except Exception as e:
+            return await asyncio.to_thread(self._failed, url, page, e)
+        return await asyncio.to_thread(self._after, url, page, r.status_code, r.text, r.headers)
+
+    async def afetch(self, urls: list[str], extract_workers: int = 0) -> list[IngestResult]:
+        if not urls:
+            return []
+        fetched = await asyncio.gather(*(self._afetch_one(u) for u in urls))
+        # extraction is CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(self._extract, urls, fetched, extract_workers)
+
+    # ----- extraction (CPU-bound)
+
+    def _extract_pool(self, workers: int) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=_workers(workers), mp_context=mp.get_context("spawn"))
+            return self._pool
+
+    def _extract_many(self, raws: list[str], workers: int) -> list[tuple[str | None, str | None]]:
+        if min(_workers(workers), len(raws)) <= 1 or sum(map(len, raws)) < INLINE_EXTRACT_CHARS:
+            return [_extract_html(r) for r in raws]
+        return list(self._extract_pool(workers).map(_extract_html, raws))
+
+    def close(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def _extract(self, urls: list[str], fetched: list[_Fetched], extract_workers: int) -> list[IngestResult]:
+        todo = [i for i, f in enumerate(fetched) if f.raw is not None]
+        extracted = self._extract_many([fetched[i].raw for i in todo], extract_workers)
+        for i, (text, error) in zip(todo, extracted):
+            fetched[i].text, fetched[i].error = text, error
+            if text is not None and fetched[i].page is not None:
+                self.cache.put_text(fetched[i].page, text)
+
+        out: list[IngestResult] = []
+        for url, f in zip(urls, fetched):
+            if f.error is None:
+                doc = Doc(doc_id=f"url::{url}", source=url, title=url, text=f.text, kind="web")
+                out.append(IngestResult(url, doc))
+            else:
+                out.append(IngestResult(url, None, f.error))
+        return out
@@ -0,0 +1,243 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Iterator
+import json, multiprocessing as mp, os, queue, threading, time, uuid
+
+from core.config import Settings
+
+try:  # POSIX only; without it jobs are claimed per process only (run a single API process)
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+JOB = "job.json"
+RESULTS = "results.jsonl"
+CANCEL = "cancel"
+CLAIM = "claim"
+FINAL = ("done", "cancelled", "failed")
+
+@dataclass
+class Job:
+    id: str
+    topics: list[str]
+    mode: str = "offline"
+    urls: list[str] | None = None
+    status: str = "queued"  # queued | running | done | cancelled | failed
+    n_done: int = 0
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    error: str | None = None
+
+# One directory per job: job.json (state, replaced atomically), results.jsonl (one line per topic,
+# appended as batches finish), a `cancel` marker that workers check between batches and a `claim` file
+# that the worker running the job holds an exclusive flock on. Only that worker writes the job's state,
+# so neither the API nor the workers of other API processes (`uvicorn --workers N`, each of which
+# enqueues every unfinished job at start-up) race it; the lock goes away with the worker's process.
+class JobStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _dir(self, job_id: str) -> Path:
+        if not job_id.isalnum():
+            raise KeyError(job_id)  # ids are uuid hex: never a path
+        return self.root / job_id
+
+    def create(self, topics: list[str], mode: str = "offline", urls: list[str] | None = None) -> Job:
+        job = Job(uuid.uuid4().hex, list(topics), mode, urls or None)
+        self._dir(job.id).mkdir(parents=True)
+        self.save(job)
+        return job
+
+    def save(self, job: Job) -> None:
+        d = self._dir(job.id)
+        tmp = d / (JOB + ".tmp")
+        tmp.write_text(json.dumps(asdict(job), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, d / JOB)
+
+    def get(self, job_id: str) -> Job | None:
+        try:
+            return Job(**json.loads((self._dir(job_id) / JOB).read_text(encoding="utf-8")))
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def append_results(self, job: Job, rows: list[dict]) -> None:
+        with open(self._dir(job.id) / RESULTS, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows))
+
+    def results(self, job_id: str) -> list[dict]:
+        path = self._dir(job_id) / RESULTS
+        if not path.exists():
+            return []
+        # a worker that died between appending and saving job.json re-runs that batch: last write wins
+        rows = {}
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                row = json.loads(line)
+                rows[row["index"]] = row
+        return [rows[i] for i in sorted(rows)]
+
+    @contextmanager
+    def claim(self, job_id: str) -> Iterator[bool]:
+        # True while this process owns the job; False when another worker is running it
+        with open(self._dir(job_id) / CLAIM, "a+") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def cancel(self, job_id: str) -> Job | None:
+        job = self.get(job_id)
+        if job is not None and job.status not in FINAL:
+            (self._dir(job_id) / CANCEL).touch()
+        return job
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return (self._dir(job_id) / CANCEL).exists()
+
+    def summary(self, job: Job) -> dict[str, Any]:
+        out = {k: v for k, v in asdict(job).items() if k != "topics"}
+        out["n_topics"] = len(job.topics)
+        out["cancel_requested"] = job.status not in FINAL and self.cancel_requested(job.id)
+        return out
+
+    def unfinished(self) -> list[Job]:
+        # queued or interrupted jobs (e.g. after a restart), oldest first
+        jobs = [self.get(p.name) for p in self.root.glob("*") if (p / JOB).exists()] if self.root.exists() else []
+        return sorted((j for j in jobs if j is not None and j.status not in FINAL), key=lambda j: j.created)
+
+# ---------- execution ----------
+
+def _row(index: int, topic: str, run) -> dict:
+    meta = run.trace.meta if run.trace else {}
+    return {
+        "index": index,
+        "topic": topic,
+        "answer_md": run.answer,
+        "quality_ok": meta.get("quality_ok"),
+        "sources": sorted({c.source for c in run.retrieved}),
+        "trace_path": run.trace_path,
+    }
+
+def process_job(engine, store: JobStore, job_id: str, batch_size: int) -> Job | None:
+    # Runs (or resumes) a job batch by batch, unless another worker already does; progress is persisted
+    # after every batch.
+    if store.get(job_id) is None:
+        return None
+    with store.claim(job_id) as owned:
+        # read after claiming: the previous owner may have finished it in the meantime
+        job = store.get(job_id)
+        if not owned or job.status in FINAL:
+            return job
+        return _run_job(engine, store, job, batch_size)
+
+def _run_job(engine, store: JobStore, job: Job, batch_size: int) -> Job:
+    job.status, job.started = "running", job.started or time.time()
+    store.save(job)
+    try:
+        while job.n_done < len(job.topics):
+            if store.cancel_requested(job.id):
+                job.status = "cancelled"
+                break
+            start = job.n_done
+            batch = job.topics[start:start + max(1, batch_size)]
+            runs = engine.run_batch(batch, mode=job.mode, urls=job.urls)
+            store.append_results(job, [_row(start + i, t, r) for i, (t, r) in enumerate(zip(batch, runs))])
+            job.n_done += len(batch)
+            store.save(job)
+        else:
+            job.status = "done"
+    except Exception as e:
+        job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+    job.finished = time.time()
+    store.save(job)
+    return job
+
+def _worker_main(root: str, settings: dict, batch_size: int, jobs) -> None:
+    # worker process: its own Engine (models, index) for its whole lifetime
+    from core.engine import Engine
+
+    engine = Engine(Settings(**settings))
+    engine.warm_up()
+    store = JobStore(root)
+    while (job_id := jobs.get()) is not None:
+        process_job(engine, store, job_id, batch_size)
+    engine.traces.flush(5)
+
+# Local job queue: job ids go through a queue to `workers` processes (spawned, so they never inherit
+# the API's threads or event loop); workers=0 runs jobs on a thread of this process with its engine.
+class JobQueue:
+    def __init__(
+        self, store: JobStore, settings: Settings, workers: int = 1, batch_size: int = 16, engine=None
+    ):
+        self.store = store
+        self.settings = settings
+        self.workers = max(0, workers)
+        self.batch_size = batch_size
+        self.engine = engine
+        self._procs: list = []
+        self._q = None
+
+    @classmethod
+    def from_settings(cls, s: Settings, engine=None) -> "JobQueue":
+        return cls(JobStore(s.data_jobs), s, s.job_workers, s.job_batch_size, engine)
+
+    def start(self) -> None:
+        if self._q is not None:
+            return
+        if self.workers == 0:
+            if self.engine is None:
+                raise ValueError("workers=0 runs jobs in-process and needs an engine")
+            self._q = queue.Queue()
+            t = threading.Thread(target=self._thread_main, name="batch-jobs", daemon=True)
+            t.start()
+            self._procs = [t]
+        else:
+            ctx = mp.get_context("spawn")
+            self._q = ctx.Queue()
+            # daemonic workers cannot start shard processes: each searches an in-process index instead
+            settings = {**self.settings.model_dump(by_alias=True), "RETRIEVAL_SHARDS": 0}
+            self._procs = [
+                ctx.Process(
+                    target=_worker_main, args=(str(self.store.root), settings, self.batch_size, self._q),
+                    name=f"batch-worker-{i}", daemon=True,
+                )
+                for i in range(self.workers)
+            ]
+            for p in self._procs:
+                p.start()
+        for job in self.store.unfinished():
+            self._q.put(job.id)
+
+    def _thread_main(self) -> None:
+        while (job_id := self._q.get()) is not None:
+            process_job(self.engine, self.store, job_id, self.batch_size)
+
+    def submit(self, topics: list[str], mode: str = "offline", urls: list[str] | None = None) -> Job:
+        job = self.store.create(topics, mode, urls)
+        self.start()
+        self._q.put(job.id)
+        return job
+
+    def stop(self, timeout: float = 10) -> None:
+        if self._q is None:
+            return
+        for _ in self._procs:
+            self._q.put(None)
+        for p in self._procs:
+            p.join(timeout)
+            if isinstance(p, mp.process.BaseProcess) and p.is_alive():
+                p.terminate()
+        self._procs, self._q = [], None
+
+    def stats(self) -> dict[str, int]:
+        return {"workers": self.workers, "alive": sum(p.is_alive() for p in self._procs)}
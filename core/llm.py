@@ -1,6 +1,9 @@
 from __future__ import annotations
 from dataclasses import dataclass
-import json, requests
+from typing import Iterator
+import asyncio, json, re, time
+
+from core.llmclient import ProviderClient, estimate_tokens
 
 BRIEFING_SYSTEM = """You are a research assistant that produces short, evidence-grounded briefings.
 Rules:
@@ -33,6 +36,14 @@ class LLM:
     def generate(self, req: LLMRequest) -> str:
         raise NotImplementedError
 
+    def stream(self, req: LLMRequest) -> Iterator[str]:
+        # providers without native streaming emit the whole answer as a single delta
+        yield self.generate(req)
+
+    async def agenerate(self, req: LLMRequest) -> str:
+        # providers without an async client fall back to a worker thread
+        return await asyncio.to_thread(self.generate, req)
+
 class NoLLM(LLM):
     def generate(self, req: LLMRequest) -> str:
         return (
@@ -42,38 +53,100 @@ class NoLLM(LLM):
             + req.prompt
         )
 
+class FakeLLM(LLM):
+    # Deterministic, no-network provider for tests and demos: cites every evidence snippet it was given.
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def generate(self, req: LLMRequest) -> str:
+        return "".join(self.stream(req))
+
+    def stream(self, req: LLMRequest) -> Iterator[str]:
+        topic = re.search(r"^Topic: (.*)$", req.prompt, re.M)
+        idxs = re.findall(r"^\[(\d+)\] ", req.prompt, re.M)
+        cites = " ".join(f"[{i}]" for i in idxs)
+        text = (
+            f"# Briefing — {topic.group(1) if topic else ''}\n\n"
+            f"## Executive summary\nSummary grounded in the evidence {cites}.\n"
+        )
+        for tok in re.findall(r"\S+\s*", text):
+            if self.delay:
+                time.sleep(self.delay)
+            yield tok
+
+def _openai_output_text(data: dict) -> str:
+    out = ""
+    for item in data.get("output", []):
+        for c in item.get("content", []):
+            if c.get("type") == "output_text":
+                out += c.get("text", "")
+    return out.strip()
+
+OPENAI_URL = "https://api.openai.com/v1/responses"
+COMPLETION_TOKENS = 800  # rough size of a 1-page briefing, counted against the token rate limit
+
+def _cost(req: LLMRequest) -> int:
+    return estimate_tokens(req.system) + estimate_tokens(req.prompt) + COMPLETION_TOKENS
+
 class OpenAIResponsesLLM(LLM):
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, client: ProviderClient | None = None):
         self.api_key = api_key
         self.model = model
+        self.client = client or ProviderClient("openai")
+
+    def _call(self, req: LLMRequest, **extra) -> dict:
+        return {
+            "url": OPENAI_URL,
+            "payload": {"model": self.model, "input": f"{req.system}\n\n{req.prompt}", **extra},
+            "headers": {"Authorization": f"Bearer {self.api_key}"},
+            "timeout": 90,
+            "cost": _cost(req),
+        }
 
     def generate(self, req: LLMRequest) -> str:
-        payload = {"model": self.model, "input": f"{req.system}\n\n{req.prompt}"}
-        r = requests.post(
-            "https://api.openai.com/v1/responses",
-            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
-            data=json.dumps(payload),
-            timeout=90,
-        )
-        r.raise_for_status()
-        data = r.json()
-        out = ""
-        for item in data.get("output", []):
-            for c in item.get("content", []):
-                if c.get("type") == "output_text":
-                    out += c.get("text", "")
-        return out.strip()
+        return _openai_output_text(self.client.post_json(**self._call(req)))
+
+    async def agenerate(self, req: LLMRequest) -> str:
+        return _openai_output_text(await self.client.apost_json(**self._call(req)))
+
+    def stream(self, req: LLMRequest) -> Iterator[str]:
+        for line in self.client.stream_lines(**self._call(req, stream=True), decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            if event.get("type") == "response.output_text.delta" and event.get("delta"):
+                yield event["delta"]
 
 class OllamaLLM(LLM):
-    def __init__(self, base_url: str, model: str):
+    def __init__(self, base_url: str, model: str, client: ProviderClient | None = None):
         self.base_url = base_url.rstrip("/")
         self.model = model
+        self.client = client or ProviderClient("ollama")
+
+    def _call(self, req: LLMRequest, stream: bool) -> dict:
+        return {
+            "url": f"{self.base_url}/api/generate",
+            "payload": {"model": self.model, "prompt": f"{req.system}\n\n{req.prompt}", "stream": stream},
+            "timeout": 120,
+            "cost": _cost(req),
+        }
 
     def generate(self, req: LLMRequest) -> str:
-        r = requests.post(
-            f"{self.base_url}/api/generate",
-            json={"model": self.model, "prompt": f"{req.system}\n\n{req.prompt}", "stream": False},
-            timeout=120,
-        )
-        r.raise_for_status()
-        return r.json().get("response", "").strip()
+        return self.client.post_json(**self._call(req, stream=False)).get("response", "").strip()
+
+    async def agenerate(self, req: LLMRequest) -> str:
+        return (await self.client.apost_json(**self._call(req, stream=False))).get("response", "").strip()
+
+    def stream(self, req: LLMRequest) -> Iterator[str]:
+        # one JSON object per line: {"response": "<delta>", "done": false}
+        for line in self.client.stream_lines(**self._call(req, stream=True)):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("response"):
+                yield event["response"]
+            if event.get("done"):
+                break
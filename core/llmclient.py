@@ -0,0 +1,392 @@
+from __future__ import annotations
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+import asyncio, random, threading, time
+
+import httpx, requests
+from requests.adapters import HTTPAdapter
+
+from core.config import Settings
+from core.observability import metrics
+
+# statuses worth another attempt: throttling, timeouts and transient server errors
+RETRY_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+RETRYABLE = (requests.ConnectionError, requests.Timeout, httpx.TransportError)
+
+class LLMUnavailable(RuntimeError):
+    # the provider is down, throttling or its circuit is open: callers fall back to evidence-only output
+    pass
+
+class RetryableStatus(RuntimeError):
+    def __init__(self, status: int, retry_after: float | None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+@dataclass(frozen=True)
+class ClientConfig:
+    max_concurrency: int = 8  # in-flight requests to the provider (hedges included)
+    tokens_per_min: int = 0  # estimated prompt + completion tokens per minute; 0 = unlimited
+    retries: int = 3
+    backoff_s: float = 0.5  # base of the jittered exponential backoff
+    backoff_max_s: float = 8.0  # also caps how long a Retry-After header is honoured
+    breaker_failures: int = 5  # consecutive failed calls that open the circuit; 0 = never
+    breaker_reset_s: float = 30.0  # open circuit lets one trial call through after this long
+    hedge_after_s: float = 0.0  # a call still running after this long is duplicated; 0 = off
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "ClientConfig":
+        return cls(
+            max_concurrency=s.llm_max_concurrency, tokens_per_min=s.llm_tokens_per_min,
+            retries=s.llm_retries, backoff_s=s.llm_backoff_s, backoff_max_s=s.llm_backoff_max_s,
+            breaker_failures=s.llm_breaker_failures, breaker_reset_s=s.llm_breaker_reset_s,
+            hedge_after_s=s.llm_hedge_after_s,
+        )
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose: close enough for rate limiting
+    return len(text) // 4 + 1
+
+def _retry_after(headers) -> float | None:
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None  # absent, or an HTTP date
+
+def _check(r) -> None:
+    # requests.Response and httpx.Response alike
+    if r.status_code in RETRY_STATUS:
+        raise RetryableStatus(r.status_code, _retry_after(r.headers))
+    r.raise_for_status()
+
+# ---------- limits ----------
+
+class TokenBucket:
+    # Reservation-style token bucket: a call debits its cost up front (the level may go negative) and
+    # waits until the level is back to zero, so callers are served in arrival order without polling.
+    def __init__(self, per_min: float):
+        self.rate = per_min / 60
+        self.capacity = float(per_min)
+        self.level = self.capacity
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: int, block: bool = True) -> float | None:
+        # -> seconds to wait before sending; None (nothing debited) when not blocking and short
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self._t) * self.rate)
+            self._t = now
+            cost = min(cost, self.capacity)  # an oversized call waits for a full bucket, not forever
+            if not block and self.level < cost:
+                return None
+            self.level -= cost
+            return max(0.0, -self.level / self.rate)
+
+class CircuitBreaker:
+    # closed -> open after `failures` consecutive failed calls -> half-open after `reset_s`
+    # (one trial call) -> closed on success, open again on failure
+    def __init__(self, failures: int, reset_s: float):
+        self.failures = failures
+        self.reset_s = reset_s
+        self.state = "closed"
+        self._n = 0
+        self._opened = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened >= self.reset_s:
+                self.state, self._trial = "half_open", False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return self.state == "closed"
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._n = 0 if ok else self._n + 1
+            if ok:
+                self.state = "closed"
+            elif self.state == "half_open" or (self.failures > 0 and self._n >= self.failures):
+                self.state, self._opened = "open", time.monotonic()
+
+# ---------- client ----------
+
+class Slots:
+    # Concurrency slots shared by threads and event loops: a thread blocks on a condition, a coroutine
+    # awaits a future that a release hands the slot to (on the waiter's loop), so neither polls.
+    def __init__(self, n: int):
+        self.n = self.free = max(1, n)
+        self._cond = threading.Condition()
+        self._waiting: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def acquire(self, blocking: bool = True) -> bool:
+        with self._cond:
+            while not self.free:
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self.free -= 1
+            return True
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.free:
+                self.free -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiting.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._cond:
+                try:
+                    self._waiting.remove(waiter)
+                    handed = False
+                except ValueError:
+                    handed = True  # a release already gave this waiter the slot: pass it on
+            if handed:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._cond:
+            while self._waiting:
+                loop, fut = self._waiting.popleft()
+                try:
+                    loop.call_soon_threadsafe(_wake, fut)
+                    return
+                except RuntimeError:  # loop closed: its waiter is gone
+                    continue
+            if self.free >= self.n:
+                raise ValueError("Slots released too many times")
+            self.free += 1
+            self._cond.notify()
+
+def _wake(fut: asyncio.Future) -> None:
+    if not fut.done():  # cancelled meanwhile: aacquire passes the slot on
+        fut.set_result(None)
+
+# Shared HTTP layer of one LLM provider: pooled keep-alive connections (sync and async), a concurrency
+# limit and token-rate budget, jittered retries on throttling / transient errors, a circuit breaker and
+# optional hedging of slow non-streaming calls. Calls that cannot be served raise LLMUnavailable.
+class ProviderClient:
+    def __init__(self, name: str, cfg: ClientConfig = ClientConfig()):
+        self.name = name
+        self.cfg = cfg
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(1, cfg.max_concurrency), max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._aclient: httpx.AsyncClient | None = None
+        self._slots = Slots(cfg.max_concurrency)
+        self._bucket = TokenBucket(cfg.tokens_per_min)
+        self.breaker = CircuitBreaker(cfg.breaker_failures, cfg.breaker_reset_s)
+        self._hedges = ThreadPoolExecutor(max_workers=2 * max(1, cfg.max_concurrency), thread_name_prefix="llm")
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def aclient(self) -> httpx.AsyncClient:
+        # created on first async call (inside the running event loop)
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(limits=httpx.Limits(max_connections=max(1, self.cfg.max_concurrency)))
+        return self._aclient
+
+    def _count(self, what: str, n: float = 1) -> None:
+        with self._lock:
+            self._counts[what] += n
+        metrics.inc(f"briefing_llm_{what}_total", n, provider=self.name)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"state": self.breaker.state, **self._counts}
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # full jitter; a server's Retry-After wins when longer (capped like the backoff itself)
+        delay = random.uniform(0, min(self.cfg.backoff_max_s, self.cfg.backoff_s * 2 ** attempt))
+        after = error.retry_after if isinstance(error, RetryableStatus) else None
+        return min(self.cfg.backoff_max_s, max(delay, after or 0.0))
+
+    def _gate(self) -> None:
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable(f"{self.name}: circuit open")
+
+    def _failed(self, error: Exception) -> LLMUnavailable:
+        self.breaker.record(False)
+        self._count("failures")
+        return LLMUnavailable(f"{self.name}: {error}")
+
+    # ----- admission: token budget first (no slot held while waiting), then a concurrency slot
+
+    def _admit(self, cost: int) -> None:
+        wait = self._bucket.reserve(cost)
+        if wait:
+            self._count("throttled_seconds", wait)
+            time.sleep(wait)
+        self._slots.acquire()
+
+    async def _aadmit(self, cost: int) -> None:
+        wait = self._bucket.reserve(cost)
+        if wait:
+            self._count("throttled_seconds", wait)
+            await asyncio.sleep(wait)
+        await self._slots.aacquire()  # shared with the sync path; never blocks the loop
+
+    def _try_admit(self, cost: int) -> bool:
+        # a hedge only uses spare capacity: never waits for a slot or for token budget
+        if not self._slots.acquire(blocking=False):
+            return False
+        if self._bucket.reserve(cost, block=False) is None:
+            self._slots.release()
+            return False
+        return True
+
+    # ----- sync
+
+    def _retrying(self, attempt: Callable[[], Any]) -> Any:
+        self._gate()
+        for n in range(self.cfg.retries + 1):
+            try:
+                out = attempt()
+            except (*RETRYABLE, RetryableStatus) as e:
+                if n == self.cfg.retries:
+                    raise self._failed(e) from e
+                self._count("retries")
+                time.sleep(self._backoff(n, e))
+                continue
+            except Exception:
+                self.breaker.record(True)  # the provider answered (e.g. 401): not an outage
+                raise
+            self.breaker.record(True)
+            return out
+
+    def _post(self, url: str, payload: dict, headers: dict | None, timeout: float) -> dict:
+        # one request on a slot the caller acquired
+        try:
+            r = self.session.post(url, json=payload, headers=headers, timeout=timeout)
+        finally:
+            self._slots.release()
+        self._count("requests")
+        _check(r)
+        return r.json()
+
+    def _hedged(self, url: str, payload: dict, headers: dict | None, timeout: float, cost: int) -> dict:
+        self._admit(cost)
+        if self.cfg.hedge_after_s <= 0:
+            return self._post(url, payload, headers, timeout)
+        first = self._hedges.submit(self._post, url, payload, headers, timeout)
+        try:
+            return first.result(timeout=self.cfg.hedge_after_s)
+        except FutureTimeout:
+            pass
+        if not self._try_admit(cost):
+            return first.result()
+        self._count("hedges")
+        second = self._hedges.submit(self._post, url, payload, headers, timeout)
+        error = None
+        for f in as_completed((first, second)):
+            try:
+                out = f.result()
+            except Exception as e:
+                error = error or e
+                continue
+            if f is second:
+                self._count("hedge_wins")
+            return out  # the slower request finishes in the background and is dropped
+        raise error
+
+    def post_json(
+        self, url: str, payload: dict, headers: dict | None = None, timeout: float = 90, cost: int = 0
+    ) -> dict:
+        return self._retrying(lambda: self._hedged(url, payload, headers, timeout, cost))
+
+    def stream_lines(
+        self, url: str, payload: dict, headers: dict | None = None, timeout: float = 90, cost: int = 0,
+        decode_unicode: bool = False,
+    ) -> Iterator[str | bytes]:
+        # retried until the response starts (never once lines were yielded); the slot is held
+        # for as long as the stream is open
+        def attempt() -> requests.Response:
+            self._admit(cost)
+            try:
+                r = self.session.post(url, json=payload, headers=headers, timeout=timeout, stream=True)
+                self._count("requests")
+                if r.status_code >= 400:
+                    r.close()
+                _check(r)
+                return r
+            except BaseException:
+                self._slots.release()
+                raise
+
+        r = self._retrying(attempt)
+        try:
+            with r:
+                yield from r.iter_lines(decode_unicode=decode_unicode)
+        finally:
+            self._slots.release()
+
+    # ----- async
+
+    async def _aretrying(self, attempt: Callable[[], Any]) -> Any:
+        self._gate()
+        for n in range(self.cfg.retries + 1):
+            try:
+                out = await attempt()
+            except (*RETRYABLE, RetryableStatus) as e:
+                if n == self.cfg.retries:
+                    raise self._failed(e) from e
+                self._count("retries")
+                await asyncio.sleep(self._backoff(n, e))
+                continue
+            except Exception:
+                self.breaker.record(True)
+                raise
+            self.breaker.record(True)
+            return out
+
+    async def _apost(self, url: str, payload: dict, headers: dict | None, timeout: float) -> dict:
+        try:
+            r = await self.aclient().post(url, json=payload, headers=headers, timeout=timeout)
+        finally:
+            self._slots.release()
+        self._count("requests")
+        _check(r)
+        return r.json()
+
+    async def _ahedged(self, url: str, payload: dict, headers: dict | None, timeout: float, cost: int) -> dict:
+        await self._aadmit(cost)
+        first = asyncio.ensure_future(self._apost(url, payload, headers, timeout))
+        tasks = [first]
+        try:
+            if self.cfg.hedge_after_s > 0:
+                done, _ = await asyncio.wait(tasks, timeout=self.cfg.hedge_after_s)
+                if not done and self._try_admit(cost):
+                    self._count("hedges")
+                    tasks.append(asyncio.ensure_future(self._apost(url, payload, headers, timeout)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if t is not first:
+                            self._count("hedge_wins")
+                        return t.result()
+                    error = error or t.exception()
+            raise error
+        finally:
+            for t in tasks:
+                t.cancel()  # the loser releases its slot on cancellation
+
+    async def apost_json(
+        self, url: str, payload: dict, headers: dict | None = None, timeout: float = 90, cost: int = 0
+    ) -> dict:
+        return await self._aretrying(lambda: self._ahedged(url, payload, headers, timeout, cost))
@@ -0,0 +1,103 @@
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable
+import threading
+
+from core.observability import rss_mb
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+DEFAULT_DENSE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# sentence-transformers (and torch with it) is imported by the first model load, not with this module:
+# importing the API, the engine or the guardrails stays cheap
+
+def load_embedder(name: str) -> SentenceTransformer:
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(name)
+
+def load_cross_encoder(name: str) -> CrossEncoder:
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(name)
+
+def load_quantized_cross_encoder(name: str) -> CrossEncoder:
+    # int8 dynamic quantization of the Linear layers: smaller and faster on CPU, small score drift
+    import torch
+    from sentence_transformers import CrossEncoder
+
+    ce = CrossEncoder(name, device="cpu")
+    ce.model = torch.quantization.quantize_dynamic(ce.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return ce
+
+@dataclass(frozen=True)
+class ModelInfo:
+    kind: str  # embedder | cross_encoder | cross_encoder_int8
+    name: str
+    load_s: float
+    rss_mb: float
+
+# Process-wide registry: each (kind, name) is loaded once, on first use, and shared by every caller.
+class ModelRegistry:
+    def __init__(self):
+        self._loaders: dict[str, Callable[[str], Any]] = {
+            "embedder": load_embedder,
+            "cross_encoder": load_cross_encoder,
+            "cross_encoder_int8": load_quantized_cross_encoder,
+        }
+        self._models: dict[tuple[str, str], Any] = {}
+        self._info: dict[tuple[str, str], ModelInfo] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, name: str) -> Any:
+        key = (kind, name)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            # re-check: another thread may have finished loading while we waited
+            if key not in self._models:
+                rss0, t0 = rss_mb(), perf_counter()
+                self._models[key] = self._loaders[kind](name)
+                self._info[key] = ModelInfo(kind, name, perf_counter() - t0, max(rss_mb() - rss0, 0.0))
+            return self._models[key]
+
+    def embedder(self, name: str = DEFAULT_DENSE_MODEL) -> SentenceTransformer:
+        return self.get("embedder", name)
+
+    def cross_encoder(self, name: str = DEFAULT_RERANK_MODEL) -> CrossEncoder:
+        return self.get("cross_encoder", name)
+
+    def cross_encoder_int8(self, name: str = DEFAULT_RERANK_MODEL) -> CrossEncoder:
+        return self.get("cross_encoder_int8", name)
+
+    def warm_up(
+        self, dense_model: str = DEFAULT_DENSE_MODEL, rerank_model: str | None = None, quantized: bool = False
+    ) -> list[dict]:
+        self.embedder(dense_model)
+        if rerank_model:
+            self.get("cross_encoder_int8" if quantized else "cross_encoder", rerank_model)
+        return self.stats()
+
+    def loaded(self, kind: str, name: str) -> bool:
+        return (kind, name) in self._models
+
+    def stats(self) -> list[dict]:
+        return [asdict(i) for i in self._info.values()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self._info.clear()
+
+registry = ModelRegistry()
+
+def get_embedder(name: str = DEFAULT_DENSE_MODEL) -> SentenceTransformer:
+    return registry.embedder(name)
+
+def get_cross_encoder(name: str = DEFAULT_RERANK_MODEL) -> CrossEncoder:
+    return registry.cross_encoder(name)
@@ -1,8 +1,25 @@
 from __future__ import annotations
+from bisect import bisect_left
 from dataclasses import dataclass, asdict
-from time import perf_counter
+from time import perf_counter, thread_time
 from typing import Any, Dict, Optional, List
-import json, os, time, uuid
+import asyncio, json, os, resource, threading, time, uuid
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+def rss_mb() -> float:
+    # current resident set size; falls back to the peak RSS where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 @dataclass
 class Span:
@@ -10,6 +27,11 @@ class Span:
     t0: float
     t1: float | None = None
     meta: Dict[str, Any] | None = None
+    span_id: int = 0
+    parent_id: int | None = None  # enclosing span, None for top-level stages
+    # CPU time of the thread that ran the span; None on an event loop, whose thread also runs other tasks
+    cpu_s: float | None = None
+    mem_delta_mb: float | None = None  # RSS change over the span (process-wide), when tracing memory
 
 @dataclass
 class RunTrace:
@@ -21,28 +43,58 @@ class RunTrace:
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
+    def timings(self) -> List[Dict[str, Any]]:
+        # finished spans in start order, named by their path ("collect / index"), with duration in ms
+        by_id = {sp.span_id: sp for sp in self.spans}
+
+        def path(sp: Span) -> str:
+            parent = by_id.get(sp.parent_id)
+            return f"{path(parent)} / {sp.name}" if parent is not None else sp.name
+
+        return [
+            {"stage": path(sp), "ms": round((sp.t1 - sp.t0) * 1000, 1)} for sp in self.spans if sp.t1 is not None
+        ]
+
 class Tracer:
-    def __init__(self, topic: str):
+    def __init__(self, topic: str, meta: Optional[dict[str, Any]] = None, memory: bool = False):
         self.run_id = str(uuid.uuid4())
         self.topic = topic
+        self.memory = memory  # RSS deltas cost two /proc reads per span
         self.spans: list[Span] = []
-        self.meta: dict[str, Any] = {}
+        self.meta: dict[str, Any] = dict(meta or {})
+        self._open: list[Span] = []  # currently entered spans, innermost last
+        self._t0 = perf_counter()
 
     def span(self, name: str, meta: Optional[dict[str, Any]] = None):
         tracer = self
         class _Ctx:
             def __enter__(self_inner):
-                t0 = perf_counter()
-                tracer.spans.append(Span(name=name, t0=t0, meta=meta or {}))
-                return self_inner
+                parent = tracer._open[-1].span_id if tracer._open else None
+                span = Span(
+                    name=name, t0=perf_counter(), meta=meta or {}, span_id=len(tracer.spans) + 1, parent_id=parent
+                )
+                self_inner.span = span
+                self_inner.cpu0 = None if _on_event_loop() else thread_time()
+                self_inner.rss0 = rss_mb() if tracer.memory else None
+                tracer.spans.append(span)
+                tracer._open.append(span)
+                return span
             def __exit__(self_inner, exc_type, exc, tb):
-                tracer.spans[-1].t1 = perf_counter()
+                span = self_inner.span
+                span.t1 = perf_counter()
+                if self_inner.cpu0 is not None:
+                    span.cpu_s = thread_time() - self_inner.cpu0
+                if self_inner.rss0 is not None:
+                    span.mem_delta_mb = rss_mb() - self_inner.rss0
+                tracer._open.remove(span)
                 if exc:
-                    tracer.spans[-1].meta = {**(tracer.spans[-1].meta or {}), "error": str(exc)}
+                    span.meta = {**(span.meta or {}), "error": str(exc)}
         return _Ctx()
 
     def finish(self) -> RunTrace:
-        return RunTrace(run_id=self.run_id, topic=self.topic, spans=self.spans, meta=self.meta)
+        trace = RunTrace(run_id=self.run_id, topic=self.topic, spans=self.spans, meta=self.meta)
+        metrics.record_run(trace, perf_counter() - self._t0)
+        return trace
 
 def write_run(trace: RunTrace, out_dir: str) -> str:
     os.makedirs(out_dir, exist_ok=True)
@@ -54,3 +106,101 @@ def write_run(trace: RunTrace, out_dir: str) -> str:
     with open(jl, "a", encoding="utf-8") as f:
         f.write(json.dumps({"ts": int(time.time()), **trace.to_dict()}, ensure_ascii=False) + "\n")
     return path
+
+# ---------- metrics (Prometheus text exposition) ----------
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "briefing_runs_total": "Finished briefing runs.",
+    "briefing_run_seconds": "End-to-end briefing latency.",
+    "briefing_stage_seconds": "Latency per pipeline stage (span).",
+    "briefing_stage_cpu_seconds_total": "CPU time spent per pipeline stage.",
+    "briefing_prompt_tokens_total": "Estimated prompt tokens sent to the LLM.",
+}
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items())) + "}"
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket: +Inf
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+
+# In-process registry of counters, gauges and histograms; rendered on GET /metrics.
+class MetricsRegistry:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, dict[tuple, float]] = {}
+        self._hists: dict[str, dict[tuple, _Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(self.buckets)
+            series[key].observe(value)
+
+    def record_run(self, trace: RunTrace, seconds: float) -> None:
+        provider = str(trace.meta.get("provider", "unknown"))
+        cache = str(trace.meta.get("cache", "off"))
+        quality = "ok" if trace.meta.get("quality_ok") else "abstained"
+        self.inc("briefing_runs_total", provider=provider, cache=cache, quality=quality)
+        self.observe("briefing_run_seconds", seconds, provider=provider, cache=cache)
+        for sp in trace.spans:
+            if sp.t1 is None:
+                continue
+            self.observe("briefing_stage_seconds", sp.t1 - sp.t0, stage=sp.name, provider=provider)
+            if sp.cpu_s is not None:
+                self.inc("briefing_stage_cpu_seconds_total", sp.cpu_s, stage=sp.name)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(store.items()):
+                    if name in HELP:
+                        lines.append(f"# HELP {name} {HELP[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    lines += [f"{name}{_labels(dict(k))} {v}" for k, v in sorted(series.items())]
+            for name, series in sorted(self._hists.items()):
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for k, h in sorted(series.items()):
+                    labels, acc = dict(k), 0
+                    for le, c in zip((*h.buckets, "+Inf"), h.counts):
+                        acc += c
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': str(le)})} {acc}")
+                    lines.append(f"{name}_sum{_labels(labels)} {h.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {acc}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._hists.clear()
+
+metrics = MetricsRegistry()
@@ -1,18 +1,28 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
-import re
-
-import fitz
-import trafilatura
-import requests
+from time import perf_counter
+from typing import TYPE_CHECKING, Iterator
 
 import numpy as np
-import faiss
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer, CrossEncoder
 
-from core.guardrails import is_injection, redact_pii
+from core.bm25 import SparseBM25, StackedBM25
+from core.chunker import (
+    ChunkConfig, Piece, joined, normalize_ws, stream_chunks, text_blocks, window_chunks,
+)
+from core.chunkstore import Chunk, ChunkStore
+from core.dense import DenseConfig, build_dense_index
+from core.embcache import EmbeddingCache
+from core.guardrails import ScanResult, StreamScanner, scan_many
+from core.models import DEFAULT_DENSE_MODEL, DEFAULT_RERANK_MODEL, get_embedder
+from core.rerank import RerankConfig, Reranker
+
+if TYPE_CHECKING:
+    import faiss
+    from sentence_transformers import SentenceTransformer
+
+# PDF / HTML parsers (fitz, trafilatura) are imported where a document is first parsed, so that
+# importing this module (and the engine / API through it) stays cheap
 
 # ---------- data structures ----------
 
@@ -24,14 +34,6 @@ class Doc:
     text: str
     kind: str  # pdf | page | web
 
-@dataclass(frozen=True)
-class Chunk:
-    chunk_id: str
-    doc_id: str
-    source: str
-    title: str
-    text: str
-
 @dataclass(frozen=True)
 class Citation:
     idx: int
@@ -41,29 +43,57 @@ class Citation:
 
 # ---------- ingestion ----------
 
-def load_pdfs(folder: str) -> list[Doc]:
+PAGE_SUFFIXES = (".txt", ".md", ".html")
+
+def list_pdfs(folder: str) -> list[Path]:
+    return sorted(Path(folder).glob("*.pdf"))
+
+def list_local_pages(folder: str) -> list[Path]:
     p = Path(folder)
-    docs: list[Doc] = []
-    for pdf in sorted(p.glob("*.pdf")):
-        d = fitz.open(str(pdf))
-        text = "\n".join(page.get_text("text") for page in d).strip()
-        docs.append(Doc(
-            doc_id=f"pdf::{pdf.name}", source=str(pdf), title=pdf.stem, text=text, kind="pdf"
-        ))
-    return docs
+    return sorted(f for suffix in PAGE_SUFFIXES for f in p.glob(f"*{suffix}"))
+
+def pdf_pages(pdf: Path) -> Iterator[tuple[int, str]]:
+    # (1-based page number, text), one page in memory at a time
+    import fitz
+
+    with fitz.open(str(pdf)) as d:
+        for page in d:
+            yield page.number + 1, page.get_text("text")
+
+def load_pdf(pdf: Path) -> Doc:
+    text = "\n".join(text for _, text in pdf_pages(pdf)).strip()
+    return Doc(doc_id=f"pdf::{pdf.name}", source=str(pdf), title=pdf.stem, text=text, kind="pdf")
+
+def load_local_page(f: Path) -> Doc:
+    raw = f.read_text(encoding="utf-8", errors="ignore")
+    if f.suffix != ".html":
+        extracted = raw
+    else:
+        import trafilatura
+
+        extracted = trafilatura.extract(raw, include_tables=True)
+    return Doc(
+        doc_id=f"file::{f.name}", source=str(f), title=f.stem, text=(extracted or "").strip(), kind="page"
+    )
+
+def source_pieces(p: Path) -> tuple[str, str, Iterator[Piece]]:
+    # (doc_id, title, lazy text pieces) of a local file, with the same ids / text as the loaders above;
+    # HTML still goes through trafilatura as a whole
+    if p.suffix == ".pdf":
+        return f"pdf::{p.name}", p.stem, joined(pdf_pages(p))
+    if p.suffix == ".html":
+        return f"file::{p.name}", p.stem, iter([(None, load_local_page(p).text)])
+    return f"file::{p.name}", p.stem, text_blocks(p)
+
+def load_pdfs(folder: str) -> list[Doc]:
+    return [load_pdf(pdf) for pdf in list_pdfs(folder)]
 
 def load_local_pages(folder: str) -> list[Doc]:
-    p = Path(folder)
-    docs: list[Doc] = []
-    for f in sorted(list(p.glob("*.txt")) + list(p.glob("*.md")) + list(p.glob("*.html"))):
-        raw = f.read_text(encoding="utf-8", errors="ignore")
-        extracted = trafilatura.extract(raw, include_tables=True) if f.suffix == ".html" else raw
-        docs.append(Doc(
-            doc_id=f"file::{f.name}", source=str(f), title=f.stem, text=(extracted or "").strip(), kind="page"
-        ))
-    return docs
+    return [load_local_page(f) for f in list_local_pages(folder)]
 
 def fetch_url(url: str, timeout: int = 20) -> Doc:
+    import requests, trafilatura
+
     r = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
     r.raise_for_status()
     extracted = trafilatura.extract(r.text, include_tables=True)
@@ -71,121 +101,186 @@ def fetch_url(url: str, timeout: int = 20) -> Doc:
 
 # ---------- chunking ----------
 
-def chunk_doc(doc: Doc, size: int = 900, overlap: int = 120) -> list[Chunk]:
-    t = re.sub(r"\s+", " ", doc.text).strip()
-    if not t:
-        return []
-    out: list[Chunk] = []
-    start, i = 0, 0
-    while start < len(t):
-        end = min(len(t), start + size)
-        chunk_text = t[start:end].strip()
-        if chunk_text:
-            out.append(Chunk(
-                chunk_id=f"{doc.doc_id}::chunk::{i}",
-                doc_id=doc.doc_id,
-                source=doc.source,
-                title=doc.title,
-                text=chunk_text,
-            ))
-            i += 1
-        start = end - overlap if end - overlap > start else end
-    return out
-
-def make_citations(chunks: list[Chunk], max_citations: int) -> list[Citation]:
-    cites: list[Citation] = []
-    seen_sources = set()
-    i = 1
-    for ch in chunks:
-        if ch.source in seen_sources:
-            continue
-        seen_sources.add(ch.source)
-        excerpt = (ch.text[:260].strip() + "…") if len(ch.text) > 260 else ch.text
-        cites.append(Citation(i, ch.title, ch.source, excerpt))
-        i += 1
-        if len(cites) >= max_citations:
-            break
-    return cites
+def chunk_doc(doc: Doc, size: int = 900, overlap: int = 120, snap: str = "none") -> list[Chunk]:
+    # in-memory documents (e.g. fetched URLs); files are streamed page by page, see core/chunker.py
+    pieces = normalize_ws([(None, doc.text)])
+    return list(window_chunks(pieces, doc.doc_id, doc.source, doc.title, ChunkConfig(size, overlap, snap)))
 
 
 # ---------- retrieval ----------
 
-def rrf_fusion(a_ids: list[str], b_ids: list[str], k: int = 60) -> dict[str, float]:
+def rrf_fusion(a_ids: list, b_ids: list, k: int = 60) -> dict:
     # Reciprocal Rank Fusion scores per id
-    scores: dict[str, float] = {}
+    scores: dict = {}
     for rank, cid in enumerate(a_ids, start=1):
         scores[cid] = scores.get(cid, 0.0) + (1.0 / (k + rank))
     for rank, cid in enumerate(b_ids, start=1):
         scores[cid] = scores.get(cid, 0.0) + (1.0 / (k + rank))
     return scores
 
+def embed_chunks(
+    embedder: SentenceTransformer, chunks: list[Chunk] | ChunkStore, cache: EmbeddingCache | None = None
+) -> np.ndarray:
+    def encode(texts: list[str]) -> np.ndarray:
+        emb = embedder.encode(texts, normalize_embeddings=True, show_progress_bar=True)
+        return np.asarray(emb, dtype="float32")
+
+    texts = list(chunks.texts()) if isinstance(chunks, ChunkStore) else [c.text for c in chunks]
+    return cache.encode(texts, encode) if cache is not None else encode(texts)
+
 class HybridRetriever:
     def __init__(
         self,
-        chunks: list[Chunk],
-        dense_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        chunks: list[Chunk] | ChunkStore,
+        dense_model: str = DEFAULT_DENSE_MODEL,
         rerank: bool = True,
-        rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        rerank_model: str = DEFAULT_RERANK_MODEL,
+        embeddings: np.ndarray | None = None,
+        bm25: SparseBM25 | StackedBM25 | None = None,
+        dense_index: faiss.Index | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        dense: DenseConfig = DenseConfig(),
+        dense_backend: str | None = None,
+        reranker: Reranker | None = None,
     ):
-        self.chunks = chunks
-        self.id2chunk = {c.chunk_id: c for c in chunks}
+        # columnar storage; results are materialised as Chunk views only for the rows returned
+        self.chunks = chunks if isinstance(chunks, ChunkStore) else ChunkStore.from_chunks(chunks)
 
-        # BM25
-        self.tokens = [c.text.lower().split() for c in chunks]
-        self.bm25 = BM25Okapi(self.tokens)
+        # BM25 (sparse inverted index, scored with NumPy)
+        self.bm25 = bm25 if bm25 is not None else SparseBM25(self.chunks.texts())
 
-        # Dense
-        self.embedder = SentenceTransformer(dense_model)
-        emb = self.embedder.encode([c.text for c in chunks], normalize_embeddings=True, show_progress_bar=True)
-        emb = np.asarray(emb, dtype="float32")
-        self.faiss = faiss.IndexFlatIP(emb.shape[1])
-        self.faiss.add(emb)
+        # Dense (precomputed embeddings / index are reused as-is, e.g. from the IndexStore)
+        self.embedder = get_embedder(dense_model)
+        if dense_index is None:
+            if embeddings is None:
+                embeddings = embed_chunks(self.embedder, self.chunks, embedding_cache)
+            dense_index, dense_backend = build_dense_index(embeddings, dense)
+        self.embeddings = embeddings
+        self.faiss = dense_index
+        self.dense_backend = dense_backend
 
-        # Rerank
+        # Rerank (a shared Reranker keeps its score cache across retriever rebuilds)
         self.rerank_enabled = rerank
-        self.reranker = CrossEncoder(rerank_model) if rerank else None
+        self.reranker = (reranker or Reranker(RerankConfig(model=rerank_model))) if rerank else None
 
-    def search(self, query: str, bm25_k: int, dense_k: int, top_k: int) -> list[Chunk]:
-        # BM25
-        bm_scores = self.bm25.get_scores(query.lower().split())
-        bm_idx = sorted(range(len(bm_scores)), key=lambda i: bm_scores[i], reverse=True)[:bm25_k]
-        bm_ids = [self.chunks[i].chunk_id for i in bm_idx]
+    def __len__(self) -> int:
+        return len(self.chunks)
 
-        # Dense
-        q = self.embedder.encode([query], normalize_embeddings=True)
+    def _bm25_ids(self, query: str, k: int) -> list[int]:
+        bm_idx, _ = self.bm25.search(query, k)
+        return bm_idx.tolist()
+
+    def _dense_ids(self, query: str, k: int, vectors: dict | None = None) -> list[int]:
+        return self._dense_many([query], k, None if vectors is None else [vectors])[0]
+
+    def _dense_many(self, queries: list[str], k: int, vectors: list[dict] | None = None) -> list[list[int]]:
+        # one encoder call and one FAISS search for all queries
+        q = self.embedder.encode(queries, normalize_embeddings=True)
         q = np.asarray(q, dtype="float32")
-        d_scores, d_ids = self.faiss.search(q, dense_k)
-        dense_ids = [self.chunks[int(i)].chunk_id for i in d_ids[0] if int(i) != -1]
+        _, d_ids = self.faiss.search(q, k)
+        for v, qv in zip(vectors or (), q):
+            v["query"] = qv
+        return [[int(i) for i in row if int(i) != -1] for row in d_ids]
 
-        # Fusion
+    def _fuse(self, bm_ids: list[int], dense_ids: list[int], top_k: int, vectors: dict | None = None) -> list[Chunk]:
+        # Fusion (over row ids); only the candidates are materialised as Chunks
         fused_scores = rrf_fusion(bm_ids, dense_ids)
-        fused = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)[: max(top_k * 2, 20)]
-        fused_chunks = [self.id2chunk[cid] for cid, _ in fused]
+        n_candidates = self.reranker.cfg.n_candidates(top_k) if self.reranker else max(top_k * 2, 20)
+        fused = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)[:n_candidates]
+        out = [self.chunks[row] for row, _ in fused]
+        if vectors is not None and self.embeddings is not None:
+            vectors.update((c.chunk_id, self.embeddings[row]) for c, (row, _) in zip(out, fused))
+        return out
+
+    def search(
+        self, query: str, bm25_k: int, dense_k: int, top_k: int,
+        rerank_budget_ms: float | None = None, info: dict | None = None, vectors: dict | None = None,
+        stages: dict | None = None,
+    ) -> list[Chunk]:
+        # `vectors` (optional) receives the query embedding ("query") and each candidate's embedding
+        # (by chunk_id), for later stages to reuse (see core/evidence.py); `stages` (optional) the
+        # ranking after every stage, and `info["stage_ms"]` each stage's time
+        ms: dict[str, float] = {}
+        t0 = perf_counter()
+        bm_ids = self._bm25_ids(query, bm25_k)
+        t1 = perf_counter()
+        dense_ids = self._dense_ids(query, dense_k, vectors)
+        t2 = perf_counter()
+        fused_chunks = self._fuse(bm_ids, dense_ids, top_k, vectors)
+        ms.update(bm25=(t1 - t0) * 1000, dense=(t2 - t1) * 1000, fuse=(perf_counter() - t2) * 1000)
+        if stages is not None:
+            stages.update(
+                bm25=[self.chunks[r] for r in bm_ids], dense=[self.chunks[r] for r in dense_ids], fused=fused_chunks
+            )
+        if info is not None:
+            info["stage_ms"] = ms
 
         # Optional rerank
         if self.rerank_enabled and self.reranker and fused_chunks:
-            pairs = [[query, c.text] for c in fused_chunks]
-            rr = self.reranker.predict(pairs)
-            ranked = sorted(zip(fused_chunks, rr), key=lambda x: float(x[1]), reverse=True)[:top_k]
-            return [c for c, _ in ranked]
+            rerank_info: dict = {}
+            t0 = perf_counter()
+            out = self.reranker.rerank(query, fused_chunks, top_k, rerank_budget_ms, rerank_info)
+            ms["rerank"] = (perf_counter() - t0) * 1000
+            if stages is not None:
+                stages["rerank"] = out
+            if info is not None:
+                info["rerank"] = rerank_info
+            return out
 
         return fused_chunks[:top_k]
 
+    def search_many(
+        self, queries: list[str], bm25_k: int, dense_k: int, top_k: int, vectors: list[dict] | None = None
+    ) -> list[list[Chunk]]:
+        # search() for a batch of queries: query embeddings, the FAISS search and cross-encoder
+        # scoring each run once for the whole batch (no rerank latency budget on this path)
+        if not queries:
+            return []
+        dense = self._dense_many(queries, dense_k, vectors)
+        vecs = vectors or [None] * len(queries)
+        fused = [self._fuse(self._bm25_ids(q, bm25_k), d, top_k, v) for q, d, v in zip(queries, dense, vecs)]
+        if self.rerank_enabled and self.reranker:
+            return self.reranker.rerank_many(queries, fused, top_k)
+        return [f[:top_k] for f in fused]
+
+    def search_stages(
+        self, query: str, bm25_k: int, dense_k: int, top_k: int
+    ) -> tuple[dict[str, list[Chunk]], dict[str, float]]:
+        # The ranking after every stage (bm25, dense, fused, rerank when enabled) and each stage's time
+        # in ms, e.g. to score retrieval per stage.
+        stages: dict[str, list[Chunk]] = {}
+        info: dict = {}
+        self.search(query, bm25_k, dense_k, top_k, info=info, stages=stages)
+        return stages, info["stage_ms"]
+
 # ---------- end-to-end build ----------
 
-def build_chunks(pdfs_dir: str, pages_dir: str, mode: str, urls: list[str] | None) -> list[Chunk]:
-    docs: list[Doc] = []
-    docs += load_pdfs(pdfs_dir)
-    docs += load_local_pages(pages_dir)
+def doc_chunks(
+    d: Doc, scan: ScanResult | None = None, cfg: ChunkConfig = ChunkConfig()
+) -> list[Chunk]:
+    # guardrails run per document, before anything reaches the index; `scan` is a precomputed
+    # scan_document(d.text) (e.g. from a scan_many batch)
+    if scan is not None:
+        if scan.injection:
+            return []
+        return chunk_doc(Doc(d.doc_id, d.source, d.title, scan.text, d.kind), cfg.size, cfg.overlap, cfg.snap)
+    scanner = StreamScanner()
+    chunks = list(stream_chunks([(None, d.text)], d.doc_id, d.source, d.title, cfg, scanner))
+    return [] if scanner.injection else chunks
+
+def build_chunks(
+    pdfs_dir: str, pages_dir: str, mode: str, urls: list[str] | None, workers: int = 0,
+    cfg: ChunkConfig = ChunkConfig(),
+) -> list[Chunk]:
+    from core.ingest import UrlFetcher, chunk_files  # ingest is built on the loaders above
+
+    # failed documents are skipped, not fatal
+    results = chunk_files(list_pdfs(pdfs_dir) + list_local_pages(pages_dir), workers, cfg)
+    chunks = [ch for r in results for ch in r.chunks or []]
     if mode == "online" and urls:
-        docs += [fetch_url(u) for u in urls]
-
-    chunks: list[Chunk] = []
-    for d in docs:
-        if is_injection(d.text):
-            continue
-        cleaned = redact_pii(d.text)
-        chunks.extend(chunk_doc(Doc(d.doc_id, d.source, d.title, cleaned, d.kind)))
+        docs = [r.doc for r in UrlFetcher().fetch(urls, workers) if r.doc is not None]
+        for d, scan in zip(docs, scan_many([d.text for d in docs], workers)):
+            chunks.extend(doc_chunks(d, scan, cfg))
     return chunks
 
 def distinct_sources(chunks: list[Chunk]) -> set[str]:
@@ -0,0 +1,137 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any
+import hashlib, threading
+
+from core.config import Settings
+from core.models import DEFAULT_RERANK_MODEL, registry
+
+@dataclass(frozen=True)
+class RerankConfig:
+    model: str = DEFAULT_RERANK_MODEL
+    candidates: int = 0  # fused candidates sent to the cross-encoder; 0 = max(top_k * 2, 20)
+    batch_size: int = 16
+    cache_size: int = 50_000  # (query, chunk_id, text hash, model) -> score entries kept (LRU)
+    quantize: bool = False  # int8 dynamic quantization of the Linear layers (CPU)
+    budget_ms: float = 0  # 0 = no latency budget
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "RerankConfig":
+        return cls(
+            model=s.rerank_model, candidates=s.rerank_candidates, batch_size=s.rerank_batch_size,
+            cache_size=s.rerank_cache_size, quantize=s.rerank_quantize, budget_ms=s.rerank_budget_ms,
+        )
+
+    def n_candidates(self, top_k: int) -> int:
+        return self.candidates or max(top_k * 2, 20)
+
+def _top(chunks: list, scores: list, top_k: int) -> list:
+    # stable sort: equal scores keep the fused order
+    order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)[:top_k]
+    return [chunks[i] for i in order]
+
+def _text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+# Cross-encoder rerank stage: scores are cached per (query, chunk_id, text hash, model) and computed in
+# batches; when the latency budget would be (or is) exceeded, the fused RRF order is returned unchanged.
+# The text hash matters: a chunk id outlives edits of its source file (and the reranker outlives the
+# retrievers rebuilt on refresh), so an edited chunk must not be served its old score.
+class Reranker:
+    def __init__(self, cfg: RerankConfig = RerankConfig(), model: Any = None):
+        self.cfg = cfg
+        self._model = model  # explicit model (tests, custom scorers); otherwise from the registry
+        self.model_key = f"{cfg.model}:int8" if cfg.quantize else cfg.model
+        self._cache: OrderedDict[tuple[str, str, bytes, str], float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._s_per_pair: float | None = None  # EWMA of observed cross-encoder cost
+
+    @property
+    def model(self) -> Any:
+        if self._model is not None:
+            return self._model
+        if self.cfg.quantize:
+            return registry.cross_encoder_int8(self.cfg.model)
+        return registry.cross_encoder(self.cfg.model)
+
+    def _key(self, query: str, chunk) -> tuple[str, str, bytes, str]:
+        return query, chunk.chunk_id, _text_key(chunk.text), self.model_key
+
+    def _cached(self, key: tuple[str, str, bytes, str]) -> float | None:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, keys: list[tuple[str, str, bytes, str]], scores: list[float]) -> None:
+        with self._lock:
+            for k, s in zip(keys, scores):
+                self._cache[k] = s
+                self._cache.move_to_end(k)
+            while len(self._cache) > self.cfg.cache_size:
+                self._cache.popitem(last=False)
+
+    def _observe(self, n_pairs: int, seconds: float) -> None:
+        per_pair = seconds / n_pairs
+        prev = self._s_per_pair
+        self._s_per_pair = per_pair if prev is None else 0.8 * prev + 0.2 * per_pair
+
+    def rerank(
+        self, query: str, chunks: list, top_k: int, budget_ms: float | None = None, info: dict | None = None
+    ) -> list:
+        # `chunks` is the fused order (best first); `budget_ms` overrides the configured budget per call
+        info = info if info is not None else {}
+        budget = (self.cfg.budget_ms if budget_ms is None else budget_ms) / 1000
+        t0 = perf_counter()
+
+        keys = [self._key(query, c) for c in chunks]
+        scores: list[float | None] = [self._cached(k) for k in keys]
+        misses = [i for i, s in enumerate(scores) if s is None]
+        info.update(candidates=len(chunks), cache_hits=len(chunks) - len(misses), fallback=False)
+
+        if misses and budget and self._s_per_pair is not None and self._s_per_pair * len(misses) > budget:
+            info.update(fallback=True, reason="predicted_over_budget")
+            return chunks[:top_k]
+
+        model = self.model if misses else None
+        bs = max(1, self.cfg.batch_size)
+        for start in range(0, len(misses), bs):
+            if budget and perf_counter() - t0 > budget:
+                info.update(fallback=True, reason="over_budget", elapsed_ms=(perf_counter() - t0) * 1000)
+                return chunks[:top_k]
+            batch = misses[start:start + bs]
+            tb = perf_counter()
+            out = model.predict([[query, chunks[i].text] for i in batch], batch_size=bs, show_progress_bar=False)
+            self._observe(len(batch), perf_counter() - tb)
+            batch_scores = [float(x) for x in out]
+            self._store([keys[i] for i in batch], batch_scores)
+            for i, s in zip(batch, batch_scores):
+                scores[i] = s
+
+        info["elapsed_ms"] = (perf_counter() - t0) * 1000
+        return _top(chunks, scores, top_k)
+
+    def rerank_many(self, queries: list[str], chunk_lists: list[list], top_k: int) -> list[list]:
+        # Batch path (no latency budget): the cache misses of every query are scored together in one
+        # predict call, so the cross-encoder sees full batches instead of one short call per query.
+        keys = [[self._key(q, c) for c in chunks] for q, chunks in zip(queries, chunk_lists)]
+        scores: list[list[float | None]] = [[self._cached(k) for k in row] for row in keys]
+        misses = [(qi, i) for qi, row in enumerate(scores) for i, s in enumerate(row) if s is None]
+        if misses:
+            bs = max(1, self.cfg.batch_size)
+            pairs = [[queries[qi], chunk_lists[qi][i].text] for qi, i in misses]
+            tb = perf_counter()
+            out = self.model.predict(pairs, batch_size=bs, show_progress_bar=False)
+            self._observe(len(pairs), perf_counter() - tb)
+            batch_scores = [float(x) for x in out]
+            self._store([keys[qi][i] for qi, i in misses], batch_scores)
+            for (qi, i), s in zip(misses, batch_scores):
+                scores[qi][i] = s
+        return [_top(chunks, row, top_k) for chunks, row in zip(chunk_lists, scores)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from concurrent.futures import Executor, Future
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterator, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+class Overloaded(Exception):
+    def __init__(self, status: int, reason: str, retry_after: int = 1):
+        super().__init__(reason)
+        self.status = status  # 429: queue full, 503: waited too long for a slot
+        self.reason = reason
+        self.retry_after = retry_after
+
+# Bounded admission: at most `max_concurrency` requests run, at most `max_queue` wait for a slot.
+# Anything beyond that is rejected immediately instead of piling up threads and memory.
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.running = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._slots.locked():
+            await self._slots.acquire()  # free slot: returns without suspending
+        else:
+            if self.waiting >= self.max_queue:
+                raise Overloaded(429, "Too many queued requests.")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise Overloaded(503, "Timed out waiting for a free worker.") from None
+            finally:
+                self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+# Identical in-flight requests share one execution: it runs as a task of its own, which every caller
+# (the first one included) awaits; a caller that goes away (client disconnect, timeout) only stops
+# waiting, and the work is cancelled once nobody waits for it any more.
+class Coalescer:
+    def __init__(self):
+        self._inflight: dict[Hashable, tuple[asyncio.Task, list[int]]] = {}  # key -> (task, [waiters])
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = self._inflight[key] = (asyncio.ensure_future(fn()), [0])
+            entry[0].add_done_callback(lambda _: self._forget(key, entry))
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters[0] -= 1
+            if not waiters[0] and not task.done():
+                task.cancel()
+                self._forget(key, entry)
+
+    def _forget(self, key: Hashable, entry: tuple) -> None:
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+_END = object()
+
+async def iterate_in_threads(it: Iterator[T], executor: Executor) -> AsyncIterator[T]:
+    # A blocking iterator (e.g. a streamed LLM answer) consumed from the event loop: each step runs on
+    # `executor`, so no thread is held between items. When the consumer stops early (client gone), the
+    # iterator is closed once its pending step returns; a running generator cannot be closed sooner.
+    close = getattr(it, "close", lambda: None)
+    step: Future | None = None
+    try:
+        while True:
+            step = executor.submit(next, it, _END)
+            item = await asyncio.wrap_future(step)
+            if item is _END:
+                return
+            yield item
+    finally:
+        if step is None:
+            close()
+        else:
+            step.add_done_callback(lambda _: close())
+
+def briefing_key(topic: str, mode: str, urls: list[str] | None) -> tuple:
+    return (" ".join(topic.lower().split()), mode, tuple(urls or ()))
@@ -0,0 +1,426 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+import copy, hashlib, json, multiprocessing as mp, os, shutil, threading
+
+import numpy as np
+
+from core.bm25 import SparseBM25
+from core.chunkstore import Chunk, ChunkStore
+from core.dense import DenseConfig, build_dense_index
+
+if TYPE_CHECKING:
+    from core.rerank import Reranker
+
+# Worker processes import this module: it must stay free of the model libraries (sentence-transformers,
+# torch), which only the coordinator needs (query encoding, reranking).
+
+SHARDS_FORMAT = 1
+MANIFEST = "manifest.json"
+EMBEDDINGS = "embeddings.npy"
+SEQ = "seq.npy"
+EXTRA_SEQ = 1 << 62  # sequence numbers of request-scoped chunks: after every corpus row, never reused
+
+def shard_of(source: str, n_shards: int) -> int:
+    # stable across processes and restarts (unlike hash()); a source's chunks all live in one shard,
+    # so a changed file only ever rebuilds the shard that owns it
+    return int.from_bytes(hashlib.blake2b(source.encode("utf-8"), digest_size=8).digest(), "big") % n_shards
+
+# ---------- shard (worker side) ----------
+
+def write_shard(path: Path, chunks: ChunkStore, embeddings: np.ndarray, seq: np.ndarray) -> None:
+    # `seq`: corpus-wide, ascending sequence number of every row; it orders rows across shards exactly
+    # like row positions in the unsharded index (ties, first-seen vocabulary order)
+    chunks.save(path)
+    np.save(path / EMBEDDINGS, np.ascontiguousarray(embeddings, dtype=np.float32))
+    np.save(path / SEQ, seq.astype(np.int64))
+
+def read_shard(path: Path) -> tuple[ChunkStore, np.ndarray, np.ndarray]:
+    return ChunkStore.load(path), np.load(path / EMBEDDINGS, mmap_mode="r"), np.load(path / SEQ)
+
+class Shard:
+    def __init__(self, chunks: ChunkStore, embeddings: np.ndarray, seq: np.ndarray, dense: DenseConfig):
+        self.chunks, self.embeddings, self.seq = chunks, embeddings, seq
+        self.bm25 = SparseBM25(self.chunks.texts())
+        self.faiss, self.dense_backend = build_dense_index(np.ascontiguousarray(self.embeddings), dense)
+
+    @classmethod
+    def load(cls, path: Path, dense: DenseConfig) -> "Shard":
+        return cls(*read_shard(path), dense)
+
+    def stats(self) -> dict[str, Any]:
+        terms, df, first = self.bm25.term_stats()
+        return {
+            "terms": terms, "df": df, "first": self.seq[first], "n": len(self.bm25),
+            "dl_sum": self.bm25.dl_sum, "dense_backend": self.dense_backend,
+        }
+
+    def use_stats(self, idf: np.ndarray, avgdl: float) -> None:
+        self.bm25.use_stats(idf, avgdl)
+
+    def search(self, queries: list[str], qvecs: np.ndarray, bm25_k: int, dense_k: int):
+        # per query: (bm25 seqs, scores, dense seqs, scores, {seq: (Chunk, embedding)} of every hit),
+        # and timings
+        t0 = perf_counter()
+        sparse = [self.bm25.search(q, bm25_k) for q in queries]
+        t1 = perf_counter()
+        d_scores, d_ids = self.faiss.search(qvecs, dense_k)
+        t2 = perf_counter()
+        out = []
+        for (b_ids, b_scores), ds, di in zip(sparse, d_scores, d_ids):
+            ds, di = ds[di != -1], di[di != -1]
+            hits = {
+                int(self.seq[r]): (self.chunks[int(r)], np.array(self.embeddings[r])) for r in np.union1d(b_ids, di)
+            }
+            out.append((self.seq[b_ids], b_scores, self.seq[di], ds, hits))
+        return out, {"bm25": (t1 - t0) * 1000, "dense": (t2 - t1) * 1000}
+
+def _shard_main(conn, path: str, dense: DenseConfig) -> None:
+    # worker loop: ("op", args) -> ("ok", result) | ("error", message); None stops the worker
+    try:
+        shard = Shard.load(Path(path), dense)
+        conn.send(("ok", shard.stats()))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    while (msg := conn.recv()) is not None:
+        op, args = msg
+        try:
+            conn.send(("ok", getattr(shard, op)(*args)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+# ---------- corpus-wide BM25 statistics ----------
+
+def merge_stats(stats: list[dict], epsilon: float = 0.25) -> tuple[dict[str, float], float]:
+    # idf per term and average document length over all shards, computed exactly like SparseBM25 does
+    # for the whole corpus: terms are ordered as first seen in the corpus (the epsilon floor is a mean
+    # over terms, so even the summation order matches)
+    df: dict[str, int] = {}
+    first: dict[str, tuple[int, int]] = {}
+    for st in stats:
+        for j, (t, d, f) in enumerate(zip(st["terms"], st["df"].tolist(), st["first"].tolist())):
+            df[t] = df.get(t, 0) + d
+            key = (f, j)  # terms first seen in the same row keep that row's token order
+            if t not in first or key < first[t]:
+                first[t] = key
+    terms = sorted(df, key=first.__getitem__)
+    n = sum(st["n"] for st in stats)
+    d = np.fromiter((df[t] for t in terms), dtype=np.float64, count=len(terms))
+    idf = np.log(n - d + 0.5) - np.log(d + 0.5)
+    if idf.size:
+        idf[idf < 0] = epsilon * idf.mean()
+    avgdl = sum(st["dl_sum"] for st in stats) / n if n else 0.0
+    return dict(zip(terms, idf.tolist())), avgdl
+
+def _merge(seqs: list[np.ndarray], scores: list[np.ndarray], k: int) -> list[int]:
+    # global top-k of per-shard top-k lists: best score first, ties in corpus order
+    s = np.concatenate(seqs) if seqs else np.zeros(0, dtype=np.int64)
+    v = np.concatenate(scores).astype(np.float64) if scores else np.zeros(0)
+    return s[np.lexsort((s, -v))][:k].tolist()
+
+# ---------- coordinator ----------
+
+@dataclass
+class _Worker:
+    dir: str
+    process: Any
+    conn: Any
+    stats: dict
+
+# Scatter-gather retrieval over N shard processes. Each worker owns one shard directory (chunks,
+# embeddings) and builds its own BM25 and dense index; the coordinator encodes queries once, fans each
+# (batch of) queries out to every shard in parallel, merges the per-shard top-k lists, then fuses and
+# reranks exactly like HybridRetriever. BM25 is scored with corpus-wide statistics pushed to every
+# shard, so rankings match an unsharded index over the same rows (with an exact dense backend).
+# A shard is rebuilt in a fresh process while the old one keeps serving, then swapped in.
+class ShardedRetriever:
+    def __init__(
+        self, root: str | Path, n_shards: int, embedder, rerank: bool = True,
+        reranker: Reranker | None = None, dense: DenseConfig = DenseConfig(),
+    ):
+        self.root = Path(root)
+        self.n_shards = max(1, n_shards)
+        self.embedder = embedder
+        self.rerank_enabled = rerank
+        self.reranker = reranker if rerank else None
+        self.dense = dense
+        self.version = ""
+        self.next_seq = 0
+        # shared (never rebound) with the request-scoped views of with_extra
+        self._workers: list[_Worker | None] = [None] * self.n_shards
+        self._local: Shard | None = None  # in-process shard of request-scoped chunks (views only)
+        self._lock = threading.Lock()
+        self._ctx = mp.get_context("spawn")
+
+    # ----- lifecycle
+
+    @classmethod
+    def open(
+        cls, root: str | Path, n_shards: int, chunks: ChunkStore, embeddings: np.ndarray, version: str,
+        embedder, rerank: bool = True, reranker: Reranker | None = None, dense: DenseConfig = DenseConfig(),
+    ) -> "ShardedRetriever":
+        # reuses the persisted shards when they hold this corpus version, else partitions `chunks`
+        r = cls(root, n_shards, embedder, rerank, reranker, dense)
+        manifest = r._manifest()
+        if (
+            manifest.get("format") == SHARDS_FORMAT and manifest.get("n_shards") == r.n_shards
+            and manifest.get("version") == version
+        ):
+            r.version, r.next_seq = version, manifest["next_seq"]
+            r._start_all([manifest["shards"][i] for i in range(r.n_shards)])
+        else:
+            r.build(chunks, embeddings, version)
+        return r
+
+    def build(self, chunks: ChunkStore, embeddings: np.ndarray, version: str) -> None:
+        # partitions the corpus by source; sequence numbers are the rows of `chunks`
+        owner = np.fromiter((shard_of(s, self.n_shards) for s in chunks.sources), dtype=np.int64,
+                            count=len(chunks.sources))
+        row_shard = owner[chunks.doc_idx] if len(chunks) else np.zeros(0, dtype=np.int64)
+        dirs = []
+        for i in range(self.n_shards):
+            keep = row_shard == i
+            dirs.append(self._write(i, chunks.take(keep), embeddings[keep], np.flatnonzero(keep)))
+        self.version, self.next_seq = version, len(chunks)
+        self._start_all(dirs)
+        self._save_manifest()
+        live = set(dirs)
+        for d in self.root.glob("shard-*"):  # left over from an older corpus version
+            if d.name not in live:
+                shutil.rmtree(d, ignore_errors=True)
+
+    def _start_all(self, dirs: list[str]) -> None:
+        # every shard loads in parallel; statistics are pushed once all are up
+        started = [self._spawn(d) for d in dirs]
+        workers = [self._ready(*w) for w in started]
+        with self._lock:
+            old, self._workers[:] = list(self._workers), workers
+            self._push_stats()
+        for w in old:
+            self._stop(w)
+
+    def _write(self, i: int, chunks: ChunkStore, embeddings: np.ndarray, seq: np.ndarray) -> str:
+        # a new directory per generation: the serving worker keeps reading its own until swapped out
+        gen = 0
+        while (self.root / f"shard-{i:03d}.{gen}").exists():
+            gen += 1
+        name = f"shard-{i:03d}.{gen}"
+        write_shard(self.root / name, chunks, embeddings, seq)
+        return name
+
+    def _spawn(self, name: str):
+        parent, child = self._ctx.Pipe()
+        p = self._ctx.Process(
+            target=_shard_main, args=(child, str(self.root / name), self.dense), name=f"shard-{name}", daemon=True
+        )
+        p.start()
+        child.close()
+        return name, p, parent
+
+    def _ready(self, name: str, process, conn) -> _Worker:
+        status, stats = conn.recv()
+        if status != "ok":
+            process.join()
+            raise RuntimeError(f"shard {name} failed to load: {stats}")
+        return _Worker(name, process, conn, stats)
+
+    def _stop(self, w: _Worker | None) -> None:
+        if w is None:
+            return
+        try:
+            w.conn.send(None)
+        except OSError:
+            pass
+        w.process.join(10)
+        if w.process.is_alive():
+            w.process.terminate()
+        shutil.rmtree(self.root / w.dir, ignore_errors=True)
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers[:] = list(self._workers), [None] * self.n_shards
+        for w in workers:
+            if w is not None:
+                w.conn.send(None)
+                w.process.join(10)
+
+    # ----- persistence
+
+    def _manifest(self) -> dict:
+        try:
+            return json.loads((self.root / MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self) -> None:
+        manifest = {
+            "format": SHARDS_FORMAT, "n_shards": self.n_shards, "version": self.version,
+            "next_seq": self.next_seq, "shards": [w.dir for w in self._workers],
+        }
+        tmp = self.root / (MANIFEST + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, self.root / MANIFEST)
+
+    # ----- incremental update
+
+    def update(self, dropped: set[str], chunks: list[Chunk], embeddings: np.ndarray | None, version: str) -> None:
+        # Drops every chunk of `dropped` sources and appends `chunks` (new sequence numbers, i.e. at the
+        # end of the corpus, like IndexStore). Only the shards owning those sources are rebuilt, one at
+        # a time; each swap is atomic for readers and brings the corpus-wide statistics along.
+        seq = np.arange(self.next_seq, self.next_seq + len(chunks), dtype=np.int64)
+        self.next_seq += len(chunks)
+        owner = np.fromiter((shard_of(c.source, self.n_shards) for c in chunks), dtype=np.int64, count=len(chunks))
+        affected = sorted({shard_of(s, self.n_shards) for s in dropped} | set(owner.tolist()))
+        for i in affected:
+            old_chunks, old_emb, old_seq = read_shard(self.root / self._workers[i].dir)
+            keep = ~old_chunks.source_mask(dropped)
+            mine = np.flatnonzero(owner == i)
+            new_emb = [np.asarray(old_emb)[keep]] + ([embeddings[mine]] if len(mine) else [])
+            name = self._write(
+                i, old_chunks.take(keep).concat([chunks[j] for j in mine]), np.vstack(new_emb),
+                np.concatenate([old_seq[keep], seq[mine]]),
+            )
+            worker = self._ready(*self._spawn(name))
+            with self._lock:
+                old, self._workers[i] = self._workers[i], worker
+                self._push_stats()
+            self._stop(old)
+        self.version = version
+        self._save_manifest()
+
+    # ----- scatter / gather
+
+    def _push_stats(self) -> None:
+        # caller holds self._lock
+        idf, avgdl = merge_stats([w.stats for w in self._workers])
+        for w in self._workers:
+            w.conn.send(("use_stats", (np.array([idf[t] for t in w.stats["terms"]]), avgdl)))
+        for w in self._workers:
+            self._result(w)
+
+    def _result(self, w: _Worker):
+        try:
+            status, out = w.conn.recv()
+        except EOFError:
+            raise RuntimeError(f"shard {w.dir} exited") from None
+        if status != "ok":
+            raise RuntimeError(f"shard {w.dir}: {out}")
+        return out
+
+    def __len__(self) -> int:
+        local = len(self._local.chunks) if self._local is not None else 0
+        return local + sum(w.stats["n"] for w in self._workers if w is not None)
+
+    @property
+    def dense_backend(self) -> str | None:
+        w = self._workers[0]
+        return w.stats["dense_backend"] if w is not None else None
+
+    def _scatter(self, queries: list[str], bm25_k: int, dense_k: int):
+        # -> per query (bm25 seqs, dense seqs, {seq: (Chunk, embedding)}, query embedding), and per-stage
+        # ms (slowest shard)
+        qvecs = np.asarray(self.embedder.encode(queries, normalize_embeddings=True), dtype="float32")
+        with self._lock:
+            for w in self._workers:
+                w.conn.send(("search", (queries, qvecs, bm25_k, dense_k)))
+            # the request-scoped shard is searched here while the workers search theirs
+            local = [self._local.search(queries, qvecs, bm25_k, dense_k)] if self._local is not None else []
+            replies = [self._result(w) for w in self._workers] + local
+        out = []
+        for qi, qv in enumerate(qvecs):
+            parts = [r[0][qi] for r in replies]
+            hits: dict[int, tuple[Chunk, np.ndarray]] = {}
+            for p in parts:
+                hits.update(p[4])
+            out.append((
+                _merge([p[0] for p in parts], [p[1] for p in parts], bm25_k),
+                _merge([p[2] for p in parts], [p[3] for p in parts], dense_k),
+                hits,
+                qv,
+            ))
+        ms = {stage: max(r[1][stage] for r in replies) for stage in ("bm25", "dense")}
+        return out, ms
+
+    # ----- request-scoped chunks
+
+    def with_extra(self, chunks: list[Chunk], embeddings: np.ndarray) -> "ShardedRetriever":
+        # A view over the same shard processes plus an in-process shard of `chunks` (online URLs), merged
+        # into every query like one more shard: only the extra chunks are indexed, per request. The extra
+        # shard is scored with statistics over corpus + extras; the workers keep the corpus-wide ones
+        # (other requests share them), so BM25 is exact for the corpus and close for the extras.
+        view = copy.copy(self)
+        local = Shard(  # a handful of vectors: exact search
+            ChunkStore.from_chunks(chunks), embeddings, EXTRA_SEQ + np.arange(len(chunks)), DenseConfig(backend="flat")
+        )
+        own = local.stats()
+        idf, avgdl = merge_stats([w.stats for w in self._workers if w is not None] + [own])
+        local.use_stats(np.array([idf[t] for t in own["terms"]]), avgdl)
+        view._local = local
+        return view
+
+    def _fuse(
+        self, bm_ids: list[int], dense_ids: list[int], hits: dict, top_k: int, vectors: dict | None = None
+    ) -> list[Chunk]:
+        from core.rag import rrf_fusion  # coordinator only (see the note at the top)
+
+        fused_scores = rrf_fusion(bm_ids, dense_ids)
+        n_candidates = self.reranker.cfg.n_candidates(top_k) if self.reranker else max(top_k * 2, 20)
+        fused = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)[:n_candidates]
+        if vectors is not None:
+            vectors.update((hits[row][0].chunk_id, hits[row][1]) for row, _ in fused)
+        return [hits[row][0] for row, _ in fused]
+
+    def search(
+        self, query: str, bm25_k: int, dense_k: int, top_k: int,
+        rerank_budget_ms: float | None = None, info: dict | None = None, vectors: dict | None = None,
+        stages: dict | None = None,
+    ) -> list[Chunk]:
+        ((bm_ids, dense_ids, hits, qv),), ms = self._scatter([query], bm25_k, dense_k)
+        if vectors is not None:
+            vectors["query"] = qv
+        t0 = perf_counter()
+        fused_chunks = self._fuse(bm_ids, dense_ids, hits, top_k, vectors)
+        ms["fuse"] = (perf_counter() - t0) * 1000
+        if stages is not None:
+            stages.update(
+                bm25=[hits[r][0] for r in bm_ids], dense=[hits[r][0] for r in dense_ids], fused=fused_chunks
+            )
+        if info is not None:
+            info["stage_ms"] = ms
+        if self.rerank_enabled and self.reranker and fused_chunks:
+            rerank_info: dict = {}
+            t0 = perf_counter()
+            out = self.reranker.rerank(query, fused_chunks, top_k, rerank_budget_ms, rerank_info)
+            ms["rerank"] = (perf_counter() - t0) * 1000
+            if stages is not None:
+                stages["rerank"] = out
+            if info is not None:
+                info["rerank"] = rerank_info
+            return out
+        return fused_chunks[:top_k]
+
+    def search_many(
+        self, queries: list[str], bm25_k: int, dense_k: int, top_k: int, vectors: list[dict] | None = None
+    ) -> list[list[Chunk]]:
+        if not queries:
+            return []
+        found, _ = self._scatter(queries, bm25_k, dense_k)
+        fused = []
+        for (b, d, hits, qv), v in zip(found, vectors or [None] * len(found)):
+            if v is not None:
+                v["query"] = qv
+            fused.append(self._fuse(b, d, hits, top_k, v))
+        if self.rerank_enabled and self.reranker:
+            return self.reranker.rerank_many(queries, fused, top_k)
+        return [f[:top_k] for f in fused]
+
+    def search_stages(
+        self, query: str, bm25_k: int, dense_k: int, top_k: int
+    ) -> tuple[dict[str, list[Chunk]], dict[str, float]]:
+        stages: dict[str, list[Chunk]] = {}
+        info: dict = {}
+        self.search(query, bm25_k, dense_k, top_k, info=info, stages=stages)
+        return stages, info["stage_ms"]
@@ -0,0 +1,171 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+import atexit, gzip, json, os, queue, random, shutil, threading, time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from core.config import Settings
+from core.observability import RunTrace, metrics
+
+RUNS_LOG = "runs.jsonl"
+LOCK = ".runs.lock"
+
+# Trace sink: the request path only enqueues; a background thread writes per-run files and appends
+# batches to runs.jsonl. Appends and rotation happen under an flock, so several API worker processes
+# can share one runs directory. Rotated logs are renamed to runs-<utc time>-<pid>-<n>.jsonl[.gz].
+class TraceSink:
+    def __init__(
+        self,
+        out_dir: str,
+        background: bool = True,
+        queue_size: int = 10_000,
+        batch_size: int = 256,
+        rotate_mb: float = 64,
+        rotate_s: float = 0,
+        compress: bool = True,
+        keep: int = 20,
+        sample_rate: float = 1.0,
+    ):
+        self.out_dir = Path(out_dir)
+        self.background = background
+        self.batch_size = max(1, batch_size)
+        self.rotate_bytes = int(rotate_mb * 1024 * 1024)  # 0 = no size-based rotation
+        self.rotate_s = rotate_s  # 0 = no time-based rotation
+        self.compress = compress
+        self.keep = keep  # rotated logs kept; 0 = keep all
+        self.sample_rate = sample_rate  # share of runs that also get a full per-run JSON file
+        self.dropped = 0
+        self._rotations = 0
+        self._q: queue.Queue[tuple[RunTrace, str | None]] = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, s: Settings) -> "TraceSink":
+        return cls(
+            s.data_runs, background=s.trace_async, queue_size=s.trace_queue_size,
+            batch_size=s.trace_batch_size, rotate_mb=s.trace_rotate_mb, rotate_s=s.trace_rotate_s,
+            compress=s.trace_compress, keep=s.trace_keep, sample_rate=s.trace_sample_rate,
+        )
+
+    # ---------- request path ----------
+
+    def _sampled(self, trace: RunTrace) -> bool:
+        # abstentions and errors are always kept in full: they are the runs someone will debug
+        if not trace.meta.get("quality_ok", True):
+            return True
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def submit(self, trace: RunTrace) -> str | None:
+        # -> path of the per-run file (written asynchronously), or None when the run was not sampled
+        path = str(self.out_dir / f"{trace.run_id}.json") if self._sampled(trace) else None
+        if not self.background:
+            self._write([(trace, path)])
+            return path
+        self._ensure_thread()
+        try:
+            self._q.put_nowait((trace, path))
+        except queue.Full:
+            # never block a request on trace I/O
+            self.dropped += 1
+            metrics.inc("briefing_traces_dropped_total")
+            return None
+        return path
+
+    def flush(self, timeout: float | None = None) -> bool:
+        # wait until everything submitted so far is on disk
+        with self._q.all_tasks_done:
+            return self._q.all_tasks_done.wait_for(lambda: self._q.unfinished_tasks == 0, timeout)
+
+    # ---------- writer thread ----------
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="trace-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush, 5.0)
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._q.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                metrics.inc("briefing_trace_write_errors_total")
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.out_dir / LOCK, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write(self, batch: list[tuple[RunTrace, str | None]]) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        ts = int(time.time())
+        lines = []
+        for trace, path in batch:
+            d = trace.to_dict()
+            if path is not None:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(d, f, ensure_ascii=False)
+            lines.append(json.dumps({"ts": ts, **d}, ensure_ascii=False) + "\n")
+        data = "".join(lines).encode("utf-8")
+
+        rotated = None
+        with self._file_lock():
+            # reopened per batch: another process may have rotated the file since our last write
+            fd = os.open(self.out_dir / RUNS_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if self._should_rotate(size):
+                self._rotations += 1
+                stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+                rotated = self.out_dir / f"runs-{stamp}-{os.getpid()}-{self._rotations}.jsonl"
+                os.replace(self.out_dir / RUNS_LOG, rotated)
+        if rotated is not None:
+            self._compact(rotated)
+
+    def _should_rotate(self, size: int) -> bool:
+        if self.rotate_bytes and size >= self.rotate_bytes:
+            return True
+        if self.rotate_s:
+            with open(self.out_dir / RUNS_LOG, encoding="utf-8") as f:
+                first = f.readline()
+            try:
+                return time.time() - json.loads(first)["ts"] >= self.rotate_s
+            except (ValueError, KeyError):
+                return False
+        return False
+
+    def _compact(self, rotated: Path) -> None:
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        if self.keep:
+            old = sorted(self.out_dir.glob("runs-*.jsonl*"))  # names start with the UTC rotation time
+            for p in old[: max(0, len(old) - self.keep)]:
+                p.unlink(missing_ok=True)
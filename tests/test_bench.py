@@ -0,0 +1,31 @@
+from core.bench import bench_size, compare, parse_size, synthetic_corpus
+from core.config import Settings
+
+def test_parse_size():
+    assert parse_size("1k") == 1_000
+    assert parse_size("1M") == 1_000_000
+    assert parse_size("2500") == 2_500
+
+def test_synthetic_corpus_is_deterministic():
+    a = synthetic_corpus(45, chunks_per_doc=20, n_queries=5, seed=1)
+    b = synthetic_corpus(45, chunks_per_doc=20, n_queries=5, seed=1)
+    assert len(a.chunks) == 45 and len(a.docs) == 3
+    assert [c.text for c in a.chunks] == [c.text for c in b.chunks]
+    assert a.queries == b.queries
+
+def test_compare_flags_only_real_regressions():
+    base = {"sizes": {"1000": {"search": {"p50_ms": 10.0, "p95_ms": 20.0}, "gate": {"p50_ms": 0.01, "p95_ms": 0.02}}}}
+    cur = {"sizes": {"1000": {"search": {"p50_ms": 11.0, "p95_ms": 30.0}, "gate": {"p50_ms": 0.05, "p95_ms": 0.09}}}}
+    regressions = compare(cur, base, tolerance=0.2, min_delta_ms=1.0)
+    assert len(regressions) == 1 and regressions[0].startswith("1000 search.p95_ms")
+
+def test_bench_size_reports_every_stage(tmp_path):
+    s = Settings(INGEST_WORKERS=1, TOP_K=5)
+    report = bench_size(200, s, n_queries=10, ingest_docs=3, embed_sample=50, rerank=False)
+    for stage in (
+        "ingest", "guardrails", "chunk", "embed", "bm25_build", "faiss_build", "search", "evidence",
+        "write_fake_llm", "quality_gate",
+    ):
+        assert {"p50_ms", "p95_ms", "p99_ms", "per_s"} <= report[stage].keys()
+    assert report["search"]["n"] == 10
+    assert report["memory"]["peak_rss_mb"] > 0
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from core.bm25 import SparseBM25, StackedBM25, tokenize, top_k, whitespace_tokenize
+
+def _corpus(n=400, seed=0):
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(200)]
+    weights = [1 / (i + 1) for i in range(200)]
+    return [" ".join(rng.choices(words, weights=weights, k=rng.randint(0, 30))) for _ in range(n)]
+
+def _reference_top(scores, k):
+    return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
+
+def test_sparse_bm25_matches_rank_bm25():
+    docs = _corpus()
+    ref = BM25Okapi([d.lower().split() for d in docs])
+    bm = SparseBM25(docs, tokenizer=whitespace_tokenize)
+    for q in ["w1 w2", "w0", "w3 w3 w150", "unknown terms"]:
+        expected = ref.get_scores(q.split())
+        got = bm.get_scores(q)
+        np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-12)
+        assert list(top_k(got, 25)) == _reference_top(expected, 25)
+
+def test_sparse_bm25_incremental_add_remove():
+    docs = _corpus()
+    bm = SparseBM25(docs[:250], tokenizer=whitespace_tokenize)
+    bm.add(docs[250:])
+    bm.remove([0, 17, 399])
+    rest = [d for i, d in enumerate(docs) if i not in (0, 17, 399)]
+    assert len(bm) == len(rest)
+    ref = BM25Okapi([d.split() for d in rest])
+    np.testing.assert_allclose(bm.get_scores("w1 w9"), ref.get_scores(["w1", "w9"]), rtol=1e-9)
+
+def test_tokenizer_strips_punctuation_and_case():
+    assert tokenize("RAG, Retrieval-Augmented (rag)!") == ["rag", "retrieval", "augmented", "rag"]
+    idx, scores = SparseBM25(["agentic AI.", "cyber resilience", "north star"]).search("Agentic", 3)
+    assert idx[0] == 0 and scores[0] > scores[1]
+
+def test_updates_go_to_the_delta_segment_and_merge_lazily(monkeypatch):
+    docs = _corpus(600, seed=1)
+    bm = SparseBM25(docs[:400], tokenizer=whitespace_tokenize)
+    main = bm.post_doc
+    bm.add(docs[400:420])
+    bm.remove([3, 401])
+    assert bm.post_doc is main and bm.delta_term.size  # no rebuild of the main segment
+    expected = [d for i, d in enumerate(docs[:420]) if i not in (3, 401)]
+    for _ in range(2):
+        ref = SparseBM25(expected, tokenizer=whitespace_tokenize)
+        for q in ["w1 w2", "w7 w7 w120", "w199"]:
+            np.testing.assert_allclose(bm.get_scores(q), ref.get_scores(q), rtol=1e-9, atol=1e-12)
+            assert list(bm.search(q, 20)[0]) == list(ref.search(q, 20)[0])
+        stats = [{t: (d, f) for t, d, f in zip(*x.term_stats()) if d} for x in (bm, ref)]
+        assert stats[0] == stats[1]
+        monkeypatch.setattr("core.bm25.DELTA_MIN", 0)  # every further update merges
+        bm.add(docs[420:])
+        bm.remove(range(0, 300, 2))
+        expected = [d for i, d in enumerate(expected + docs[420:]) if not (i < 300 and i % 2 == 0)]
+    assert bm.post_doc is not main and not bm.delta_term.size and bm.live is None
+
+def test_stacked_index_is_exact_for_the_base():
+    docs = _corpus()
+    base = SparseBM25(docs[:390])
+    stacked = StackedBM25(base, SparseBM25(docs[390:]))
+    assert len(stacked) == 400
+    whole = SparseBM25(docs)
+    for q in ["w1 w2", "w3 w3 w150"]:
+        ids, scores = stacked.search(q, 400)
+        got = dict(zip(ids.tolist(), scores.tolist()))
+        assert sorted(got) == list(range(400))
+        ref = base.get_scores(q)
+        assert all(abs(got[i] - ref[i]) < 1e-9 for i in range(390))
+        # the extras are scored with corpus-wide statistics, not their own
+        np.testing.assert_allclose(
+            [got[i] for i in range(390, 400)], whole.get_scores(q)[390:], rtol=0.05
+        )
@@ -0,0 +1,76 @@
+import json
+
+from core.briefcache import BriefingCache, cache_key
+from core.config import Settings
+from core.engine import Engine
+
+def test_cache_key_normalizes_topic():
+    assert cache_key("Agentic  AI", "offline", None, "llm", "p") == cache_key("agentic ai", "offline", [], "llm", "p")
+    assert cache_key("agentic ai", "offline", None, "llm", "p") != cache_key("agentic ai", "offline", None, "llm", "q")
+
+def test_lru_ttl_and_invalidation():
+    now = [0.0]
+    cache = BriefingCache(max_entries=2, ttl_s=10, clock=lambda: now[0])
+    cache.put("v1", "a", {"answer": "A"})
+    cache.put("v1", "b", {"answer": "B"})
+    assert cache.get("v1", "a") == {"answer": "A"}
+    cache.put("v1", "c", {"answer": "C"})  # evicts "b", the least recently used
+    assert cache.get("v1", "b") is None
+    assert cache.get("v2", "a") is None  # other corpus version
+
+    now[0] = 11
+    assert cache.get("v1", "a") is None  # expired
+
+    cache.put("v1", "a", {"answer": "A"})
+    cache.put("v2", "a", {"answer": "A2"})
+    cache.invalidate(keep_version="v2")
+    assert cache.get("v1", "a") is None
+    assert cache.get("v2", "a") == {"answer": "A2"}
+
+def test_disk_backend_survives_restart(tmp_path):
+    BriefingCache(root=str(tmp_path)).put("v1", "k", {"answer": "A"})
+    assert BriefingCache(root=str(tmp_path)).get("v1", "k") == {"answer": "A"}
+    BriefingCache(root=str(tmp_path)).invalidate(keep_version="v2")
+    assert BriefingCache(root=str(tmp_path)).get("v1", "k") is None
+
+def _trace(eng, run) -> dict:
+    eng.traces.flush()
+    return json.loads(open(run.trace_path, encoding="utf-8").read())
+
+def test_engine_serves_repeat_topics_from_cache(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    s = Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    )
+    eng = Engine(s)
+    first = eng.run("Agentic AI")
+    assert _trace(eng, first)["meta"]["cache"] == "miss"
+
+    second = eng.run("agentic ai")
+    assert _trace(eng, second)["meta"]["cache"] == "hit"
+    assert second.answer == first.answer
+    assert [c.chunk_id for c in second.retrieved] == [c.chunk_id for c in first.retrieved]
+
+    # a corpus change bumps the index version and drops the cached answers
+    (pages / "c.md").write_text("agentic agents for research", encoding="utf-8")
+    third = eng.run("agentic ai")
+    assert _trace(eng, third)["meta"]["cache"] == "miss"
+    assert eng.briefings.stats()["entries"] == 1
+
+def test_engine_does_not_cache_abstentions(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")  # one source: gate fails
+    s = Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    )
+    eng = Engine(s)
+    eng.run("agentic ai")
+    assert _trace(eng, eng.run("agentic ai"))["meta"]["cache"] == "miss"
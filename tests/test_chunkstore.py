@@ -0,0 +1,42 @@
+import numpy as np
+
+from core.chunkstore import Chunk, ChunkStore
+from core.rag import Doc, chunk_doc
+
+def _chunks():
+    a = chunk_doc(Doc("a.md", "pages/a.md", "A", "alpha ünïcode " * 200, "page"))
+    b = chunk_doc(Doc("b.md", "pages/b.md", "B", "beta " * 300, "page"))
+    return a + b + [Chunk("custom-id", "c", "web/c", "C", "gamma")]
+
+def test_views_round_trip():
+    chunks = _chunks()
+    store = ChunkStore.from_chunks(chunks)
+    assert len(store) == len(chunks)
+    assert list(store) == chunks
+    assert store[-1] == chunks[-1] and store[1:3] == chunks[1:3]
+    assert list(store.texts()) == [c.text for c in chunks]
+    assert len(store.doc_ids) == 3
+
+def test_take_concat_and_tail():
+    chunks = _chunks()
+    store = ChunkStore.from_chunks(chunks)
+    dead = store.source_mask({"pages/a.md"})
+    kept = store.take(~dead)
+    assert list(kept) == [c for c in chunks if c.source != "pages/a.md"]
+    assert kept.doc_ids == ["b.md", "c"]
+
+    extra = [Chunk("d::chunk::0", "d", "web/d", "D", "delta"), Chunk("b.md::chunk::99", "b.md", "pages/b.md", "B", "x")]
+    grown = kept.concat(extra)
+    assert list(grown) == list(kept) + extra
+    assert len(grown.doc_ids) == 3  # b.md is shared, not duplicated
+
+    tailed = kept.with_tail(extra)
+    assert list(tailed) == list(kept) + extra
+    assert tailed.buf is kept.buf
+
+def test_save_load_memory_maps_text(tmp_path):
+    store = ChunkStore.from_chunks(_chunks())
+    store.save(tmp_path)
+    loaded = ChunkStore.load(tmp_path)
+    assert isinstance(loaded.buf, np.memmap)
+    assert list(loaded) == list(store)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from core.dense import (
+    DenseConfig, StackedIndex, StackedRows, build_dense_index, choose_backend, extend_dense_index,
+    needs_retraining, recall_report, resolve_backend,
+)
+
+def _vectors(n, dim=32, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, dim)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+def test_backend_selection():
+    assert choose_backend(1_000) == "flat"
+    assert choose_backend(500_000) == "hnsw"
+    assert resolve_backend(DenseConfig(backend="ivfpq"), 100) == "flat"  # too small to train
+
+def test_recall_report_against_exact():
+    emb = _vectors(3000)
+    report = recall_report(emb, emb[:50], k=5, backends=("flat", "ivf", "hnsw", "sq8"),
+                           cfg=DenseConfig(nlist=16, nprobe=16))
+    by = {r["backend"]: r for r in report}
+    assert by["flat"]["recall_at_k"] == 1.0
+    assert by["ivf"]["recall_at_k"] == 1.0  # nprobe == nlist: exhaustive
+    assert by["hnsw"]["recall_at_k"] > 0.8 and by["sq8"]["recall_at_k"] > 0.8
+    assert all(r["p50_ms"] >= 0 for r in report)
+
+def test_template_reuses_trained_quantizer():
+    cfg = DenseConfig(backend="ivf", nlist=8)
+    first, backend = build_dense_index(_vectors(1000), cfg)
+    second, _ = build_dense_index(_vectors(1200, seed=1), cfg, template=first)
+    assert backend == "ivf" and second.ntotal == 1200 and first.ntotal == 1000
+
+def test_trained_quantizer_is_refit_once_the_corpus_outgrows_it():
+    cfg = DenseConfig(backend="ivf", retrain_ratio=2.0)
+    assert not needs_retraining(cfg, 2000, 1000)
+    assert needs_retraining(cfg, 2001, 1000) and needs_retraining(cfg, 10, 0)
+
+def test_hnsw_is_extended_not_rebuilt():
+    cfg = DenseConfig(backend="hnsw")
+    emb = _vectors(600)
+    first, _ = build_dense_index(emb[:500], cfg)
+    extended = extend_dense_index(first, emb[500:], cfg)
+    assert first.ntotal == 500 and extended.ntotal == 600  # the serving index is left alone
+    _, ids = extended.search(emb[550:551], 1)
+    assert ids[0][0] == 550
+
+def test_stacked_index_matches_one_index_over_both():
+    emb = _vectors(520)
+    base, _ = build_dense_index(emb[:500], DenseConfig(backend="flat"))
+    whole, _ = build_dense_index(emb, DenseConfig(backend="flat"))
+    stacked = StackedIndex(base, emb[500:])
+    assert stacked.ntotal == 520 and base.ntotal == 500  # the shared index is not copied or extended
+    d, i = stacked.search(emb[495:515], 8)
+    ref_d, ref_i = whole.search(emb[495:515], 8)
+    np.testing.assert_allclose(d, ref_d, rtol=1e-5)
+    assert (i == ref_i).all()
+    rows = StackedRows(emb[:500], emb[500:])
+    assert len(rows) == 520 and (rows[510] == emb[510]).all() and (rows[3] == emb[3]).all()
@@ -0,0 +1,31 @@
+import numpy as np
+
+from core.embcache import EmbeddingCache
+
+def _fake_encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+    return encode
+
+def test_embedding_cache_only_encodes_misses(tmp_path):
+    calls = []
+    cache = EmbeddingCache(str(tmp_path), "org/model")
+    v1 = cache.encode(["alpha", "beta"], _fake_encoder(calls))
+    v2 = cache.encode(["beta", "gamma", "alpha"], _fake_encoder(calls))
+    assert calls == [["alpha", "beta"], ["gamma"]]
+    np.testing.assert_array_equal(v2[0], v1[1])
+    np.testing.assert_array_equal(v2[2], v1[0])
+
+    # a second process (here: a fresh instance) sees the vectors written by the first
+    other = EmbeddingCache(str(tmp_path), "org/model")
+    v3 = other.encode(["gamma"], _fake_encoder(calls))
+    assert len(calls) == 2
+    np.testing.assert_array_equal(v3[0], v2[1])
+    assert len(other) == 3
+
+def test_embedding_cache_is_per_model(tmp_path):
+    calls = []
+    EmbeddingCache(str(tmp_path), "m1").encode(["x"], _fake_encoder(calls))
+    EmbeddingCache(str(tmp_path), "m2").encode(["x"], _fake_encoder(calls))
+    assert len(calls) == 2
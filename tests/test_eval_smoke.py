@@ -4,3 +4,77 @@ def test_eval_scoring_smoke():
     sc = _score("Hello [1].", distinct_sources=2, min_sources=2)
     assert sc["has_citations"] is True
     assert sc["source_diversity_ok"] is True
+
+def test_retrieval_metrics_count_each_gold_unit_once():
+    from core.chunkstore import Chunk
+    from core.eval import EvalCase, retrieval_metrics
+
+    case = EvalCase("c", "t", gold_sources=["a.md"], gold_chunks=["b::chunk::3"])
+    ranked = [
+        Chunk("x::chunk::0", "x", "pages/x.md", "X", "."),
+        Chunk("a::chunk::0", "a", "pages/a.md", "A", "."),
+        Chunk("a::chunk::1", "a", "pages/a.md", "A", "."),
+        Chunk("b::chunk::3", "b", "pages/b.md", "B", "."),
+    ]
+    m = retrieval_metrics(ranked, case, k=4)
+    assert m["recall"] == 1.0 and m["mrr"] == 0.5
+    assert 0 < m["ndcg"] < 1
+    assert retrieval_metrics(ranked, case, k=1) == {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0}
+
+def test_compare_flags_quality_and_latency_regressions():
+    from core.eval import compare
+
+    def report(recall, p95):
+        return {"summary": {
+            "retrieval": {"fused": {"recall": recall, "mrr": 1.0, "ndcg": 1.0}},
+            "latency": {"retrieve": {"p50_ms": 10.0, "p95_ms": p95}},
+        }}
+    assert compare(report(0.9, 20.0), report(0.9, 20.0)) == []
+    regressions = compare(report(0.8, 40.0), report(0.9, 20.0))
+    assert [r.split(":")[0] for r in regressions] == ["fused.recall", "retrieve.p95_ms"]
+
+def test_run_eval_shares_one_index_across_parallel_cases(tmp_path):
+    from core.config import Settings
+    from core.engine import Engine
+    from core.eval import EvalCase, run_eval
+
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    s = Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1, BRIEFING_CACHE=False,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    )
+    cases = [EvalCase(f"c{i}", "agentic trends", gold_sources=["a.md"]) for i in range(4)]
+    report = run_eval(Engine(s), cases, workers=4, k=5)
+    assert report["failed"] == 0 and len(report["results"]) == 4
+    assert set(report["summary"]["retrieval"]) == {"bm25", "dense", "fused"}
+    assert report["summary"]["retrieval"]["fused"]["recall"] == 1.0
+    assert {"retrieve", "write", "total", "search.bm25"} <= report["summary"]["latency"].keys()
+
+def test_eval_case_scores_the_runs_own_retrieval(tmp_path, monkeypatch):
+    from core.config import Settings
+    from core.engine import Engine
+    from core.eval import EvalCase, run_eval
+
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    s = Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1, BRIEFING_CACHE=False,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    )
+    eng = Engine(s)
+    eng.warm_up()
+    retriever = eng.index.refresh()
+    calls = []
+    search = retriever.search
+    monkeypatch.setattr(retriever, "search", lambda *a, **kw: calls.append(1) or search(*a, **kw))
+    report = run_eval(eng, [EvalCase("c", "agentic trends", gold_sources=["a.md"])], workers=1, k=5)
+    assert len(calls) == 1  # one retrieval per case, scored per stage
+    assert report["summary"]["retrieval"]["fused"]["recall"] == 1.0
+    assert report["meta"]["index_build_s"] >= eng.readiness()["index_s"]  # the warm-up's build counts
@@ -0,0 +1,82 @@
+import json
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+
+from core.config import Settings
+from core.engine import Engine
+from core.evidence import EvidenceConfig, format_evidence, select_evidence, split_sentences
+from core.guardrails import quality_gate
+from core.llm import FakeLLM, LLMRequest, BRIEFING_TEMPLATE
+from core.llmclient import estimate_tokens
+from core.rag import Chunk
+
+def _chunk(i: int, source: str, text: str) -> Chunk:
+    return Chunk(f"{source}::chunk::{i}", source, source, source.upper(), text)
+
+def _unit(*xs: float) -> np.ndarray:
+    v = np.asarray(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+def test_split_sentences_cuts_long_runs():
+    assert split_sentences("One. Two!  Three") == ["One.", "Two!", "Three"]
+    assert split_sentences("x" * 50, max_chars=10) == ["x" * 10 + "…"]
+
+def test_selection_fits_budget_and_keeps_relevant_sentences():
+    filler = " ".join(f"Unrelated filler sentence number {i}." for i in range(40))
+    chunks = [_chunk(0, "a", f"Agentic AI adoption grows in enterprises. {filler}"), _chunk(1, "b", filler)]
+    for budget in (20, 60, 200):
+        ev = select_evidence("agentic ai adoption", chunks, {}, budget)
+        assert ev.tokens <= budget and estimate_tokens(format_evidence(ev.citations)) <= budget + 2
+    ev = select_evidence("agentic ai adoption", chunks, {}, 60, EvidenceConfig(sentences_per_source=1))
+    assert ev.citations[0].source == "a" and ev.citations[0].excerpt == "Agentic AI adoption grows in enterprises."
+    assert ev.candidates == 81 and ev.sentences == len(ev.citations)
+    assert select_evidence("agentic", chunks, {}, 0).citations == []
+
+def test_mmr_spreads_evidence_across_sources():
+    # "a" holds the two best chunks; relevance alone would spend the whole budget on it
+    chunks = [
+        _chunk(0, "a", "Agents plan tasks. Agents call tools."),
+        _chunk(1, "a", "Agents plan tasks well."),
+        _chunk(2, "b", "Agents plan tasks too."),
+    ]
+    vectors = {"query": _unit(1, 0), "a::chunk::0": _unit(1, 0), "a::chunk::1": _unit(1, 0), "b::chunk::2": _unit(1, 1)}
+    relevance_only = EvidenceConfig(sentences_per_source=3, mmr_lambda=1.0)
+    greedy = select_evidence("agents plan tasks", chunks, vectors, 30, relevance_only)
+    assert [c.source for c in greedy.citations] == ["a"]
+    diverse = select_evidence("agents plan tasks", chunks, vectors, 30, replace(relevance_only, mmr_lambda=0.5))
+    assert [c.source for c in diverse.citations] == ["a", "b"]
+    assert [c.idx for c in diverse.citations] == [1, 2]
+
+def test_fake_llm_citations_pass_the_gate_and_stray_numbers_do_not():
+    chunks = [_chunk(0, "a", "Agentic AI grows."), _chunk(1, "b", "Agentic tools mature."), _chunk(2, "c", "Other.")]
+    ev = select_evidence("agentic ai", chunks, {}, 200, EvidenceConfig(max_sources=2))
+    assert [c.idx for c in ev.citations] == [1, 2]
+    evidence = format_evidence(ev.citations)
+    req = LLMRequest(system="", prompt=BRIEFING_TEMPLATE.format(topic="agentic ai", evidence=evidence))
+    answer = FakeLLM().generate(req)
+    assert quality_gate(answer, {c.source for c in ev.citations}, 2, n_evidence=len(ev.citations)).ok
+    q = quality_gate("Claim [3].", {"a", "b"}, 2, n_evidence=2)
+    assert not q.ok and q.reason == "No citations found in answer."
+    assert quality_gate("Claim [3].", {"a", "b"}, 2).ok  # without n_evidence: any number counts
+
+def test_engine_records_prompt_size_within_budget(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    sentences = " ".join(f"Agentic systems detail {i} for enterprise teams." for i in range(60))
+    (pages / "a.md").write_text(sentences, encoding="utf-8")
+    (pages / "b.md").write_text("Agentic workflows in product teams. " * 30, encoding="utf-8")
+    eng = Engine(Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1, PROMPT_BUDGET=300,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    ))
+    run = eng.run("agentic enterprise teams")
+    assert run.trace.meta["quality_ok"] is True
+    assert 0 < run.trace.meta["prompt_tokens"] <= run.trace.meta["prompt_budget"] == 300
+
+    eng.traces.flush()
+    trace = json.loads(Path(run.trace_path).read_text(encoding="utf-8"))
+    span = next(sp for sp in trace["spans"] if sp["name"] == "evidence")
+    assert span["meta"]["sources"] == 2 and 0 < span["meta"]["sentences"] < span["meta"]["candidates"]
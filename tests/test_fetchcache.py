@@ -0,0 +1,95 @@
+import asyncio, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import core.ingest
+from core.fetchcache import FetchCache
+from core.ingest import UrlFetcher
+
+HTML = "<html><body><article><p>Agentic systems plan, act and reflect on enterprise data.</p></article></body></html>"
+
+class _Origin:
+    # serves HTML with an ETag and answers 304 to a matching If-None-Match; counts requests by status
+    def __init__(self):
+        self.body, self.etag = HTML, '"v1"'
+        self.statuses: list[int] = []
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.headers.get("If-None-Match") == origin.etag:
+                    origin.statuses.append(304)
+                    self.send_response(304)
+                    self.send_header("ETag", origin.etag)
+                    self.end_headers()
+                    return
+                origin.statuses.append(200)
+                out = origin.body.encode()
+                self.send_response(200)
+                self.send_header("ETag", origin.etag)
+                self.send_header("Content-Type", "text/html")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/page"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+def _count_extractions(monkeypatch) -> list[str]:
+    calls = []
+    extract = core.ingest._extract_html
+
+    def counted(raw):
+        calls.append(raw)
+        return extract(raw)
+
+    monkeypatch.setattr(core.ingest, "_extract_html", counted)
+    return calls
+
+def test_ttl_revalidation_and_extraction_reuse(tmp_path, monkeypatch):
+    origin = _Origin()
+    extractions = _count_extractions(monkeypatch)
+    now = [1000.0]
+    cache = FetchCache(str(tmp_path), ttl_s=60, clock=lambda: now[0])
+    fetcher = UrlFetcher(workers=2, timeout=5, cache=cache)
+    try:
+        first = fetcher.fetch([origin.url], extract_workers=1)[0].doc.text
+        assert "Agentic systems" in first
+        assert fetcher.fetch([origin.url], extract_workers=1)[0].doc.text == first  # fresh: no request
+        assert origin.statuses == [200] and len(extractions) == 1
+
+        now[0] += 61  # stale: conditional request, 304, cached extraction
+        assert fetcher.fetch([origin.url], extract_workers=1)[0].doc.text == first
+        assert origin.statuses == [200, 304] and len(extractions) == 1
+
+        now[0] += 61
+        origin.body, origin.etag = HTML.replace("Agentic", "Hybrid"), '"v2"'
+        assert "Hybrid systems" in asyncio.run(fetcher.afetch([origin.url], extract_workers=1))[0].doc.text
+        assert origin.statuses == [200, 304, 200] and len(extractions) == 2
+        assert cache.stats() == {"hits": 1, "revalidated": 1, "misses": 2, "offline": False}
+    finally:
+        origin.server.shutdown()
+
+def test_offline_replay_serves_cache_without_network(tmp_path):
+    origin = _Origin()
+    online = UrlFetcher(timeout=5, cache=FetchCache(str(tmp_path)))
+    text = online.fetch([origin.url], extract_workers=1)[0].doc.text
+    origin.server.shutdown()
+
+    replay = UrlFetcher(timeout=5, cache=FetchCache(str(tmp_path), ttl_s=0, offline=True))
+    out = replay.fetch([origin.url, "http://127.0.0.1:9/unknown"], extract_workers=1)
+    assert out[0].doc.text == text
+    assert out[1].doc is None and "offline replay" in out[1].error
+    assert origin.statuses == [200]
+
+def test_stale_copy_is_served_when_origin_is_down(tmp_path):
+    origin = _Origin()
+    cache = FetchCache(str(tmp_path), ttl_s=0)
+    text = UrlFetcher(timeout=5, cache=cache).fetch([origin.url], extract_workers=1)[0].doc.text
+    origin.server.shutdown()
+    origin.server.server_close()
+    out = UrlFetcher(timeout=2, cache=cache).fetch([origin.url], extract_workers=1)
+    assert out[0].doc is not None and out[0].doc.text == text
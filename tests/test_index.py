@@ -0,0 +1,90 @@
+import threading
+
+from core.index import IndexStore
+
+def _store(tmp_path):
+    return IndexStore(str(tmp_path / "index"), str(tmp_path / "pdfs"), str(tmp_path / "pages"), rerank=False)
+
+def test_index_store_incremental(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("cyber resilience and incident response", encoding="utf-8")
+
+    store = _store(tmp_path)
+    r1 = store.refresh()
+    assert len(r1.chunks) == 2
+    assert store.refresh() is r1  # unchanged corpus: no rebuild
+
+    v1 = store.version
+    (pages / "b.md").write_text("product metrics north star framework", encoding="utf-8")
+    (pages / "c.md").write_text("retrieval augmented generation", encoding="utf-8")
+    (pages / "a.md").unlink()
+    r2 = store.refresh()
+    assert store.version != v1
+    assert sorted(c.text for c in r2.chunks) == [
+        "product metrics north star framework", "retrieval augmented generation",
+    ]
+    assert r2.embeddings.shape[0] == 2
+
+    reloaded = _store(tmp_path)
+    r3 = reloaded.refresh()
+    assert reloaded.version == store.version
+    assert [c.chunk_id for c in r3.chunks] == [c.chunk_id for c in r2.chunks]
+    assert len(r3.search("retrieval", bm25_k=2, dense_k=2, top_k=1)) == 1
+
+def test_refresh_waits_for_another_process_holding_the_index(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    writer, reader = _store(tmp_path), _store(tmp_path)
+    done = threading.Event()
+    with writer._file_lock():  # e.g. a batch job worker saving the index
+        t = threading.Thread(target=lambda: reader.refresh() and done.set())
+        t.start()
+        assert not done.wait(0.3)
+    t.join(30)
+    assert done.is_set() and len(reader.chunks) == 1
+
+def test_save_switches_to_a_new_data_directory(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    store = _store(tmp_path)
+    r1 = store.refresh()
+    first = [p.name for p in (tmp_path / "index").glob("data.*")]
+    (pages / "b.md").write_text("cyber resilience and incident response", encoding="utf-8")
+    store.refresh()
+    # the previous data (still memory-mapped by r1) is never overwritten, only unlinked after the switch
+    assert [p.name for p in (tmp_path / "index").glob("data.*")] == ["data.1"] and first == ["data.0"]
+    assert [c.text for c in r1.chunks] == ["agentic ai enterprise trends"]
+    assert len(_store(tmp_path).refresh().chunks) == 2
+
+def test_appended_files_extend_the_dense_index(tmp_path, monkeypatch):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    store = _store(tmp_path)
+    store.refresh()
+    assert store.dense_trained == 1
+    (pages / "b.md").write_text("cyber resilience and incident response", encoding="utf-8")
+    monkeypatch.setattr("core.index.build_dense_index", lambda *a, **kw: 1 / 0)  # no rebuild
+    r = store.refresh()
+    assert r.faiss.ntotal == 2 and store.dense_trained == 1
+    assert _store(tmp_path).refresh().faiss.ntotal == 2
+
+def test_request_scoped_chunks_are_searched_next_to_the_shared_index(tmp_path):
+    from core.rag import Chunk
+
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("cyber resilience and incident response", encoding="utf-8")
+    store = _store(tmp_path)
+    base = store.refresh()
+    extra = Chunk("url::x::chunk::0", "url::x", "https://x", "x", "retrieval augmented generation")
+    view = store.with_extra([extra])
+    assert base.faiss.ntotal == 2 and len(base.bm25) == 2  # shared, not copied or extended
+    vectors: dict = {}
+    hits = view.search("retrieval augmented generation", 3, 3, 1, vectors=vectors)
+    assert [c.chunk_id for c in hits] == [extra.chunk_id] and extra.chunk_id in vectors
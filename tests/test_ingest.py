@@ -0,0 +1,69 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+import core.ingest
+from core.ingest import UrlFetcher, ingest_files
+
+def test_ingest_files_ordered_and_isolated(tmp_path):
+    paths = []
+    for i in range(6):
+        p = tmp_path / f"p{i}.md"
+        p.write_text(f"page number {i}", encoding="utf-8")
+        paths.append(p)
+    bad = tmp_path / "broken.pdf"
+    bad.write_bytes(b"not a pdf")
+    paths.insert(3, bad)
+
+    out = ingest_files(paths, workers=2)
+    assert [r.key for r in out] == [str(p) for p in paths]
+    assert out[3].doc is None and out[3].error
+    assert [r.doc.text for r in out if r.doc] == [f"page number {i}" for i in range(6)]
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = f"<html><body><article><p>{'Content for ' + self.path + '. ' * 20}</p></article></body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+def test_url_fetcher_isolates_failures():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    try:
+        urls = [f"{base}/a", f"{base}/missing", f"{base}/b"]
+        out = UrlFetcher(workers=3, per_host=2, timeout=5).fetch(urls, extract_workers=1)
+    finally:
+        srv.shutdown()
+    assert [r.key for r in out] == urls
+    assert out[1].doc is None and "404" in out[1].error
+    assert out[0].doc.kind == "web" and out[2].doc is not None
+
+def test_url_extraction_reuses_one_spawned_pool(monkeypatch):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    fetcher = UrlFetcher(workers=3, timeout=5)
+    try:
+        urls = [f"{base}/a", f"{base}/b"]
+        assert all(r.doc for r in fetcher.fetch(urls, extract_workers=2))
+        assert fetcher._pool is None  # a few small pages: extracted inline
+
+        monkeypatch.setattr(core.ingest, "INLINE_EXTRACT_CHARS", 0)
+        first = fetcher.fetch(urls, extract_workers=2)
+        pool = fetcher._pool
+        second = fetcher.fetch(urls, extract_workers=2)
+        assert fetcher._pool is pool and pool._mp_context.get_start_method() == "spawn"
+        assert [r.doc.text for r in first] == [r.doc.text for r in second]
+    finally:
+        srv.shutdown()
+        fetcher.close()
+    assert fetcher._pool is None
@@ -0,0 +1,117 @@
+import time
+
+from core.config import Settings
+from core.engine import Engine
+from core.jobs import JobQueue, JobStore, process_job
+from core.rag import Chunk
+from core.rerank import RerankConfig, Reranker
+
+TOPICS = ["agentic ai trends", "product team workflows", "enterprise agentic ai", "north star metrics"]
+
+def _engine(tmp_path, **overrides) -> Engine:
+    pages = tmp_path / "pages"
+    pages.mkdir(exist_ok=True)
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    (pages / "c.md").write_text("north star metrics for product teams", encoding="utf-8")
+    s = Settings(**{
+        "LLM_PROVIDER": "fake", "RERANK": False, "EMB_CACHE": False, "INGEST_WORKERS": 1,
+        "BRIEFING_CACHE": False, "DATA_RAW_PDFS": str(tmp_path / "pdfs"), "DATA_RAW_PAGES": str(pages),
+        "DATA_INDEX": str(tmp_path / "index"), "DATA_RUNS": str(tmp_path / "runs"),
+        "DATA_JOBS": str(tmp_path / "jobs"), **overrides,
+    })
+    return Engine(s)
+
+def test_run_batch_matches_single_runs_with_one_encode(tmp_path):
+    eng = _engine(tmp_path)
+    single = [eng.run(t) for t in TOPICS]
+    retriever = eng.index.refresh()
+    calls = []
+    encode = retriever.embedder.encode
+    retriever.embedder.encode = lambda texts, **kw: calls.append(len(texts)) or encode(texts, **kw)
+
+    batch = eng.run_batch(TOPICS)
+    assert calls == [len(TOPICS)]
+    assert [r.answer for r in batch] == [r.answer for r in single]
+    assert [[c.chunk_id for c in r.retrieved] for r in batch] == [[c.chunk_id for c in r.retrieved] for r in single]
+    assert all(r.trace.meta["batch_size"] == len(TOPICS) and r.trace.meta["num_chunks"] for r in batch)
+
+def test_rerank_many_matches_rerank_per_query():
+    class Model:
+        calls = 0
+
+        def predict(self, pairs, batch_size=32, show_progress_bar=False):
+            Model.calls += 1
+            return [len(set(q.split()) & set(d.split())) for q, d in pairs]
+
+    chunks = [Chunk(f"c{i}", "d", f"s{i}", "t", t) for i, t in enumerate(["agentic ai", "north star", "ai trends"])]
+    queries = ["agentic ai trends", "north star"]
+    batched = Reranker(RerankConfig(), model=Model()).rerank_many(queries, [chunks, chunks], top_k=2)
+    assert Model.calls == 1
+    single = Reranker(RerankConfig(), model=Model())
+    assert batched == [single.rerank(q, chunks, top_k=2) for q in queries]
+
+def test_job_runs_in_batches_and_persists_results(tmp_path):
+    eng = _engine(tmp_path, JOB_BATCH_SIZE=3)
+    store = JobStore(str(tmp_path / "jobs"))
+    job = store.create(TOPICS)
+    assert process_job(eng, store, job.id, batch_size=3).status == "done"
+
+    rows = JobStore(str(tmp_path / "jobs")).results(job.id)  # as read back by another process
+    assert [r["topic"] for r in rows] == TOPICS and [r["index"] for r in rows] == [0, 1, 2, 3]
+    assert all(r["answer_md"] and r["quality_ok"] is not None for r in rows)
+    assert store.summary(store.get(job.id))["n_done"] == 4
+
+def test_cancel_stops_between_batches(tmp_path):
+    eng = _engine(tmp_path)
+    store = JobStore(str(tmp_path / "jobs"))
+    job = store.create(TOPICS)
+    run_batch = eng.run_batch
+
+    def first_batch_then_cancel(topics, **kw):
+        store.cancel(job.id)
+        return run_batch(topics, **kw)
+
+    eng.run_batch = first_batch_then_cancel
+    done = process_job(eng, store, job.id, batch_size=2)
+    assert done.status == "cancelled" and done.n_done == 2
+    assert len(store.results(job.id)) == 2
+    assert store.cancel(job.id).status == "cancelled"  # final: no-op
+
+def test_in_process_queue_runs_submitted_job(tmp_path):
+    eng = _engine(tmp_path, JOB_WORKERS=0)
+    jobs = JobQueue.from_settings(eng.s, engine=eng)
+    jobs.start()
+    try:
+        job = jobs.submit(TOPICS[:2])
+        deadline = time.time() + 30
+        while jobs.store.get(job.id).status != "done" and time.time() < deadline:
+            time.sleep(0.05)
+        assert jobs.store.get(job.id).status == "done"
+        assert len(jobs.store.results(job.id)) == 2
+    finally:
+        jobs.stop()
+
+def test_a_claimed_job_is_not_run_twice(tmp_path):
+    eng = _engine(tmp_path)
+    store = JobStore(str(tmp_path / "jobs"))
+    job = store.create(TOPICS[:2])
+    # e.g. the worker of another API process, which enqueued the same unfinished job at start-up
+    with store.claim(job.id) as owned:
+        assert owned
+        with JobStore(str(tmp_path / "jobs")).claim(job.id) as other:
+            assert not other
+        assert process_job(eng, store, job.id, batch_size=2).status == "queued"
+    assert store.results(job.id) == []
+    assert process_job(eng, store, job.id, batch_size=2).status == "done"
+
+def test_each_request_refreshes_the_index_once(tmp_path, monkeypatch):
+    eng = _engine(tmp_path, BRIEFING_CACHE=True)
+    refresh, calls = eng.index.refresh, []
+    monkeypatch.setattr(eng.index, "refresh", lambda: calls.append(1) or refresh())
+    eng.run(TOPICS[0])
+    assert len(calls) == 1
+    eng.run_batch(TOPICS)
+    assert len(calls) == 2
+    list(eng.stream(TOPICS[1]))
+    assert len(calls) == 3
@@ -0,0 +1,161 @@
+import asyncio, json, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.config import Settings
+from core.engine import Engine
+from core.llm import LLMRequest, OllamaLLM
+from core.llmclient import ClientConfig, LLMUnavailable, ProviderClient, Slots, TokenBucket
+
+class _Stub:
+    # Local Ollama-like server: each request pops the next scripted (status, delay) step, then
+    # answers 200 with a fixed response. Records client ports (connection reuse) and peak concurrency.
+    def __init__(self):
+        self.script: list[tuple[int, float]] = []
+        self.ports: list[int] = []
+        self.inflight = self.peak = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.ports.append(self.client_address[1])
+                    status, delay = stub.script.pop(0) if stub.script else (200, 0.0)
+                    stub.inflight += 1
+                    stub.peak = max(stub.peak, stub.inflight)
+                time.sleep(delay)
+                with stub.lock:
+                    stub.inflight -= 1
+                if body.get("stream"):
+                    lines = [{"response": "Hello ", "done": False}, {"response": "[1].", "done": True}]
+                    out = "".join(json.dumps(x) + "\n" for x in lines).encode()
+                else:
+                    out = json.dumps({"response": "Briefing [1] [2]."}).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(out)))
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(out)
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                pass  # the losing hedge's connection is dropped by the client
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+@pytest.fixture
+def stub():
+    s = _Stub()
+    yield s
+    s.server.shutdown()
+
+REQ = LLMRequest(system="s", prompt="Topic: t\n")
+
+def _llm(stub, **cfg) -> OllamaLLM:
+    cfg = {"backoff_s": 0.01, "backoff_max_s": 0.05, **cfg}
+    return OllamaLLM(stub.url, "m", ProviderClient("ollama", ClientConfig(**cfg)))
+
+def test_retries_throttling_on_pooled_connections(stub):
+    llm = _llm(stub)
+    stub.script = [(429, 0.0), (503, 0.0)]
+    assert llm.generate(REQ) == "Briefing [1] [2]."
+    assert llm.generate(REQ) == "Briefing [1] [2]."
+    assert len(stub.ports) == 4 and len(set(stub.ports)) == 1  # one keep-alive connection
+    assert llm.client.stats()["retries"] == 2
+
+    stub.script = [(503, 0.0)]
+    assert "".join(llm.stream(REQ)) == "Hello [1]."
+    stub.script = [(429, 0.0)]
+    assert asyncio.run(llm.agenerate(REQ)) == "Briefing [1] [2]."
+
+def test_non_retryable_errors_are_raised(stub):
+    llm = _llm(stub)
+    stub.script = [(401, 0.0)]
+    with pytest.raises(Exception, match="401"):
+        llm.generate(REQ)
+    assert llm.client.breaker.state == "closed" and len(stub.ports) == 1
+
+def test_concurrency_limit(stub):
+    llm = _llm(stub, max_concurrency=2)
+    stub.script = [(200, 0.05)] * 8
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: llm.generate(REQ), range(8)))
+    assert stub.peak == 2
+
+def test_hedged_request_beats_slow_primary(stub):
+    llm = _llm(stub, hedge_after_s=0.05)
+    stub.script = [(200, 0.6), (200, 0.0)]
+    t0 = time.perf_counter()
+    assert llm.generate(REQ) == "Briefing [1] [2]."
+    assert time.perf_counter() - t0 < 0.4
+    assert llm.client.stats()["hedge_wins"] == 1
+
+    stub.script = [(200, 0.6), (200, 0.0)]
+    t0 = time.perf_counter()
+    assert asyncio.run(llm.agenerate(REQ)) == "Briefing [1] [2]."
+    assert time.perf_counter() - t0 < 0.4
+
+def test_token_bucket_waits_for_budget():
+    bucket = TokenBucket(per_min=600)  # 10 tokens/s, bursts of 600
+    assert bucket.reserve(600) == 0.0
+    assert bucket.reserve(5, block=False) is None
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.05)
+
+def test_breaker_opens_and_engine_falls_back_to_evidence_only(stub, tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    eng = Engine(Settings(
+        LLM_PROVIDER="ollama", OLLAMA_BASE_URL=stub.url, LLM_RETRIES=1, LLM_BACKOFF_S=0.01,
+        LLM_BREAKER_FAILURES=2, LLM_BREAKER_RESET_S=0.2, RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    ))
+    stub.script = [(503, 0.0)] * 4
+    for _ in range(2):
+        run = eng.run("agentic ai")
+        assert "Evidence-only mode" in run.answer and "llm_fallback" in run.trace.meta
+    assert eng.llm.client.breaker.state == "open" and len(stub.ports) == 4
+
+    run = eng.run("agentic ai")  # circuit open: no request, not served from the briefing cache either
+    assert "circuit open" in run.trace.meta["llm_fallback"] and len(stub.ports) == 4
+    with pytest.raises(LLMUnavailable):
+        eng.llm.generate(REQ)
+
+    time.sleep(0.25)  # half-open: one trial call closes the circuit again
+    run = eng.run("agentic ai")
+    assert run.answer.startswith("Briefing") and "llm_fallback" not in run.trace.meta
+    assert eng.llm.client.breaker.state == "closed"
+
+def test_async_admission_hands_slots_over_without_leaking():
+    slots = Slots(1)
+    assert slots.acquire()  # a sync caller holds the only slot
+
+    async def main():
+        waiter = asyncio.ensure_future(slots.aacquire())
+        abandoned = asyncio.ensure_future(slots.aacquire())
+        late = asyncio.ensure_future(slots.aacquire())
+        await asyncio.sleep(0.01)
+        assert not (waiter.done() or abandoned.done() or late.done())
+        abandoned.cancel()  # gives up while queued
+        slots.release()
+        await asyncio.wait_for(waiter, 5)
+        slots.release()  # handed to `late`, which gives up before it runs: passed on, not lost
+        late.cancel()
+        await asyncio.gather(abandoned, late, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(main(), 10))
+    assert slots.free == 1 and slots.acquire(blocking=False) and not slots.acquire(blocking=False)
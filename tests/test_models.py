@@ -0,0 +1,20 @@
+import threading
+
+from core.models import ModelRegistry
+
+def test_registry_loads_each_model_once():
+    calls = []
+    reg = ModelRegistry()
+    reg._loaders["embedder"] = lambda name: calls.append(name) or object()
+
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(reg.embedder("m"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == ["m"]
+    assert all(m is models[0] for m in models)
+    stats = reg.stats()
+    assert stats[0]["name"] == "m" and stats[0]["load_s"] >= 0
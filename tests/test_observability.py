@@ -0,0 +1,63 @@
+import asyncio
+
+from core.observability import MetricsRegistry, Tracer, metrics
+
+def test_nested_spans_record_parent_cpu_and_memory():
+    tr = Tracer("t")
+    with tr.span("collect") as outer:
+        with tr.span("fetch") as inner:
+            sum(range(10_000))
+    with tr.span("retrieve") as last:
+        pass
+    assert outer.parent_id is None and last.parent_id is None
+    assert inner.parent_id == outer.span_id
+    assert inner.cpu_s >= 0 and outer.t1 >= inner.t1
+    assert inner.mem_delta_mb is None  # off by default
+    with Tracer("t", memory=True).span("fetch") as sp:
+        pass
+    assert isinstance(sp.mem_delta_mb, float)
+
+def test_spans_on_the_event_loop_record_no_cpu_time():
+    tr = Tracer("t")
+
+    async def run():
+        with tr.span("fetch") as sp:
+            await asyncio.sleep(0)
+        return sp
+
+    assert asyncio.run(run()).cpu_s is None
+
+def test_registry_renders_prometheus_histograms():
+    reg = MetricsRegistry(buckets=(0.1, 1.0))
+    reg.observe("lat_seconds", 0.05, stage="retrieve")
+    reg.observe("lat_seconds", 0.5, stage="retrieve")
+    reg.observe("lat_seconds", 5.0, stage="retrieve")
+    reg.inc("runs_total", provider="fake")
+    reg.inc("runs_total", provider="fake")
+    text = reg.render()
+    assert 'runs_total{provider="fake"} 2.0' in text
+    assert 'lat_seconds_bucket{le="0.1",stage="retrieve"} 1' in text
+    assert 'lat_seconds_bucket{le="1.0",stage="retrieve"} 2' in text
+    assert 'lat_seconds_bucket{le="+Inf",stage="retrieve"} 3' in text
+    assert 'lat_seconds_count{stage="retrieve"} 3' in text
+
+def test_finished_runs_feed_the_global_registry():
+    tr = Tracer("t", {"provider": "fake", "cache": "miss"})
+    with tr.span("write"):
+        pass
+    tr.meta["quality_ok"] = True
+    tr.finish()
+    text = metrics.render()
+    assert 'briefing_runs_total{cache="miss",provider="fake",quality="ok"}' in text
+    assert 'briefing_stage_seconds_count{provider="fake",stage="write"}' in text
+
+def test_trace_timings_name_nested_spans_by_path():
+    tr = Tracer("t")
+    with tr.span("collect"):
+        with tr.span("index"):
+            pass
+    with tr.span("write"):
+        pass
+    rows = tr.finish().timings()
+    assert [r["stage"] for r in rows] == ["collect", "collect / index", "write"]
+    assert all(r["ms"] >= 0 for r in rows)
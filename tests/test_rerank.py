@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+
+import core.index, core.rag
+from core.index import IndexStore
+from core.rag import Chunk
+from core.rerank import RerankConfig, Reranker
+
+class _FakeCrossEncoder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        time.sleep(self.delay)
+        self.pairs += len(pairs)
+        return [len(set(q.split()) & set(d.split())) for q, d in pairs]
+
+class _BagEmbedder:
+    VOCAB = "agentic ai enterprise trends cyber resilience".split()
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        out = np.asarray([[t.split().count(w) for w in self.VOCAB] for t in texts], dtype="float32") + 0.1
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+def _reranker(model, **cfg):
+    return Reranker(RerankConfig(**cfg), model=model)
+
+def _chunks():
+    return [Chunk(f"c{i}", "d", f"s{i}", "t", text) for i, text in enumerate([
+        "cyber resilience", "agentic ai trends", "agentic ai enterprise trends", "north star",
+    ])]
+
+def test_rerank_orders_batches_and_caches():
+    model = _FakeCrossEncoder()
+    rr = _reranker(model, batch_size=2)
+    info = {}
+    out = rr.rerank("agentic ai enterprise", _chunks(), top_k=2, info=info)
+    assert [c.chunk_id for c in out] == ["c2", "c1"]
+    assert info["cache_hits"] == 0 and model.pairs == 4
+
+    info = {}
+    rr.rerank("agentic ai enterprise", _chunks(), top_k=2, info=info)
+    assert info["cache_hits"] == 4 and model.pairs == 4
+
+def test_rerank_budget_falls_back_to_fused_order():
+    rr = _reranker(_FakeCrossEncoder(delay=0.02), batch_size=1)
+    info = {}
+    out = rr.rerank("agentic ai enterprise", _chunks(), top_k=3, budget_ms=5, info=info)
+    assert info["fallback"] is True
+    assert [c.chunk_id for c in out] == ["c0", "c1", "c2"]
+
+def test_edited_source_is_rescored_not_served_from_cache(tmp_path, monkeypatch):
+    # the chunk id of an edited file stays the same; its cached score must not
+    monkeypatch.setattr(core.index, "get_embedder", lambda name: _BagEmbedder())
+    monkeypatch.setattr(core.rag, "get_embedder", lambda name: _BagEmbedder())
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("cyber resilience", encoding="utf-8")
+    model = _FakeCrossEncoder()
+    store = IndexStore(
+        str(tmp_path / "index"), str(tmp_path / "pdfs"), str(pages), reranker=_reranker(model, candidates=2),
+    )
+
+    def sources() -> list[str]:
+        return [c.source.rsplit("/", 1)[-1] for c in store.refresh().search("agentic ai", 2, 2, 2)]
+
+    assert sources() == ["a.md", "b.md"]
+
+    (pages / "a.md").write_text("cyber resilience", encoding="utf-8")
+    (pages / "b.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    assert sources() == ["b.md", "a.md"]
+    assert model.pairs == 4
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+import asyncio, threading, time
+
+import pytest
+
+from core.serving import AdmissionController, Coalescer, Overloaded, briefing_key, iterate_in_threads
+
+def test_admission_rejects_when_queue_is_full():
+    async def main():
+        ctrl = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with ctrl.slot():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert ctrl.stats()["running"] == 1 and ctrl.stats()["waiting"] == 1
+        with pytest.raises(Overloaded) as e:
+            async with ctrl.slot():
+                pass
+        assert e.value.status == 429
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+
+def test_admission_times_out_with_503():
+    async def main():
+        ctrl = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=0.01)
+        async with ctrl.slot():
+            with pytest.raises(Overloaded) as e:
+                async with ctrl.slot():
+                    pass
+        assert e.value.status == 503
+
+    asyncio.run(main())
+
+def test_coalescer_shares_inflight_result():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        co = Coalescer()
+        key = briefing_key("  Agentic  AI ", "offline", None)
+        assert key == briefing_key("agentic ai", "offline", [])
+        return await asyncio.gather(*(co.run(key, work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(calls) == 1
+
+def test_iterate_in_threads_closes_an_abandoned_stream():
+    closed = threading.Event()
+
+    def tokens():
+        try:
+            for i in range(100):
+                time.sleep(0.001)
+                yield i
+        finally:
+            closed.set()
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert [x async for x in iterate_in_threads(iter(range(3)), pool)] == [0, 1, 2]
+            async with aclosing(iterate_in_threads(tokens(), pool)) as it:
+                async for x in it:
+                    if x == 2:
+                        break  # the client went away
+
+    asyncio.run(main())
+    assert closed.wait(1)
+
+def test_coalesced_followers_survive_a_cancelled_leader():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        co = Coalescer()
+        leader = asyncio.ensure_future(co.run("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(co.run("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. the first client disconnected
+        assert await asyncio.wait_for(follower, 5) == "answer"
+        assert leader.cancelled() and len(co) == 0
+
+        # nobody left waiting: the shared work is cancelled, not left running
+        alone = asyncio.ensure_future(co.run("k", work))
+        await asyncio.sleep(0.01)
+        (task, _), = co._inflight.values()
+        alone.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled() and len(co) == 0
+
+    asyncio.run(main())
+    assert len(calls) == 2
@@ -0,0 +1,132 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+import core.index
+from core.chunkstore import ChunkStore
+from core.index import IndexStore
+from core.rag import Chunk, HybridRetriever
+from core.rerank import RerankConfig, Reranker
+from core.shards import ShardedRetriever, merge_stats
+from core.bm25 import SparseBM25
+
+WORDS = "agentic ai enterprise retrieval rag cyber resilience incident product metrics north star trends".split()
+
+class _Embedder:
+    # deterministic continuous vectors (no score ties, unlike a bag of words)
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        out = []
+        for t in texts:
+            seed = int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), "big")
+            v = np.random.default_rng(seed).standard_normal(16)
+            out.append(v / np.linalg.norm(v))
+        return np.asarray(out, dtype="float32")
+
+def _corpus(n_docs=12, per_doc=3) -> list[Chunk]:
+    rng = np.random.default_rng(0)
+    return [
+        Chunk(f"d{d}::{k}", f"d{d}", f"src/{d}.md", f"t{d}", " ".join(rng.choice(WORDS, 8)))
+        for d in range(n_docs) for k in range(per_doc)
+    ]
+
+QUERIES = ["agentic ai", "incident response resilience", "north star metrics", "rag retrieval trends"]
+
+def _ids(results) -> list[str]:
+    return [c.chunk_id for c in results]
+
+def _reference(chunks, embeddings, reranker) -> HybridRetriever:
+    ref = HybridRetriever(
+        chunks, rerank=reranker is not None, embeddings=embeddings, reranker=reranker
+    )
+    ref.embedder = _Embedder()
+    return ref
+
+def test_global_stats_match_an_unsharded_index():
+    texts = [c.text for c in _corpus()]
+    whole = SparseBM25(texts)
+    parts = [SparseBM25(texts[i::3]) for i in range(3)]
+    stats = []
+    for i, p in enumerate(parts):
+        terms, df, first = p.term_stats()
+        rows = np.arange(i, len(texts), 3)
+        stats.append({"terms": terms, "df": df, "first": rows[first], "n": len(p),
+                      "dl_sum": float(p.doc_len.sum())})
+    idf, avgdl = merge_stats(stats)
+    assert list(idf) == list(whole.vocab)
+    assert np.array_equal(np.array(list(idf.values())), whole.idf) and avgdl == whole.avgdl
+
+@pytest.mark.parametrize("rerank", [False, True])
+def test_sharded_search_matches_hybrid_retriever(tmp_path, rerank):
+    chunks = ChunkStore.from_chunks(_corpus())
+    emb = _Embedder().encode(list(chunks.texts()))
+    reranker = Reranker(RerankConfig(candidates=8)) if rerank else None
+    ref = _reference(chunks, emb, reranker)
+    sharded = ShardedRetriever.open(tmp_path, 3, chunks, emb, "v1", _Embedder(), rerank, reranker)
+    try:
+        assert len(sharded) == len(ref) == len(chunks)
+        for q in QUERIES:
+            assert _ids(sharded.search(q, 6, 6, 4)) == _ids(ref.search(q, 6, 6, 4))
+            stages, ms = sharded.search_stages(q, 6, 6, 4)
+            ref_stages, _ = ref.search_stages(q, 6, 6, 4)
+            assert {k: _ids(v) for k, v in stages.items()} == {k: _ids(v) for k, v in ref_stages.items()}
+            assert {"bm25", "dense", "fuse"} <= ms.keys()
+        assert [_ids(r) for r in sharded.search_many(QUERIES, 6, 6, 4)] == [
+            _ids(r) for r in ref.search_many(QUERIES, 6, 6, 4)
+        ]
+    finally:
+        sharded.close()
+
+    reopened = ShardedRetriever.open(tmp_path, 3, ChunkStore.empty(), None, "v1", _Embedder(), False)
+    try:  # same version: the persisted shards are served as they are
+        assert _ids(reopened.search(QUERIES[0], 6, 6, 4)) == _ids(_reference(chunks, emb, None).search(QUERIES[0], 6, 6, 4))
+    finally:
+        reopened.close()
+
+def test_index_store_rebuilds_only_affected_shards(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.index, "get_embedder", lambda name: _Embedder())
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    rng = np.random.default_rng(1)
+    for i in range(8):
+        (pages / f"p{i}.md").write_text(" ".join(rng.choice(WORDS, 12)), encoding="utf-8")
+    store = IndexStore(str(tmp_path / "index"), str(tmp_path / "pdfs"), str(pages), rerank=False, shards=3)
+    try:
+        sharded = store.refresh()
+        before = {w.dir for w in sharded._workers}
+
+        (pages / "p3.md").write_text("agentic incident response for enterprise rag", encoding="utf-8")
+        (pages / "p5.md").unlink()
+        assert store.refresh() is sharded
+        after = {w.dir for w in sharded._workers}
+        assert 1 <= len(after - before) <= 2  # the shards owning p3 / p5 only
+
+        # the same rows as an unsharded index, in IndexStore order
+        ref = _reference(store.chunks, store.embeddings, None)
+        assert len(sharded) == len(ref)
+        for q in QUERIES + ["agentic incident"]:
+            assert _ids(sharded.search(q, 5, 5, 4)) == _ids(ref.search(q, 5, 5, 4))
+    finally:
+        store._retriever.close()
+
+def test_request_scoped_chunks_are_a_local_shard(tmp_path):
+    chunks = ChunkStore.from_chunks(_corpus())
+    emb = _Embedder().encode(list(chunks.texts()))
+    extra = [Chunk("u0::0", "u0", "https://example.com/a", "u", "quantum annealing")]  # its vector is the query's
+    extra_emb = _Embedder().encode([c.text for c in extra])
+    sharded = ShardedRetriever.open(tmp_path, 3, chunks, emb, "v1", _Embedder(), False)
+    try:
+        before = _ids(sharded.search(QUERIES[0], 6, 6, 4))
+        view = sharded.with_extra(extra, extra_emb)
+        assert len(view) == len(chunks) + 1 and len(sharded) == len(chunks)
+        assert _ids(view.search("quantum annealing", 6, 6, 4))[0] == "u0::0"
+        # dense search is exact: the same ranking as an in-process index over corpus + extras
+        ref = _reference(chunks.with_tail(extra), np.vstack([emb, extra_emb]), None)
+        stages, _ = view.search_stages(QUERIES[0], 6, 6, 4)
+        assert _ids(stages["dense"]) == _ids(ref.search_stages(QUERIES[0], 6, 6, 4)[0]["dense"])
+        vectors: dict = {}
+        view.search("quantum annealing", 6, 6, 4, vectors=vectors)
+        assert np.array_equal(vectors["u0::0"], extra_emb[0])
+        assert _ids(sharded.search(QUERIES[0], 6, 6, 4)) == before  # the base is untouched
+    finally:
+        sharded.close()
@@ -0,0 +1,87 @@
+import json, os, subprocess, sys
+from pathlib import Path
+
+import pytest
+
+from core.config import Settings
+from core.engine import Engine
+
+ROOT = Path(__file__).resolve().parents[1]
+# parsers, vector index and model libraries: loaded on first use, never by importing the API
+HEAVY = ("fitz", "pymupdf", "trafilatura", "faiss", "sentence_transformers", "torch")
+# cumulative import time of api.main (FastAPI, settings, the Engine constructor); torch alone is over this
+IMPORT_BUDGET_S = 1.5
+
+PROBE = """
+import json, sys, time
+import api.main
+heavy = [m for m in %r if m in sys.modules]
+from fastapi.testclient import TestClient
+with TestClient(api.main.app) as client:
+    live = client.get("/livez").status_code
+    for _ in range(1200):
+        ready = client.get("/readyz")
+        if ready.status_code == 200:
+            break
+        time.sleep(0.05)
+print(json.dumps({"heavy": heavy, "live": live, "ready": ready.json()}))
+"""
+
+def _settings_env(tmp_path, pages) -> dict[str, str]:
+    return {
+        "LLM_PROVIDER": "none", "RERANK": "false", "EMB_CACHE": "false", "JOB_WORKERS": "0",
+        "INGEST_WORKERS": "1", "DATA_RAW_PDFS": str(tmp_path / "pdfs"), "DATA_RAW_PAGES": str(pages),
+        "DATA_INDEX": str(tmp_path / "index"), "DATA_RUNS": str(tmp_path / "runs"),
+        "DATA_JOBS": str(tmp_path / "jobs"), "DATA_FETCH_CACHE": str(tmp_path / "fetch"),
+    }
+
+def _pages(tmp_path) -> Path:
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    return pages
+
+def test_api_import_is_light_and_turns_ready(tmp_path):
+    env = {**os.environ, **_settings_env(tmp_path, _pages(tmp_path))}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE % (HEAVY,)],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=300,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    # "import time: self [us] | cumulative [us] | module", top-level modules unindented
+    cumulative = {
+        line.split("|")[2].strip(): int(line.split("|")[1]) for line in proc.stderr.splitlines()
+        if line.startswith("import time:") and line.count("|") == 2 and line.split("|")[1].strip().isdigit()
+    }
+    assert cumulative["api.main"] / 1e6 < IMPORT_BUDGET_S
+
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert out["heavy"] == [] and out["live"] == 200
+    assert out["ready"]["state"] == "ready" and out["ready"]["num_chunks"] == 2
+
+def test_engine_construction_is_cheap_and_warm_up_explicit(tmp_path, monkeypatch):
+    for k, v in _settings_env(tmp_path, _pages(tmp_path)).items():
+        monkeypatch.setenv(k, v)
+    eng = Engine(Settings())
+    assert eng.readiness() == {"state": "cold"} and eng.index.version == ""  # nothing loaded yet
+    eng.warm_up()
+    ready = eng.readiness()
+    assert ready["state"] == "ready" and ready["num_chunks"] == 2 and ready["index_version"]
+
+    broken = Engine(Settings())
+    monkeypatch.setattr(broken.index, "refresh", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        broken.warm_up()
+    assert broken.readiness() == {"state": "failed", "error": "ZeroDivisionError: division by zero"}
+
+def test_failed_background_warm_up_is_logged(tmp_path, monkeypatch, caplog):
+    for k, v in _settings_env(tmp_path, _pages(tmp_path)).items():
+        monkeypatch.setenv(k, v)
+    import api.main
+
+    monkeypatch.setattr(api.main.engine, "warm_up", lambda: 1 / 0)
+    api.main._warm_up()
+    (record,) = caplog.records
+    assert record.levelname == "ERROR" and "warm-up failed" in record.getMessage()
+    assert record.exc_info[0] is ZeroDivisionError
@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from core.config import Settings
+from core.engine import Engine
+from core.llm import FakeLLM, LLMRequest, BRIEFING_TEMPLATE
+
+def test_fake_llm_streams_cited_answer():
+    req = LLMRequest(system="", prompt=BRIEFING_TEMPLATE.format(topic="t", evidence="[1] a\n[2] b\n"))
+    deltas = list(FakeLLM().stream(req))
+    assert len(deltas) > 1
+    assert "".join(deltas) == FakeLLM().generate(req)
+    assert "[1] [2]" in "".join(deltas)
+
+def test_engine_stream_records_ttft(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    (pages / "b.md").write_text("agentic workflows in product teams", encoding="utf-8")
+    s = Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    )
+    eng = Engine(s)
+    events = list(eng.stream("agentic ai"))
+    assert [e.kind for e in events[:-1]] == ["token"] * (len(events) - 1)
+    done = events[-1]
+    assert done.kind == "done"
+    assert done.data.answer == "".join(e.data for e in events[:-1]).strip()
+
+    eng.traces.flush()
+    trace = json.loads(Path(done.data.trace_path).read_text(encoding="utf-8"))
+    write = next(sp for sp in trace["spans"] if sp["name"] == "write")
+    assert write["meta"]["ttft_s"] >= 0 and write["meta"]["n_tokens"] == len(events) - 1
+    assert trace["meta"]["quality_ok"] is True
+
+def test_engine_retrieve_returns_evidence_without_a_run(tmp_path):
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / "a.md").write_text("agentic ai enterprise trends", encoding="utf-8")
+    eng = Engine(Settings(
+        LLM_PROVIDER="fake", RERANK=False, EMB_CACHE=False, INGEST_WORKERS=1,
+        DATA_RAW_PDFS=str(tmp_path / "pdfs"), DATA_RAW_PAGES=str(pages),
+        DATA_INDEX=str(tmp_path / "index"), DATA_RUNS=str(tmp_path / "runs"),
+    ))
+    retrieved, trace = eng.retrieve("agentic ai")
+    assert [c.text for c in retrieved] == ["agentic ai enterprise trends"]
+    assert {"collect", "collect / index", "retrieve"} <= {r["stage"] for r in trace.timings()}
+    eng.traces.flush()
+    assert not (tmp_path / "runs" / "runs.jsonl").exists()  # nothing written
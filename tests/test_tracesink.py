@@ -0,0 +1,53 @@
+import gzip, json
+from multiprocessing import get_context
+from pathlib import Path
+
+from core.observability import Tracer
+from core.tracesink import TraceSink
+
+def _trace(topic="t", ok=True):
+    tr = Tracer(topic)
+    with tr.span("write"):
+        pass
+    tr.meta["quality_ok"] = ok
+    return tr.finish()
+
+def test_background_writer_appends_batches_and_per_run_files(tmp_path):
+    sink = TraceSink(str(tmp_path), batch_size=8)
+    paths = [sink.submit(_trace(f"t{i}")) for i in range(20)]
+    assert sink.flush(timeout=5)
+    lines = (tmp_path / "runs.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(x)["topic"] for x in lines] == [f"t{i}" for i in range(20)]
+    assert all(json.loads(Path(p).read_text(encoding="utf-8"))["spans"] for p in paths)
+
+def test_sampling_keeps_abstentions(tmp_path):
+    sink = TraceSink(str(tmp_path), background=False, sample_rate=0.0)
+    assert sink.submit(_trace()) is None
+    assert sink.submit(_trace(ok=False)) is not None
+    assert len((tmp_path / "runs.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+
+def test_rotation_compresses_and_prunes(tmp_path):
+    sink = TraceSink(str(tmp_path), background=False, rotate_mb=1 / 1024, keep=2)  # rotate at ~1 KiB
+    for i in range(30):
+        sink.submit(_trace(f"t{i}"))
+    rotated = sorted(tmp_path.glob("runs-*.jsonl.gz"))
+    assert len(rotated) == 2
+    with gzip.open(rotated[-1], "rt", encoding="utf-8") as f:
+        assert all(json.loads(line)["run_id"] for line in f)
+
+def _append(out_dir: str, n: int) -> None:
+    sink = TraceSink(out_dir, sample_rate=0.0)
+    for i in range(n):
+        sink.submit(_trace())
+    sink.flush(timeout=10)
+
+def test_concurrent_processes_never_interleave_lines(tmp_path):
+    ctx = get_context("spawn")
+    procs = [ctx.Process(target=_append, args=(str(tmp_path), 50)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=60)
+    lines = (tmp_path / "runs.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 150
+    assert all(json.loads(x)["spans"] for x in lines)